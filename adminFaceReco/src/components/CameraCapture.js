@@ -4,6 +4,8 @@ import * as faceapi from "face-api.js";
 
 const CameraCapture = () => {
   const webcamRef = useRef(null);
+  const socketRef = useRef(null);
+  const pausedUntilRef = useRef(0); // No frames before this time (server asked us to retry later)
   const [isFaceDetected, setIsFaceDetected] = useState(false);
   const [modelsLoaded, setModelsLoaded] = useState(false);
 
@@ -16,6 +18,50 @@ const CameraCapture = () => {
     loadModels();
   }, []);
 
+  // ✅ Open one persistent stream to the backend instead of a new request per frame.
+  // When it closes (1013 while the server warms up, a restart, network loss) reconnect
+  // after the server's retry_after, or an exponential backoff up to 30s.
+  useEffect(() => {
+    let socket = null;
+    let timer = null;
+    let backoff = 1000;
+    let retryAfter = null;
+    let stopped = false;
+
+    const connect = () => {
+      socket = new WebSocket("ws://127.0.0.1:8000/api/ws/stream?camera_id=browser");
+      socket.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        retryAfter = data.retry_after ?? null;
+        if (data.error) {
+          console.warn(data.error);
+          if (retryAfter !== null) {
+            pausedUntilRef.current = Date.now() + retryAfter * 1000; // Server is busy, back off
+          }
+          return;
+        }
+        backoff = 1000;
+        data.faces.forEach((face) => console.log(face.result?.message || face.error));
+      };
+      socket.onclose = () => {
+        socketRef.current = null;
+        if (stopped) return;
+        const delay = retryAfter !== null ? retryAfter * 1000 : backoff;
+        if (retryAfter === null) backoff = Math.min(backoff * 2, 30000);
+        retryAfter = null;
+        timer = setTimeout(connect, delay);
+      };
+      socketRef.current = socket;
+    };
+
+    connect();
+    return () => {
+      stopped = true;
+      clearTimeout(timer);
+      socket.close();
+    };
+  }, []);
+
   // ✅ Run face detection when models are loaded
   useEffect(() => {
     if (!modelsLoaded) return;
@@ -43,7 +89,7 @@ const CameraCapture = () => {
     return () => clearInterval(interval);
   }, [modelsLoaded]);
 
-  // ✅ Capture frame & send to FastAPI backend
+  // ✅ Capture frame & stream it to FastAPI backend
   const sendFrameToBackend = async (video) => {
     const canvas = document.createElement("canvas");
     canvas.width = video.videoWidth;
@@ -55,19 +101,10 @@ const CameraCapture = () => {
       canvas.toBlob(resolve, "image/jpeg")
     );
 
-    const formData = new FormData();
-    formData.append("file", blob, "image.jpg");
-
-    try {
-      const response = await fetch("http://127.0.0.1:8000/api/mark-attendance", {
-        method: "POST",
-        body: formData,
-      });
-
-      const data = await response.json();
-      console.log(data.message);
-    } catch (error) {
-      console.error("Error sending frame:", error);
+    // Server coalesces frames and pushes results back on the same socket
+    const socket = socketRef.current;
+    if (blob && socket && socket.readyState === WebSocket.OPEN && Date.now() >= pausedUntilRef.current) {
+      socket.send(blob);
     }
   };
 
@@ -1,10 +1,11 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import { HiChevronLeft, HiChevronRight, HiCheckCircle, HiXCircle, HiClock } from "react-icons/hi";
 import styles from "./AttendanceTable.module.css";
 
 const AttendanceTable = () => {
   const [attendanceData, setAttendanceData] = useState([]);
   const [currentPage, setCurrentPage] = useState(1);
+  const latestRef = useRef(null); // Newest record id we have, for delta polling
 
   // Function to get today's date in YYYY-MM-DD format
   const getTodayDate = () => {
@@ -12,29 +13,28 @@ const AttendanceTable = () => {
     return today.toISOString().split("T")[0]; // Extract YYYY-MM-DD
   };
 
-  // Fetch Attendance Data
-  const fetchAttendance = async () => {
+  // Fetch Attendance Data: full list for today once, then only records newer than the latest we have
+  const fetchAttendance = async (refresh = false) => {
     try {
-      const response = await fetch("http://127.0.0.1:8000/api/get-attendance");
+      const params = new URLSearchParams({ start: getTodayDate(), end: getTodayDate() });
+      if (latestRef.current && !refresh) {
+        params.set("since", latestRef.current);
+      }
+      const response = await fetch(`http://127.0.0.1:8000/api/get-attendance?${params}`);
       const data = await response.json();
-  
-      console.log("API Response:", data); // ✅ Debugging
-  
+
       if (data.attendance) {
-        console.log("Raw Attendance Data:", data.attendance);
-  
-        // Filter today's attendance
-        const todayData = data.attendance.filter(record => {
-          const recordDate = record.timestamp?.split(" ")[0]; // Extract Date
-          return recordDate === getTodayDate();
+        const isDelta = params.has("since");
+        if (data.latest) {
+          latestRef.current = data.latest;
+        }
+
+        // Delta responses hold new records plus a few recent ones again; merge by _id, latest first
+        setAttendanceData((previous) => {
+          const fresh = new Set(data.attendance.map((record) => record._id));
+          const merged = isDelta ? [...data.attendance, ...previous.filter((record) => !fresh.has(record._id))] : data.attendance;
+          return merged.sort((a, b) => new Date(b.timestamp) - new Date(a.timestamp));
         });
-  
-        // Sort by timestamp (latest first)
-        const sortedData = todayData.sort((a, b) => new Date(b.timestamp) - new Date(a.timestamp));
-  
-        console.log("Sorted Today’s Attendance:", sortedData); // ✅ Debugging
-  
-        setAttendanceData(sortedData);
       } else {
         console.warn("Attendance data missing from response.");
       }
@@ -42,7 +42,6 @@ const AttendanceTable = () => {
       console.error("Error fetching attendance:", error);
     }
   };
-  
 
   useEffect(() => {
     fetchAttendance(); // Initial fetch
@@ -55,7 +54,7 @@ const AttendanceTable = () => {
   return (
     <div className={styles.container}>
       <h2>Live Attendance (Today)</h2>
-      <button onClick={fetchAttendance} style={{ marginBottom: "10px" }}>
+      <button onClick={() => fetchAttendance(true)} style={{ marginBottom: "10px" }}>
         Refresh Attendance
       </button>
       <table className={styles.table}>
@@ -1,7 +1,26 @@
-import React from 'react';
+import React, { useEffect, useState } from 'react';
 import styles from './AttendanceHeatmap.module.css';
 
+const HEATMAP_DAYS = 30;
+
 const AttendanceHeatmap = ({ data }) => {
+  const [dailyData, setDailyData] = useState(null);
+
+  useEffect(() => {
+    if (data) return;
+    const start = new Date();
+    start.setDate(start.getDate() - (HEATMAP_DAYS - 1));
+    const params = new URLSearchParams({ start: start.toISOString().split('T')[0] });
+    fetch(`http://127.0.0.1:8000/api/get-attendance-heatmap?${params}`)
+      .then((response) => response.json())
+      .then((heatmap) => {
+        if (heatmap.daily) {
+          setDailyData(heatmap.daily.map((day) => ({ date: new Date(`${day.date}T00:00:00`), attendance: day.attendance })));
+        }
+      })
+      .catch((error) => console.error("Error fetching attendance heatmap:", error));
+  }, [data]);
+
   // Mock data for demonstration
   const mockData = Array.from({ length: 30 }, (_, i) => ({
     date: new Date(2025, 1, i + 1),
@@ -25,7 +44,7 @@ const AttendanceHeatmap = ({ data }) => {
     <div className={styles.heatmapContainer}>
       <h3 className={styles.heatmapTitle}>Attendance Heatmap</h3>
       <div className={styles.heatmapGrid}>
-        {(data || mockData).map((day, index) => (
+        {(data || dailyData || mockData).map((day, index) => (
           <div
             key={index}
             className={`${styles.heatmapCell} ${getColorClass(day.attendance)}`}
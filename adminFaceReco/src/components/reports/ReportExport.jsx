@@ -1,41 +1,36 @@
-import React, { useState } from 'react';
+import React from 'react';
 import { HiDocumentDownload } from 'react-icons/hi';
-import { generateReportData, exportReportToExcel } from '../../utils/reportData';
 import styles from './Reports.module.css';
 
-const ReportExport = ({ filters }) => {
-  const [isExporting, setIsExporting] = useState(false);
+const EXPORT_URL = 'http://127.0.0.1:8000/api/export-attendance';
+
+// Department dropdown values -> the names stored on users and attendance records
+const DEPARTMENTS = {
+  engineering: 'Engineering',
+  marketing: 'Marketing',
+  sales: 'Sales',
+  hr: 'HR',
+  finance: 'Finance',
+};
 
-  const handleExport = async () => {
-    try {
-      setIsExporting(true);
-      const reportData = generateReportData(
-        filters?.startDate || '2024-01-01',
-        filters?.endDate || '2024-12-31'
-      );
-      
-      const fileName = exportReportToExcel(
-        reportData,
-        filters?.startDate || '2024-01-01',
-        filters?.endDate || '2024-12-31'
-      );
-      
-      console.log(`Report exported successfully: ${fileName}`);
-    } catch (error) {
-      console.error('Error exporting report:', error);
-    } finally {
-      setIsExporting(false);
-    }
+const ReportExport = ({ filters }) => {
+  const handleExport = () => {
+    // The server streams the file from the database; nothing is built in browser memory
+    const params = new URLSearchParams({ format: 'xlsx' });
+    if (filters?.startDate) params.set('start', filters.startDate);
+    if (filters?.endDate) params.set('end', filters.endDate);
+    if (filters?.department) params.set('department', DEPARTMENTS[filters.department] ?? filters.department);
+    // The employee box is a free-text search, not an exact emp_id, so it does not narrow the export
+    window.location.href = `${EXPORT_URL}?${params}`;
   };
 
   return (
     <button
       className={`${styles.actionButton} ${styles.exportButton}`}
       onClick={handleExport}
-      disabled={isExporting}
     >
       <HiDocumentDownload className={styles.actionIcon} />
-      {isExporting ? 'Exporting...' : 'Export to Excel'}
+      Export to Excel
     </button>
   );
 };
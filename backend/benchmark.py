@@ -0,0 +1,361 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+import numpy as np
+
+# Benchmark the recognition pipeline and the attendance/report endpoints in-process:
+#   python benchmark.py --sizes 1000,10000,100000 --output results.json
+# MongoDB is replaced by mongomock-motor (pip install mongomock-motor) unless --mongo-uri
+# points at a real server, in which case a scratch "attendance_benchmark" database is used.
+
+DATASET_DIR = "dataset/"
+DEPARTMENTS = ["Engineering", "HR", "Sales", "Finance", "Operations"]
+SEED_EMPLOYEES = 200
+SEED_DAYS = 30
+
+
+def summarize(samples):
+    """Latency percentiles in milliseconds for a list of durations in seconds"""
+    if not samples:
+        return {"n": 0}
+    ms = np.asarray(samples) * 1000
+    return {
+        "n": len(ms),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def synthetic_encodings(count, rng):
+    # Real 128-d face encodings have components of roughly +-0.3 and a norm close to 1
+    return rng.normal(scale=0.09, size=(count, 128)).astype(np.float32)
+
+
+def use_mongo_stand_in(uri):
+    """Point database.connection at the benchmark database before any app module imports it"""
+    import database.connection as connection
+
+    if uri:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        db = AsyncIOMotorClient(uri)["attendance_benchmark"]
+    else:
+        import mongomock.collection
+        from mongomock_motor import AsyncMongoMockClient
+
+        def bulk_write(self, requests, ordered=True, **kwargs):
+            # mongomock's bulk_write rejects the UpdateOne objects of pymongo >= 4.9; rollups only send upserts
+            for request in requests:
+                self.update_one(request._filter, request._doc, upsert=request._upsert)
+
+        mongomock.collection.Collection.bulk_write = bulk_write
+        db = AsyncMongoMockClient()["attendance_benchmark"]
+
+    connection.db = db
+    connection.attendance_collection = db["attendance_records"]
+    connection.weekly_attendance_collection = db["weekly_attendance"]
+    connection.monthly_attendance_collection = db["monthly_attendance"]
+    connection.yearly_attendance_collection = db["yearly_attendance"]
+    return db
+
+
+def frozen_clock(record_attendance, clock):
+    """record_attendance that always applies the rules at today `clock` (HH:MM), so every run takes the same path"""
+    hour, minute = map(int, clock.split(":"))
+    fixed = datetime.now().replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+    async def record_at_fixed_time(emp_ids, now, camera_id=None):
+        return await record_attendance(emp_ids, fixed, camera_id)
+
+    return record_at_fixed_time
+
+
+def grow_gallery(store, emp_offset, count, rng):
+    """Append `count` synthetic employees to the embedding store in one publish"""
+    encodings = synthetic_encodings(count, rng)
+    store.add_many([
+        (f"bench{emp_offset + i:06d}", encodings[i], f"synthetic-{emp_offset + i}", f"bench{emp_offset + i:06d}.jpg")
+        for i in range(count)
+    ])
+
+
+# ---------- Gallery matching ----------
+
+def bench_gallery(store, iterations, rng):
+    from recognition.embedding_store import attach_gallery
+    from recognition.gallery import Gallery
+
+    start = time.perf_counter()
+    gallery = Gallery(*store.load())
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    attach_gallery(store.store_dir)
+    attach = time.perf_counter() - start
+
+    results = {"size": len(gallery), "build_ms": round(build * 1000, 3), "attach_ms": round(attach * 1000, 3)}
+    for faces in (1, 8):
+        queries = gallery.matrix[rng.integers(0, len(gallery), faces)] + synthetic_encodings(faces, rng) * 0.2
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            gallery.match(queries, k=1)
+            samples.append(time.perf_counter() - start)
+        results[f"match_{faces}_faces"] = summarize(samples)
+    return results
+
+
+# ---------- Recognition pipeline stages ----------
+
+def bench_pipeline(store, frames, iterations):
+    """Per-stage latency of one worker job (decode, resize, detect, encode, match) on the dataset frames"""
+    from recognition import workers
+
+    workers._init_worker(store.store_dir)
+    stages = {}
+    totals = []
+    try:
+        for i in range(iterations):
+            start = time.perf_counter()
+            _, timings = workers.recognize_images([frames[i % len(frames)]], store.generation)
+            totals.append(time.perf_counter() - start)
+            for stage, seconds in timings.items():
+                stages.setdefault(stage, []).append(seconds)
+    except ImportError as e:
+        return {"skipped": f"recognition dependencies missing: {str(e)}"}
+    return {"total": summarize(totals), "stages": {stage: summarize(samples) for stage, samples in stages.items()}}
+
+
+# ---------- HTTP endpoints ----------
+
+def classify(response):
+    if response.status_code == 429:
+        return "queue_full"
+    if response.status_code >= 400:
+        return f"http_{response.status_code}"
+    if not response.headers.get("content-type", "").startswith("application/json"):
+        return "ok"
+    body = response.json()
+    if isinstance(body, dict) and "error" in body:
+        return "error"
+    if isinstance(body, dict) and body.get("message") == "No face recognized":
+        return "no_face"
+    if isinstance(body, dict) and "message" in body:
+        return "recorded" if "status" in body else "rejected"
+    return "ok"
+
+
+async def bench_requests(client, send, requests, concurrency):
+    """Fire `requests` calls of `send(client, i)` from `concurrency` concurrent clients"""
+    from services.metrics import outcomes, stage_seconds
+
+    stage_seconds.series.clear()
+    outcomes.values.clear()
+    pending = iter(range(requests))
+    latencies = []
+    results = Counter()
+
+    async def run_client():
+        for i in pending:  # Shared iterator: each request index is taken once
+            start = time.perf_counter()
+            response = await send(client, i)
+            latencies.append(time.perf_counter() - start)
+            results[classify(response)] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(requests / elapsed, 2) if elapsed else None,
+        "latency": summarize(latencies),
+        "results": dict(results),
+        "stage_mean_ms": {
+            stage[0]: round(total / count * 1000, 3)
+            for stage, (_, total, count) in sorted(stage_seconds.series.items()) if count
+        },
+        "outcomes": {outcome[0]: count for outcome, count in sorted(outcomes.values.items())},
+    }
+
+
+async def seed_attendance(db, rng):
+    """Users plus SEED_DAYS of check-in/check-out events for SEED_EMPLOYEES synthetic employees"""
+    from services.rollups import rebuild_rollups
+    from services.state_cache import employee_states
+
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    users, events = [], []
+    for i in range(SEED_EMPLOYEES):
+        emp_id, name, department = f"bench{i:06d}", f"Employee {i}", DEPARTMENTS[i % len(DEPARTMENTS)]
+        users.append({"emp_id": emp_id, "name": name, "role": "Staff", "department": department, "photo": ""})
+        employee_states.set_profile(emp_id, name, department)
+        for day in range(SEED_DAYS, 0, -1):
+            date = today - timedelta(days=day)
+            if date.weekday() >= 5:
+                continue
+            check_in = date + timedelta(hours=9, minutes=int(rng.integers(0, 30)))
+            check_out = date + timedelta(hours=17, minutes=int(rng.integers(0, 60)))
+            base = {"emp_id": emp_id, "emp_name": name, "department": department}
+            events.append({**base, "timestamp": check_in, "status": "Check-in",
+                           "timing_status": "On-time" if check_in.minute <= 15 else "Late",
+                           "recorded_time": check_in.strftime("%H:%M:%S")})
+            events.append({**base, "timestamp": check_out, "status": "Check-out", "timing_status": "N/A",
+                           "recorded_time": check_out.strftime("%H:%M:%S"),
+                           "worked_minutes": (check_out - check_in).total_seconds() / 60})
+            employee_states.apply(events[-1])
+    await db.users.insert_many(users)
+    await db.attendance_collection.insert_many(events)
+    await rebuild_rollups()
+    employee_states.warmed = True  # As after the startup warm-up
+    return len(events)
+
+
+def report_endpoints():
+    today = datetime.now().strftime("%Y-%m-%d")
+    month_ago = (datetime.now() - timedelta(days=SEED_DAYS)).strftime("%Y-%m-%d")
+    return {
+        "get_attendance_page": "/api/get-attendance?limit=500",
+        "get_attendance_filtered": f"/api/get-attendance?start={month_ago}&end={today}&department=HR",
+        "get_attendance_ndjson": f"/api/get-attendance?format=ndjson&start={month_ago}&end={today}",
+        "get_weekly_attendance": "/api/get-weekly-attendance?emp_id=bench000001",
+        "attendance_summary_monthly": "/api/get-attendance-summary?period=monthly",
+        "hours_rollups": "/api/get-hours?period=monthly&source=rollups",
+        "hours_events": "/api/get-hours?period=weekly",  # $setWindowFields: needs MongoDB 5.0+, not mongomock
+    }
+
+
+async def bench_http(app, frames, sizes, store, rng, args):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    results = {"mark_attendance": {}, "reports": {}}
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        async def mark(client, i):
+            return await client.post("/api/mark-attendance", files={"file": ("frame.jpg", frames[i % len(frames)], "image/jpeg")})
+
+        total = 0
+        for size in sizes:
+            grow_gallery(store, total, size - total, rng)
+            total = size
+            await client.post("/api/mark-attendance", files={"file": ("frame.jpg", frames[0], "image/jpeg")})  # Workers load the gallery
+            results["mark_attendance"][str(size)] = await bench_requests(client, mark, args.requests, args.concurrency)
+            print(f"mark-attendance @ {size}: {results['mark_attendance'][str(size)]['requests_per_sec']} req/s", file=sys.stderr)
+
+        for name, url in report_endpoints().items():
+            async def get(client, i, url=url):
+                return await client.get(url)
+            results["reports"][name] = await bench_requests(client, get, args.report_requests, args.concurrency)
+            print(f"{name}: {results['reports'][name]['requests_per_sec']} req/s", file=sys.stderr)
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark recognition and attendance throughput")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Synthetic gallery sizes")
+    parser.add_argument("--dataset", default=DATASET_DIR, help="Sample frames (*.jpg)")
+    parser.add_argument("--iterations", type=int, default=50, help="Repetitions for the matching and pipeline stage benchmarks")
+    parser.add_argument("--requests", type=int, default=200, help="/mark-attendance requests per gallery size")
+    parser.add_argument("--report-requests", type=int, default=50, help="Requests per report endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=None, help="RECOGNITION_WORKERS for the HTTP benchmark (default: CPU count)")
+    parser.add_argument("--clock", default="09:10", help="Fixed time of day for the attendance rules")
+    parser.add_argument("--with-caches", action="store_true", help="Keep the frame and cooldown caches (default: every request does the full work)")
+    parser.add_argument("--mongo-uri", help="Use a real MongoDB (scratch database attendance_benchmark) instead of mongomock")
+    parser.add_argument("--skip-http", action="store_true", help="Only run the in-process gallery and pipeline benchmarks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON results here (default: stdout)")
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+
+    # Configure the app through its environment variables before importing it
+    store_dir = tempfile.mkdtemp(prefix="attendance-benchmark-")
+    os.environ["EMBEDDING_STORE_DIR"] = store_dir
+    if args.workers is not None:
+        os.environ["RECOGNITION_WORKERS"] = str(args.workers)
+    if not args.with_caches:
+        os.environ["FRAME_CACHE_TTL"] = "0"
+        os.environ["ATTENDANCE_COOLDOWN_SECONDS"] = "0"
+    db = use_mongo_stand_in(args.mongo_uri)
+
+    from recognition.embedding_store import EmbeddingStore
+
+    rng = np.random.default_rng(args.seed)
+    frames = []
+    for filename in sorted(os.listdir(args.dataset)):
+        if filename.endswith(".jpg"):
+            with open(os.path.join(args.dataset, filename), "rb") as f:
+                frames.append(f.read())
+
+    results = {
+        "meta": {
+            "started": datetime.now().isoformat(timespec="seconds"),
+            "commit": subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "frames": len(frames),
+            "mongo": "mongodb" if args.mongo_uri else "mongomock",
+            "args": vars(args),
+        },
+        "gallery": {},
+        "pipeline": {},
+    }
+
+    try:
+        store = EmbeddingStore(store_dir)
+        total = 0
+        for size in sizes:
+            grow_gallery(store, total, size - total, rng)
+            total = size
+            results["gallery"][str(size)] = bench_gallery(store, args.iterations, rng)
+            results["pipeline"][str(size)] = bench_pipeline(store, frames, args.iterations) if frames else {"skipped": "no frames"}
+            print(f"gallery @ {size}: match 1 face p50 {results['gallery'][str(size)]['match_1_faces']['p50_ms']} ms", file=sys.stderr)
+
+        if not args.skip_http:
+            shutil.rmtree(store_dir)
+            os.makedirs(store_dir)
+            import database.migrations as migrations
+            from recognition.workers import recognition_pool
+            from services.attendance_writer import attendance_writer
+            import main as app_main
+            import routes.attendance as attendance_routes
+
+            migrations.timestamps_migrated = True  # As after the startup migration
+            attendance_routes.record_attendance = frozen_clock(attendance_routes.record_attendance, args.clock)
+            await attendance_routes.warm_gallery()  # As the startup task does
+            store = attendance_routes.embedding_store
+            results["seeded_events"] = await seed_attendance(db, rng)
+            try:
+                results.update(await bench_http(app_main.app, frames, sizes, store, rng, args))
+            finally:
+                await attendance_writer.stop()
+                recognition_pool.shutdown()
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
+        if args.mongo_uri:
+            await db.client.drop_database("attendance_benchmark")
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+        print(f"✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
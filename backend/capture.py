@@ -1,7 +1,22 @@
+import argparse
+import json
+import threading
+import time
+from datetime import datetime
 import cv2
 import requests
 
 URL = "http://127.0.0.1:8000/api/mark-attendance"  # ✅ Correct API endpoint
+STREAM_URL = "ws://127.0.0.1:8000/api/ws/stream"  # ✅ Persistent streaming endpoint
+EDGE_URL = "http://127.0.0.1:8000/api/mark-attendance/embeddings"  # ✅ Encodings computed on this machine
+
+parser = argparse.ArgumentParser(description="Camera client for the attendance backend")
+parser.add_argument("--mode", choices=["post", "stream", "edge"], default="stream",
+                    help="post: one HTTP request per frame (keep-alive session); stream: one WebSocket for all frames; "
+                         "edge: encode faces locally (needs face_recognition) and send only the encodings")
+parser.add_argument("--camera-id", default="camera-0")
+parser.add_argument("--max-fps", type=float, default=5.0, help="Maximum frames sent per second")
+args = parser.parse_args()
 
 face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
 
@@ -11,6 +26,113 @@ if not cap.isOpened():
     print("Error: Could not open camera.")
     exit()
 
+
+RECONNECT_MAX_SECONDS = 30
+
+
+class Stream:
+    """
+    WebSocket to the stream endpoint that comes back by itself: when the server
+    closes it (1013 while the gallery loads, a restart) or the network drops,
+    frames are skipped until the server's `retry_after`, or an exponential
+    backoff, has passed, then the next frame reconnects.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.ws = None
+        self.retry_at = 0.0
+        self.backoff = 1.0
+        self.retry_after = None  # From the server's last message, honored if it then closes
+
+    def pause(self, seconds=None):
+        if seconds is None:
+            seconds = self.backoff
+            self.backoff = min(self.backoff * 2, RECONNECT_MAX_SECONDS)
+        self.retry_at = time.monotonic() + seconds
+        print(f"Stream paused, retrying in {seconds:g}s")
+
+    def connect(self):
+        import websocket  # pip install websocket-client
+
+        try:
+            self.ws = websocket.create_connection(self.url, timeout=10)
+        except Exception as e:
+            print(f"Stream connection failed: {e}")
+            self.pause()
+            return
+        self.ws.settimeout(None)
+        self.retry_after = None
+        threading.Thread(target=self.print_results, args=(self.ws,), daemon=True).start()
+
+    def print_results(self, ws):
+        """Print results the server pushes back on the stream"""
+        try:
+            while True:
+                message = json.loads(ws.recv())
+                print(message)  # ✅ Print API response
+                self.retry_after = message.get("retry_after")
+                if self.retry_after is not None and ws is self.ws:
+                    self.retry_at = time.monotonic() + self.retry_after  # Server is busy, back off
+        except Exception:
+            pass
+        if ws is self.ws:  # Closed by the server or the network, not by us
+            self.ws = None
+            self.pause(self.retry_after)
+
+    def send(self, jpeg_bytes):
+        if time.monotonic() < self.retry_at:
+            return
+        if self.ws is None:
+            self.connect()
+            if self.ws is None:
+                return
+        try:
+            self.ws.send_binary(jpeg_bytes)
+            self.backoff = 1.0
+        except Exception as e:
+            print(f"Stream send failed: {e}")
+            self.ws = None
+            self.pause()
+
+
+if args.mode == "stream":
+    stream = Stream(f"{STREAM_URL}?camera_id={args.camera_id}")
+
+    def send(frame, faces):
+        _, img_encoded = cv2.imencode('.jpg', frame)
+        stream.send(img_encoded.tobytes())
+else:
+    session = requests.Session()  # ✅ Reuse one TCP connection for every frame
+
+    def handle_response(response):
+        if response.status_code == 200:
+            print(response.json())  # ✅ Print API response
+        elif response.status_code in (429, 503):
+            time.sleep(float(response.headers.get("Retry-After", 1)))  # ✅ Server is busy or warming up, back off
+
+    if args.mode == "edge":
+        import face_recognition
+
+        def send(frame, faces):
+            # Encode on the detected boxes here; the server only matches (~1KB per face instead of a JPEG)
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            locations = [(int(y), int(x + w), int(y + h), int(x)) for (x, y, w, h) in faces]
+            encodings = face_recognition.face_encodings(rgb_frame, locations)
+            handle_response(session.post(EDGE_URL, json={
+                "camera_id": args.camera_id,
+                "timestamp": datetime.now().astimezone().isoformat(),
+                "encodings": [encoding.tolist() for encoding in encodings],
+                "locations": [list(location) for location in locations],
+            }))
+    else:
+        def send(frame, faces):
+            _, img_encoded = cv2.imencode('.jpg', frame)
+            handle_response(session.post(URL, files={"file": ("image.jpg", img_encoded.tobytes(), "image/jpeg")}))
+
+min_interval = 1.0 / args.max_fps
+last_sent = 0.0
+
 while True:
     ret, frame = cap.read()
     if not ret:
@@ -20,17 +142,15 @@ while True:
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
     faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
 
+    preview = frame.copy()  # ✅ Boxes only on the preview, not in what gets sent/encoded
     for (x, y, w, h) in faces:
-        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        cv2.rectangle(preview, (x, y), (x + w, y + h), (0, 255, 0), 2)
 
-    cv2.imshow("Camera Preview", frame)  
+    cv2.imshow("Camera Preview", preview)
 
-    if len(faces) > 0:  # ✅ Only send if face is detected
-        _, img_encoded = cv2.imencode('.jpg', frame)
-        response = requests.post(URL, files={"file": ("image.jpg", img_encoded.tobytes(), "image/jpeg")})
-        
-        if response.status_code == 200:
-            print(response.json())  # ✅ Print API response
+    if len(faces) > 0 and time.monotonic() - last_sent >= min_interval:  # ✅ Only send if face is detected
+        send(frame, faces)
+        last_sent = time.monotonic()
 
     if cv2.waitKey(1) & 0xFF == ord("q"):  # ✅ Press 'q' to exit
         break
@@ -0,0 +1,22 @@
+from database.connection import (
+    db,
+    weekly_attendance_collection,
+    monthly_attendance_collection,
+    yearly_attendance_collection,
+)
+
+
+async def ensure_indexes():
+    """Create the indexes the attendance queries rely on (no-op if they already exist)"""
+    # Per-employee history and latest-status lookups
+    await db.attendance_collection.create_index([("emp_id", 1), ("timestamp", 1)])
+    # Company-wide date-range reports filtered by status
+    await db.attendance_collection.create_index([("timestamp", 1), ("status", 1)])
+    # `since` polling for newly written records
+    await db.attendance_collection.create_index([("inserted_at", 1), ("_id", 1)])
+    await db.users.create_index("emp_id")
+
+    # One rollup document per employee and period, looked up by period for dashboards
+    await weekly_attendance_collection.create_index([("week_start", 1), ("emp_id", 1)], unique=True)
+    await monthly_attendance_collection.create_index([("year", 1), ("month", 1), ("emp_id", 1)], unique=True)
+    await yearly_attendance_collection.create_index([("year", 1), ("emp_id", 1)], unique=True)
@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime
+from pymongo import UpdateOne
+from database.connection import db
+
+TIMESTAMP_MIGRATION = "attendance_timestamp_to_date"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Set once every string timestamp has been rewritten as a BSON date
+timestamps_migrated = False
+
+
+def timestamp_range(start=None, end=None):
+    """
+    Mongo filter for timestamp in [start, end). Until the migration has finished,
+    old string timestamps are matched too; both branches stay index-bounded.
+    """
+    def bounds(lo, hi):
+        condition = {}
+        if lo is not None:
+            condition["$gte"] = lo
+        if hi is not None:
+            condition["$lt"] = hi
+        return condition
+
+    date_filter = {"timestamp": bounds(start, end)}
+    if timestamps_migrated:
+        return date_filter
+    string_filter = {"timestamp": bounds(
+        start.strftime(TIMESTAMP_FORMAT) if start else "",
+        end.strftime(TIMESTAMP_FORMAT) if end else "\uffff",
+    )}
+    return {"$or": [date_filter, string_filter]}
+
+
+async def migrate_string_timestamps(batch_size=1000):
+    """
+    Rewrite "%Y-%m-%d %H:%M:%S" string timestamps in attendance_collection as
+    BSON dates, in _id order and in batches. Progress is saved after every
+    batch in the `migrations` collection, so an interrupted run resumes.
+    """
+    global timestamps_migrated
+    progress = await db.migrations.find_one({"_id": TIMESTAMP_MIGRATION}) or {}
+    if progress.get("done"):
+        timestamps_migrated = True
+        return progress.get("migrated", 0)
+
+    last_id = progress.get("last_id")
+    migrated = progress.get("migrated", 0)
+    while True:
+        query = {"timestamp": {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db.attendance_collection.find(query, {"timestamp": 1}).sort("_id", 1).limit(batch_size).to_list(None)
+        if not batch:
+            break
+
+        updates = []
+        for record in batch:
+            try:
+                parsed = datetime.strptime(record["timestamp"], TIMESTAMP_FORMAT)
+            except ValueError:
+                print(f"Skipping unparseable timestamp on {record['_id']}: {record['timestamp']}")
+                continue
+            updates.append(UpdateOne({"_id": record["_id"]}, {"$set": {"timestamp": parsed}}))
+        if updates:
+            await db.attendance_collection.bulk_write(updates, ordered=False)
+
+        last_id = batch[-1]["_id"]
+        migrated += len(updates)
+        await db.migrations.update_one(
+            {"_id": TIMESTAMP_MIGRATION},
+            {"$set": {"last_id": last_id, "migrated": migrated}},
+            upsert=True,
+        )
+
+    await db.migrations.update_one(
+        {"_id": TIMESTAMP_MIGRATION},
+        {"$set": {"done": True, "migrated": migrated, "finished_at": datetime.now()}},
+        upsert=True,
+    )
+    timestamps_migrated = True
+    print(f"Timestamp migration finished: {migrated} record(s) converted")
+    return migrated
+
+
+if __name__ == "__main__":
+    # python -m database.migrations
+    asyncio.run(migrate_string_timestamps())
@@ -0,0 +1,38 @@
+import argparse
+import asyncio
+import os
+from recognition.embedding_store import EmbeddingStore
+from services.enrollment import bulk_enroll
+
+UPLOAD_DIR = "dataset/"  # Same dataset directory the API uses
+
+
+def print_progress(job):
+    print(f"\r{job['processed']}/{job['total']} processed, {len(job['rejected'])} rejected", end="", flush=True)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Bulk-enroll users from an archive of photos and a CSV")
+    parser.add_argument("archive", help="zip or tar(.gz) of photos named {emp_id}.jpg")
+    parser.add_argument("--csv", help="CSV of emp_id,name,role,department (default: the CSV inside the archive)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parallel encoding processes")
+    args = parser.parse_args()
+
+    with open(args.archive, "rb") as f:
+        archive_bytes = f.read()
+    csv_text = None
+    if args.csv:
+        with open(args.csv, encoding="utf-8-sig") as f:
+            csv_text = f.read()
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    job = await bulk_enroll(archive_bytes, EmbeddingStore(), UPLOAD_DIR, csv_text,
+                            workers=args.workers, on_progress=print_progress)
+    print()
+    print(f"✅ Enrolled {job['accepted']} of {job['total']} users")
+    for rejected in job["rejected"]:
+        print(f"❌ {rejected['emp_id']}: {rejected['reason']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,7 +1,20 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from routes.attendance import router as attendance_router
+from routes.stream import router as stream_router
+from routes.metrics import router as metrics_router
+from routes.health import router as health_router
 from database.connection import db  # Ensure the database connection is imported
+from recognition.workers import recognition_pool
+from routes.attendance import warm_gallery
+from services.state_cache import employee_states
+from services.attendance_writer import attendance_writer
+from services.presence import presence_index
+from database.indexes import ensure_indexes
+from database.migrations import migrate_string_timestamps
+from services.metrics import request_timings, server_timing
+import asyncio
+import time
 
 app = FastAPI()
 
@@ -15,6 +28,82 @@ app.add_middleware(
 )
 
 app.include_router(attendance_router, prefix="/api")
+app.include_router(stream_router, prefix="/api")
+app.include_router(metrics_router)  # GET /metrics for Prometheus
+app.include_router(health_router)  # GET /healthz and /readyz for the orchestrator
+
+@app.middleware("http")
+async def add_server_timing(request: Request, call_next):
+    """Report the stages measured while handling the request in a Server-Timing header"""
+    timings = {}
+    token = request_timings.set(timings)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_timings.reset(token)
+    timings["total"] = time.perf_counter() - start
+    response.headers["Server-Timing"] = server_timing(timings)
+    response.headers["Timing-Allow-Origin"] = "*"  # Let the admin app read it from the browser
+    return response
+
+@app.on_event("startup")
+async def start_recognition_pool():
+    recognition_pool.start()  # Spawn recognition workers before the first frame arrives
+    # Dataset sync and worker warm-up run in the background; reports are served meanwhile, recognition answers 503
+    app.state.gallery_task = asyncio.create_task(warm_gallery())
+
+async def migrate_timestamps():
+    try:
+        await migrate_string_timestamps()
+    except Exception as e:
+        print(f"Timestamp migration stopped, it will resume on next start: {str(e)}")
+
+@app.on_event("startup")
+async def prepare_database():
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        print(f"Could not ensure indexes: {str(e)}")
+    # Batched and resumable, so it runs in the background instead of delaying startup
+    app.state.migration_task = asyncio.create_task(migrate_timestamps())
+
+@app.on_event("startup")
+async def replay_attendance_journal():
+    try:
+        replayed = await attendance_writer.replay()  # Before the state cache warms, so it sees these events
+        if replayed:
+            print(f"Replayed {replayed} journaled attendance event(s)")
+    except Exception as e:
+        print(f"Attendance journal not replayed, it is kept for the next start: {str(e)}")
+
+@app.on_event("startup")
+async def warm_employee_states():
+    try:
+        await employee_states.warm()  # One aggregation instead of two lookups per recognition
+        employee_states.start_sync()
+    except Exception as e:
+        print(f"Employee state cache not warmed, falling back to per-request lookups: {str(e)}")
+    # Dashboard bitmaps scan a year of check-ins; the first dashboard request waits for it if needed
+    app.state.presence_task = asyncio.create_task(warm_presence())
+
+async def warm_presence():
+    try:
+        await presence_index.ensure_warm()
+    except Exception as e:
+        print(f"Dashboard presence not warmed, it will be built on first use: {str(e)}")
+
+@app.on_event("shutdown")
+async def stop_recognition_pool():
+    recognition_pool.shutdown()
+
+@app.on_event("shutdown")
+async def flush_attendance_writes():
+    await attendance_writer.stop()  # Drain the write-behind queue before the process exits
+
+@app.on_event("shutdown")
+async def stop_employee_state_sync():
+    await employee_states.stop_sync()
 
 @app.get("/")
 async def home():
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import List, Optional
 from bson import ObjectId
 
 #  Model for Raw Attendance Records (Daily)
@@ -16,6 +17,9 @@ class WeeklyAttendance(BaseModel):
     total_present: int
     total_absent: int
     total_late: int
+    check_ins: int = 0
+    check_outs: int = 0
+    total_minutes: float = 0  # Worked minutes from check-in/check-out pairs
 
 #  Model for Monthly Attendance Summary
 class MonthlyAttendance(BaseModel):
@@ -25,6 +29,9 @@ class MonthlyAttendance(BaseModel):
     total_present: int
     total_absent: int
     total_late: int
+    check_ins: int = 0
+    check_outs: int = 0
+    total_minutes: float = 0  # Worked minutes from check-in/check-out pairs
 
 #  Model for Yearly Attendance Summary
 class YearlyAttendance(BaseModel):
@@ -33,3 +40,13 @@ class YearlyAttendance(BaseModel):
     total_present: int
     total_absent: int
     total_late: int
+    check_ins: int = 0
+    check_outs: int = 0
+    total_minutes: float = 0  # Worked minutes from check-in/check-out pairs
+
+#  Model for face encodings computed on an edge camera box
+class EdgeEncodings(BaseModel):
+    camera_id: str
+    timestamp: Optional[datetime] = None  # Capture time on the edge box, server time if omitted
+    encodings: List[List[float]]  # One 128-d face_recognition encoding per face
+    locations: Optional[List[List[int]]] = None  # top, right, bottom, left per face (echoed back)
@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import time
+import cv2
+import numpy as np
+from recognition.timing import stage
+
+FACE_DETECTOR = os.getenv("FACE_DETECTOR", "hog")  # hog / haar / yunet / cascade
+DETECTOR_SCALE = float(os.getenv("DETECTOR_SCALE", "0.5"))  # Detect on a downscaled frame
+DETECTOR_UPSAMPLE = int(os.getenv("DETECTOR_UPSAMPLE", "1"))  # HOG: times to upsample (finds smaller faces, slower)
+CASCADE_PREFILTER = os.getenv("CASCADE_PREFILTER", "haar")  # Cheap detector proposing regions in cascade mode
+CASCADE_DETECTOR = os.getenv("CASCADE_DETECTOR", "hog")  # Accurate detector run on those regions only
+YUNET_MODEL = os.getenv("YUNET_MODEL", "models/face_detection_yunet_2023mar.onnx")
+ROI_MARGIN = 0.5  # Cascade regions are grown by this fraction of the box size on each side
+
+# Face locations are (top, right, bottom, left) in full-frame pixels, as face_recognition returns them
+
+
+def _rescale(boxes, scale):
+    return [tuple(int(round(v / scale)) for v in box) for box in boxes]
+
+
+def _resize(frame, scale):
+    if scale == 1:
+        return frame
+    with stage("resize"):
+        return cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+
+
+class HogDetector:
+    """dlib HOG detector from face_recognition - the original detector, accurate but the costliest step"""
+
+    name = "hog"
+
+    def __init__(self, scale=DETECTOR_SCALE, upsample=DETECTOR_UPSAMPLE):
+        self.scale = scale
+        self.upsample = upsample
+
+    def detect(self, frame):
+        import face_recognition
+
+        rgb_frame = cv2.cvtColor(_resize(frame, self.scale), cv2.COLOR_BGR2RGB)
+        with stage("detect"):
+            locations = face_recognition.face_locations(rgb_frame, self.upsample, model="hog")
+        return _rescale(locations, self.scale)
+
+
+class HaarDetector:
+    """OpenCV Haar cascade (same as the capture client's preview) - very cheap, more false positives"""
+
+    name = "haar"
+
+    def __init__(self, scale=DETECTOR_SCALE, upsample=DETECTOR_UPSAMPLE, min_neighbors=5, min_face=0.1):
+        self.scale = scale  # `upsample` only applies to HOG
+        self.min_neighbors = min_neighbors
+        self.min_face = min_face  # Smallest face as a fraction of the frame's shorter side
+        self._cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+
+    def detect(self, frame):
+        gray = cv2.equalizeHist(cv2.cvtColor(_resize(frame, self.scale), cv2.COLOR_BGR2GRAY))
+        min_size = max(int(min(gray.shape) * self.min_face), 30)
+        with stage("detect"):
+            boxes = self._cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=self.min_neighbors, minSize=(min_size, min_size))
+        return _rescale([(y, x + w, y + h, x) for x, y, w, h in boxes], self.scale)
+
+
+class YuNetDetector:
+    """OpenCV DNN face detector (YuNet ONNX model, CPU) - close to HOG accuracy at a fraction of its cost"""
+
+    name = "yunet"
+
+    def __init__(self, scale=DETECTOR_SCALE, upsample=DETECTOR_UPSAMPLE, model_path=YUNET_MODEL, score_threshold=0.8):
+        if not os.path.exists(model_path):
+            raise RuntimeError(f"YuNet model not found at {model_path} (set YUNET_MODEL)")
+        self.scale = scale  # `upsample` only applies to HOG
+        self._net = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold)
+
+    def detect(self, frame):
+        small = _resize(frame, self.scale)
+        self._net.setInputSize((small.shape[1], small.shape[0]))
+        with stage("detect"):
+            _, faces = self._net.detect(small)
+        if faces is None:
+            return []
+        return _rescale([(y, x + w, y + h, x) for x, y, w, h in faces[:, :4]], self.scale)
+
+
+def _overlap(a, b):
+    """Intersection over union of two (top, right, bottom, left) boxes"""
+    height = min(a[2], b[2]) - max(a[0], b[0])
+    width = min(a[1], b[1]) - max(a[3], b[3])
+    if height <= 0 or width <= 0:
+        return 0.0
+    inter = height * width
+    area = lambda box: (box[2] - box[0]) * (box[1] - box[3])
+    return inter / (area(a) + area(b) - inter)
+
+
+class CascadeDetector:
+    """
+    Cheap prefilter first: frames where it finds nothing are rejected outright,
+    otherwise the accurate detector runs only on the proposed regions (grown by
+    ROI_MARGIN), which also drops the prefilter's false positives.
+    """
+
+    name = "cascade"
+
+    def __init__(self, prefilter, detector):
+        self.prefilter = prefilter
+        self.detector = detector
+
+    def detect(self, frame):
+        height, width = frame.shape[:2]
+        faces = []
+        for top, right, bottom, left in self.prefilter.detect(frame):
+            pad_y = int((bottom - top) * ROI_MARGIN)
+            pad_x = int((right - left) * ROI_MARGIN)
+            y0, x0 = max(top - pad_y, 0), max(left - pad_x, 0)
+            roi = frame[y0:min(bottom + pad_y, height), x0:min(right + pad_x, width)]
+            for t, r, b, l in self.detector.detect(roi):
+                box = (t + y0, r + x0, b + y0, l + x0)
+                if all(_overlap(box, other) < 0.5 for other in faces):  # Overlapping regions find the same face
+                    faces.append(box)
+        return faces
+
+
+DETECTORS = {
+    "hog": HogDetector,
+    "haar": HaarDetector,
+    "yunet": YuNetDetector,
+}
+
+
+def build_detector(name=FACE_DETECTOR, scale=DETECTOR_SCALE, upsample=DETECTOR_UPSAMPLE):
+    """Detector by name; "cascade" chains CASCADE_PREFILTER into CASCADE_DETECTOR"""
+    if name == "cascade":
+        # Regions are small crops, so the accurate detector runs on them at full size
+        return CascadeDetector(DETECTORS[CASCADE_PREFILTER](scale, upsample), DETECTORS[CASCADE_DETECTOR](1.0, upsample))
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown face detector: {name}")
+    return DETECTORS[name](scale, upsample)
+
+
+# ---------- Latency / accuracy report ----------
+
+def detector_report(backends, images, gallery=None, threshold=None):
+    """
+    Run every backend over labelled images ({emp_id}.jpg, one face each) and
+    report per-image latency, detection rate and, with a gallery, how often
+    the detected face is identified as the right employee.
+    """
+    from recognition.pipeline import encode_faces
+    from recognition.gallery import MATCH_THRESHOLD
+
+    threshold = threshold or MATCH_THRESHOLD
+    report = {}
+    for name in backends:
+        detector = build_detector(name)
+        latencies, detected, extra, correct = [], 0, 0, 0
+        for emp_id, frame in images:
+            start = time.perf_counter()
+            locations = detector.detect(frame)
+            latencies.append((time.perf_counter() - start) * 1000)
+            detected += bool(locations)
+            extra += max(len(locations) - 1, 0)
+            if gallery is not None and locations:
+                best = gallery.identify(encode_faces(frame, locations[:1]), threshold)[0]
+                correct += best == emp_id
+        latencies = np.asarray(latencies)
+        report[name] = {
+            "images": len(images),
+            "mean_ms": round(float(latencies.mean()), 2) if len(latencies) else None,
+            "p50_ms": round(float(np.percentile(latencies, 50)), 2) if len(latencies) else None,
+            "p95_ms": round(float(np.percentile(latencies, 95)), 2) if len(latencies) else None,
+            "detection_rate": round(detected / len(images), 3) if images else None,
+            "extra_faces": extra,  # More than one face in a single-face image: likely false positives
+            "identification_rate": round(correct / len(images), 3) if images and gallery is not None else None,
+        }
+    return report
+
+
+def load_labelled_images(dataset_dir):
+    images = []
+    for filename in sorted(os.listdir(dataset_dir)):
+        if filename.endswith(".jpg"):
+            frame = cv2.imread(os.path.join(dataset_dir, filename))
+            if frame is not None:
+                images.append((filename.split(".")[0], frame))
+    return images
+
+
+if __name__ == "__main__":
+    # python -m recognition.detectors --dataset dataset/ --backends hog,haar,cascade
+    parser = argparse.ArgumentParser(description="Compare face detection backends on enrollment photos")
+    parser.add_argument("--dataset", default="dataset/")
+    parser.add_argument("--backends", default="hog,haar,cascade")
+    parser.add_argument("--no-identify", action="store_true", help="Only measure detection, skip encoding and matching")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    gallery = None
+    if not args.no_identify:
+        from recognition.embedding_store import EmbeddingStore
+        from recognition.gallery import Gallery
+
+        gallery = Gallery(*EmbeddingStore().load())
+    report = detector_report(args.backends.split(","), load_labelled_images(args.dataset), gallery)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'backend':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'detected':>10}{'extra':>8}{'identified':>12}")
+        for name, row in report.items():
+            print(f"{name:<10}{row['mean_ms']!s:>10}{row['p50_ms']!s:>10}{row['p95_ms']!s:>10}"
+                  f"{row['detection_rate']!s:>10}{row['extra_faces']!s:>8}{row['identification_rate']!s:>12}")
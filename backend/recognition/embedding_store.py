@@ -0,0 +1,458 @@
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+import numpy as np
+from recognition.gallery import Gallery, ann_wanted, load_ann
+
+try:
+    import fcntl  # Cross-process store lock; not available on Windows
+except ImportError:
+    fcntl = None
+
+EMBEDDING_DIM = 128
+STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", "embeddings/")
+VECTORS_FILE = "encodings.f32"
+INDEX_FILE = "index.json"
+CHANGE_LOG_SIZE = 1000  # Recent changes kept in the index so workers can catch up incrementally
+SEGMENT_POINTER = "gallery.json"
+LOCK_FILE = "store.lock"
+ROW_BYTES = EMBEDDING_DIM * 4
+
+
+def file_digest(path):
+    """SHA-1 of an image file's content, used to spot changed or duplicate images"""
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def encode_image_file(path):
+    """Return the first face encoding found in an image file, or None"""
+    import face_recognition
+
+    img = face_recognition.load_image_file(path)
+    encodings = face_recognition.face_encodings(img)
+    return encodings[0] if encodings else None
+
+
+def template_id(source):
+    """"primary" for the enrollment photo `{emp_id}.jpg`, else the file name of `{emp_id}/{id}.jpg`"""
+    if "/" not in source:
+        return "primary"
+    return os.path.splitext(os.path.basename(source))[0]
+
+
+def dataset_images(dataset_dir):
+    """(source, emp_id) for `{emp_id}.jpg` and every `{emp_id}/*.jpg` extra template"""
+    images = []
+    for filename in sorted(os.listdir(dataset_dir)):
+        path = os.path.join(dataset_dir, filename)
+        if filename.endswith(".jpg") and os.path.isfile(path):
+            images.append((filename, filename.split(".")[0]))
+        elif os.path.isdir(path):
+            for template in sorted(os.listdir(path)):
+                if template.endswith(".jpg"):
+                    images.append((f"{filename}/{template}", filename))
+    return images
+
+
+def attach_gallery(store_dir=STORE_DIR, known_generation=None):
+    """
+    Zero-copy view of the most recently published gallery segment: the matrix
+    and norms are memory-mapped read-only, so every worker process shares one
+    copy in the page cache. A large gallery's ANN index is loaded from the
+    segment's `.hnsw` file rather than built again. Returns (generation,
+    Gallery), or None when nothing newer than `known_generation` has been published.
+    """
+    try:
+        with open(os.path.join(store_dir, SEGMENT_POINTER)) as f:
+            meta = json.load(f)
+        if meta["generation"] == known_generation:
+            return None
+        size = meta["size"]
+        if size == 0:
+            return meta["generation"], Gallery(use_ann=False, centroids=meta["centroids"])
+        data = np.memmap(os.path.join(store_dir, meta["data"]), dtype=np.float32, mode="r", shape=(size * (EMBEDDING_DIM + 1),))
+        ann = load_ann(os.path.join(store_dir, meta["ann"]), size) if meta.get("ann") else None
+    except (FileNotFoundError, ValueError, RuntimeError):
+        return None  # Not published yet, or superseded and cleaned up mid-read
+    matrix = data[:size * EMBEDDING_DIM].reshape(size, EMBEDDING_DIM)
+    gallery = Gallery(meta["emp_ids"], matrix, meta["keys"], use_ann=False, centroids=meta["centroids"],
+                      sq_norms=data[size * EMBEDDING_DIM:], ann=ann)
+    return meta["generation"], gallery
+
+
+class EmbeddingStore:
+    """
+    Persistent face-embedding store.
+
+    Encodings live in one append-only float32 file (`encodings.f32`, N x 128)
+    that is memory-mapped on load. `index.json` maps each image to its emp_id,
+    content hash and row; identical content shares one row, so only new or
+    changed images are ever encoded.
+
+    An employee can have several templates: the enrollment photo
+    `{emp_id}.jpg` plus any number of `{emp_id}/{template_id}.jpg`. Every
+    index write bumps the generation and logs which templates were added or
+    removed, so a worker's in-memory gallery can apply just those changes.
+
+    After every write the live gallery is also published as a segment file
+    (`gallery-{generation}.f32` plus the `gallery.json` pointer) that workers
+    memory-map via `attach_gallery` instead of each building their own copy.
+
+    Every update holds an exclusive lock on `store.lock`, because each uvicorn
+    worker syncs at startup and the enroll CLI writes the same files.
+    """
+
+    def __init__(self, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        self.vectors_path = os.path.join(store_dir, VECTORS_FILE)
+        self.index_path = os.path.join(store_dir, INDEX_FILE)
+        os.makedirs(store_dir, exist_ok=True)
+        self._index_mtime = None
+        self.index = self._read_index()
+        self._vectors = None
+        self._digest_rows = {e["sha1"]: e["row"] for e in self.entries.values()}
+        self._changes = []
+        self._thread_lock = threading.RLock()
+        self._lock_file = None
+        self._lock_depth = 0
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive access to the store files, across threads and processes; re-entrant within a thread"""
+        with self._thread_lock:
+            if self._lock_depth == 0:
+                self._lock_file = open(os.path.join(self.store_dir, LOCK_FILE), "a")
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    self._lock_file.close()  # Releases the flock
+                    self._lock_file = None
+
+    # ---------- Index ----------
+
+    def _read_index(self):
+        if os.path.exists(self.index_path):
+            self._index_mtime = os.stat(self.index_path).st_mtime_ns
+            with open(self.index_path) as f:
+                return json.load(f)
+        return {"generation": 0, "rows": 0, "entries": {}}
+
+    def refresh(self):
+        """Re-read the index if another process (e.g. the enroll CLI) has rewritten it"""
+        if not self._thread_lock.acquire(blocking=False):
+            return  # Another thread is writing, and keeps the index current
+        try:
+            try:
+                mtime = os.stat(self.index_path).st_mtime_ns
+            except FileNotFoundError:
+                return
+            if mtime != self._index_mtime:
+                self.index = self._read_index()
+                self._vectors = None
+                self._digest_rows = {e["sha1"]: e["row"] for e in self.entries.values()}
+                self._changes = []
+        finally:
+            self._thread_lock.release()
+
+    def _write_index(self):
+        generation = self.index.get("generation", 0) + 1  # Lets other processes notice the change
+        self.index["generation"] = generation
+        log = self.index.setdefault("changes", [])
+        log.extend({**change, "generation": generation} for change in self._changes)
+        del log[:-CHANGE_LOG_SIZE]
+        self._changes = []
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)  # Atomic swap so readers never see a partial index
+        self._index_mtime = os.stat(self.index_path).st_mtime_ns
+        try:
+            self.publish()
+        except OSError as e:
+            print(f"Error publishing gallery segment: {str(e)}")
+
+    def publish(self):
+        """
+        Write the live gallery (matrix + squared norms, centroids included) as a new
+        segment and atomically repoint `gallery.json` at it. Workers still mapping an
+        older segment keep a valid view until they swap on their next request.
+        A gallery big enough for ANN matching gets its index built here, once, and
+        saved next to the segment (`gallery-{generation}.hnsw`) for workers to load.
+        """
+        generation = self.index.get("generation", 0)
+        gallery = Gallery(*self.load(), use_ann=False)
+        data_name = f"gallery-{generation}.f32"
+        data_path = os.path.join(self.store_dir, data_name)
+        tmp_suffix = f".{os.getpid()}.tmp"
+        with open(data_path + tmp_suffix, "wb") as f:
+            f.write(gallery.matrix.tobytes())
+            f.write(gallery.sq_norms.tobytes())
+        os.replace(data_path + tmp_suffix, data_path)
+        ann_name = None
+        if ann_wanted(len(gallery)):
+            ann_name = f"gallery-{generation}.hnsw"
+            ann_path = os.path.join(self.store_dir, ann_name)
+            gallery.save_ann(ann_path + tmp_suffix)
+            os.replace(ann_path + tmp_suffix, ann_path)
+
+        pointer_path = os.path.join(self.store_dir, SEGMENT_POINTER)
+        meta = {
+            "generation": generation,
+            "size": len(gallery),
+            "data": data_name,
+            "ann": ann_name,
+            "centroids": gallery.centroids,
+            "emp_ids": gallery.emp_ids,
+            "keys": gallery.keys,
+        }
+        with open(pointer_path + tmp_suffix, "w") as f:
+            json.dump(meta, f)
+        os.replace(pointer_path + tmp_suffix, pointer_path)
+
+        # Keep the previous segment for readers that just read the old pointer
+        for filename in os.listdir(self.store_dir):
+            name, ext = os.path.splitext(filename)
+            if name.startswith("gallery-") and ext in (".f32", ".hnsw"):
+                old_generation = int(name[len("gallery-"):])
+                if old_generation < generation - 1:
+                    try:
+                        os.remove(os.path.join(self.store_dir, filename))
+                    except OSError:
+                        pass  # Still mapped on platforms that forbid removing it
+
+    @property
+    def generation(self):
+        self.refresh()
+        return self.index.get("generation", 0)
+
+    @property
+    def entries(self):
+        return self.index["entries"]
+
+    def row_for_digest(self, digest):
+        """Row of an already-encoded image with the same content, if any"""
+        return self._digest_rows.get(digest)
+
+    def templates(self, emp_id):
+        """
+        Every template stored for an employee: [{"template_id", "source", "sha1"}].
+        Reads a snapshot taken under the store's thread lock, since writes run on
+        other threads; call it through asyncio.to_thread from the event loop.
+        """
+        with self._thread_lock:
+            entries = list(self.entries.items())
+        return [
+            {"template_id": template_id(source), "source": source, "sha1": entry["sha1"]}
+            for source, entry in sorted(entries) if entry["emp_id"] == emp_id
+        ]
+
+    def changes_since(self, generation):
+        """
+        Template changes made after `generation`, oldest first, or None when the
+        log no longer reaches back that far (or rows were renumbered by a compaction)
+        and the caller has to reload everything.
+        """
+        self.refresh()
+        if generation == self.index.get("generation", 0):
+            return []
+        log = self.index.get("changes", [])
+        if not log or log[0]["generation"] > generation + 1:
+            return None
+        changes = [change for change in log if change["generation"] > generation]
+        if any(change["op"] == "reset" for change in changes):
+            return None
+        return changes
+
+    # ---------- Vectors ----------
+
+    def vectors(self):
+        """Memory-mapped view of every stored row (live and dead)"""
+        rows = self.index["rows"]
+        if rows == 0:
+            return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        if self._vectors is None or self._vectors.shape[0] != rows:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, EMBEDDING_DIM))
+        return self._vectors
+
+    def load(self):
+        """Return (emp_ids, encodings, sources) for every live entry"""
+        live = sorted(self.entries.items(), key=lambda item: item[1]["row"])
+        emp_ids = [entry["emp_id"] for _, entry in live]
+        sources = [source for source, _ in live]
+        if not live:
+            return emp_ids, np.empty((0, EMBEDDING_DIM), dtype=np.float32), sources
+        rows = np.fromiter((entry["row"] for _, entry in live), dtype=np.int64, count=len(live))
+        return emp_ids, np.asarray(self.vectors()[rows]), sources
+
+    def _append_vectors(self, vectors):
+        """
+        Write vectors right after the last row the index knows about and return
+        the first new row. Bytes past that point were appended by a write whose
+        index update never happened (a crashed sync), so they are cut off first;
+        otherwise row numbers and file offsets would drift apart.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        first_row = self.index["rows"]
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(first_row * ROW_BYTES)
+            f.write(vectors.tobytes())
+        self.index["rows"] = first_row + len(vectors)
+        self._vectors = None
+        return first_row
+
+    # ---------- Updates ----------
+
+    def _set_entry(self, source, emp_id, digest, row):
+        entry = self.entries.get(source)
+        if entry == {"emp_id": emp_id, "sha1": digest, "row": row}:
+            return
+        if entry is not None and entry["emp_id"] != emp_id:
+            self._drop_entry(source)
+        self.entries[source] = {"emp_id": emp_id, "sha1": digest, "row": row}
+        self._digest_rows[digest] = row
+        self._changes.append({"op": "add", "source": source, "emp_id": emp_id, "row": row})
+
+    def _drop_entry(self, source):
+        entry = self.entries.pop(source, None)
+        if entry is not None:
+            self._changes.append({"op": "remove", "source": source, "emp_id": entry["emp_id"]})
+        return entry
+
+    def _put(self, source, emp_id, digest, encode, path):
+        """Point `source` at a row for `digest`, encoding only if no row exists. Returns True if encoded."""
+        row = self.row_for_digest(digest)
+        encoded = False
+        if row is None:
+            encoding = encode(path)
+            if encoding is None:
+                self._drop_entry(source)
+                return False
+            row = self._append_vectors([encoding])
+            encoded = True
+        self._set_entry(source, emp_id, digest, row)
+        return encoded
+
+    def add(self, emp_id, encoding, digest, source, replace=False):
+        """
+        Append an already computed encoding and persist the index. With
+        `replace`, the employee's other templates are dropped in the same write.
+        """
+        with self._locked():
+            self.refresh()
+            if replace:
+                for other in [s for s, e in self.entries.items() if e["emp_id"] == emp_id and s != source]:
+                    self._drop_entry(other)
+            row = self.row_for_digest(digest)
+            if row is None:
+                row = self._append_vectors([encoding])
+            self._set_entry(source, emp_id, digest, row)
+            self._write_index()
+            return row
+
+    def remove(self, source):
+        """Delete one template. Returns False if it was not stored."""
+        with self._locked():
+            self.refresh()
+            if self._drop_entry(source) is None:
+                return False
+            self._write_index()
+            return True
+
+    def remove_employee(self, emp_id):
+        """Delete every template of an employee. Returns the removed sources."""
+        with self._locked():
+            self.refresh()
+            sources = [source for source, entry in self.entries.items() if entry["emp_id"] == emp_id]
+            for source in sources:
+                self._drop_entry(source)
+            if sources:
+                self._write_index()
+            return sources
+
+    def add_many(self, items):
+        """
+        Append many (emp_id, encoding, digest, source) items with one write to
+        the vectors file and one index update, so workers reload only once.
+        """
+        with self._locked():
+            self.refresh()
+            if not items:
+                return
+            first_row = self._append_vectors([encoding for _, encoding, _, _ in items])
+            for offset, (emp_id, _, digest, source) in enumerate(items):
+                self._set_entry(source, emp_id, digest, first_row + offset)
+            self._write_index()
+
+    def add_image(self, path, emp_id, encode=encode_image_file, source=None):
+        """Encode a single image (unless its content is already stored) and append it"""
+        with self._locked():
+            self.refresh()
+            source = source or os.path.basename(path)
+            self._put(source, emp_id, file_digest(path), encode, path)
+            self._write_index()
+            return source in self.entries
+
+    def sync(self, dataset_dir, encode=encode_image_file):
+        """
+        Bring the store in line with `dataset_dir`: encode new or changed
+        images, drop entries whose image is gone. Returns the number encoded.
+        """
+        with self._locked():
+            self.refresh()
+            seen = set()
+            encoded = 0
+            for source, emp_id in dataset_images(dataset_dir):
+                seen.add(source)
+                path = os.path.join(dataset_dir, source)
+                digest = file_digest(path)
+                entry = self.entries.get(source)
+                if entry and entry["sha1"] == digest and entry["emp_id"] == emp_id:
+                    continue  # Unchanged image, reuse stored vector
+                if self._put(source, emp_id, digest, encode, path):
+                    encoded += 1
+
+            for source in [s for s in self.entries if s not in seen]:
+                self._drop_entry(source)
+
+            if self._changes or not os.path.exists(self.index_path):
+                self._write_index()
+            elif not os.path.exists(os.path.join(self.store_dir, SEGMENT_POINTER)):
+                self.publish()  # Store from before segments existed
+            if self.dead_rows() > len(self.entries):
+                self.compact()
+            return encoded
+
+    def dead_rows(self):
+        live_rows = {e["row"] for e in self.entries.values()}
+        return self.index["rows"] - len(live_rows)
+
+    def compact(self):
+        """Rewrite the vectors file keeping only live rows"""
+        with self._locked():
+            self.refresh()
+            vectors = self.vectors()
+            remap = {}
+            tmp_path = self.vectors_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                for entry in sorted(self.entries.values(), key=lambda e: e["row"]):
+                    if entry["row"] not in remap:
+                        remap[entry["row"]] = len(remap)
+                        f.write(np.asarray(vectors[entry["row"]], dtype=np.float32).tobytes())
+                    entry["row"] = remap[entry["row"]]
+            self._vectors = None
+            os.replace(tmp_path, self.vectors_path)
+            self.index["rows"] = len(remap)
+            self._digest_rows = {e["sha1"]: e["row"] for e in self.entries.values()}
+            self._changes.append({"op": "reset"})  # Rows were renumbered, workers must reload
+            self._write_index()
@@ -0,0 +1,255 @@
+import os
+import numpy as np
+
+try:
+    import hnswlib  # Optional: approximate nearest-neighbour search for very large galleries
+except ImportError:
+    hnswlib = None
+
+EMBEDDING_DIM = 128
+MATCH_THRESHOLD = 0.5
+ANN_MIN_SIZE = int(os.getenv("GALLERY_ANN_MIN_SIZE", "50000"))
+USE_CENTROIDS = os.getenv("GALLERY_CENTROIDS", "0") == "1"  # Also match against each employee's mean template
+CENTROID_SUFFIX = "#centroid"
+
+
+def ann_wanted(size):
+    """Whether a gallery of `size` templates is matched through an ANN index by default"""
+    return hnswlib is not None and size >= ANN_MIN_SIZE
+
+
+def load_ann(path, size):
+    """Load an ANN index saved by `Gallery.save_ann`, for a gallery of `size` rows (None without hnswlib)"""
+    if hnswlib is None:
+        return None
+    index = hnswlib.Index(space="l2", dim=EMBEDDING_DIM)
+    index.load_index(path, max_elements=max(size, 16), allow_replace_deleted=True)
+    index.set_ef(64)
+    return index
+
+
+class Gallery:
+    """
+    Known faces held as one contiguous float32 matrix with precomputed
+    squared norms, so every face in a frame is matched against every
+    template in a single batched NumPy operation.
+
+    An employee may have several templates, each identified by a key (the
+    store's source name). Templates are added, replaced and removed in
+    place - rows live in a buffer with spare capacity and removal moves the
+    last row into the hole - so changes never rebuild the matrix.
+
+    Passing `sq_norms` attaches to existing arrays without copying (e.g. a
+    read-only memory-mapped segment shared by every worker); the first
+    change then copies them into a private buffer. `ann` likewise takes an
+    already built ANN index whose labels are the row numbers.
+    """
+
+    def __init__(self, emp_ids=(), encodings=None, keys=None, use_ann=None, centroids=USE_CENTROIDS, sq_norms=None, ann=None):
+        emp_ids = list(emp_ids)
+        if encodings is None:
+            encodings = np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        keys = list(keys) if keys is not None else [str(i) for i in range(len(emp_ids))]
+
+        self.size = len(keys)
+        if sq_norms is not None:
+            self._buffer = encodings
+            self._norms = sq_norms
+        else:
+            self._buffer = np.empty((max(self.size, 16), EMBEDDING_DIM), dtype=np.float32)
+            self._buffer[:self.size] = encodings
+            self._norms = np.empty(self._buffer.shape[0], dtype=np.float32)
+            self._norms[:self.size] = np.einsum("ij,ij->i", encodings, encodings)
+        self.emp_ids = emp_ids
+        self.keys = keys
+        self._positions = {key: i for i, key in enumerate(keys)}
+        self._emp_keys = {}
+        for key, emp_id in zip(keys, emp_ids):
+            self._emp_keys.setdefault(emp_id, set()).add(key)
+
+        if use_ann is None:
+            use_ann = ann_wanted(len(self))
+        self._labels = list(range(self.size))  # ANN label of every row; labels stay fixed while rows move
+        self._label_rows = dict(enumerate(range(self.size)))
+        self._next_label = self.size
+        self._ann = ann if ann is not None else self._build_ann() if use_ann else None
+
+        self.centroids = centroids
+        if centroids and sq_norms is None:  # An attached segment already holds its centroids
+            for emp_id in list(self._emp_keys):
+                self._refresh_centroid(emp_id)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def matrix(self):
+        return self._buffer[:self.size]
+
+    @property
+    def sq_norms(self):
+        return self._norms[:self.size]
+
+    def _build_ann(self):
+        if hnswlib is None:
+            raise RuntimeError("hnswlib is required for approximate matching")
+        index = hnswlib.Index(space="l2", dim=EMBEDDING_DIM)
+        index.init_index(max_elements=max(len(self), 16), ef_construction=200, M=16, allow_replace_deleted=True)
+        if len(self):
+            index.add_items(self.matrix, np.asarray(self._labels))
+        index.set_ef(64)
+        return index
+
+    def save_ann(self, path):
+        """Write an ANN index over the current rows (built now if this gallery has none)"""
+        (self._ann or self._build_ann()).save_index(path)
+
+    # ---------- Incremental updates ----------
+
+    def _grow(self):
+        capacity = max(self._buffer.shape[0] * 2, 16)
+        buffer = np.empty((capacity, EMBEDDING_DIM), dtype=np.float32)
+        buffer[:self.size] = self.matrix
+        norms = np.empty(capacity, dtype=np.float32)
+        norms[:self.size] = self.sq_norms
+        self._buffer, self._norms = buffer, norms
+
+    def add(self, key, emp_id, encoding):
+        """Add a template, or overwrite the one already stored under `key`"""
+        vector = np.asarray(encoding, dtype=np.float32).reshape(EMBEDDING_DIM)
+        if not self._buffer.flags.writeable:
+            self._grow()  # Copy-on-write away from a shared read-only segment
+        row = self._positions.get(key)
+        if row is not None and self.emp_ids[row] != emp_id:
+            self.remove(key)
+            row = None
+        if row is None:
+            if self.size == self._buffer.shape[0]:
+                self._grow()
+            row = self.size
+            self.size += 1
+            self.emp_ids.append(emp_id)
+            self.keys.append(key)
+            self._positions[key] = row
+            self._emp_keys.setdefault(emp_id, set()).add(key)
+            self._labels.append(self._next_label)
+            self._label_rows[self._next_label] = row
+            self._next_label += 1
+        self._buffer[row] = vector
+        self._norms[row] = vector @ vector
+
+        if self._ann is not None:
+            if self._ann.get_current_count() >= self._ann.get_max_elements():
+                self._ann.resize_index(self._ann.get_max_elements() * 2)
+            self._ann.add_items(vector[None, :], np.asarray([self._labels[row]]), replace_deleted=True)
+        if self.centroids and not key.endswith(CENTROID_SUFFIX):
+            self._refresh_centroid(emp_id)
+
+    def remove(self, key):
+        """Drop one template; the last row moves into its place. Returns False if unknown."""
+        row = self._positions.pop(key, None)
+        if row is None:
+            return False
+        if not self._buffer.flags.writeable:
+            self._grow()
+        emp_id = self.emp_ids[row]
+        label = self._labels[row]
+        last = self.size - 1
+        if row != last:
+            self._buffer[row] = self._buffer[last]
+            self._norms[row] = self._norms[last]
+            self.emp_ids[row] = self.emp_ids[last]
+            self.keys[row] = self.keys[last]
+            self._labels[row] = self._labels[last]
+            self._positions[self.keys[row]] = row
+            self._label_rows[self._labels[row]] = row
+        self.emp_ids.pop()
+        self.keys.pop()
+        self._labels.pop()
+        del self._label_rows[label]
+        self.size = last
+        if self._ann is not None:
+            self._ann.mark_deleted(label)
+
+        keys = self._emp_keys.get(emp_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._emp_keys[emp_id]
+        if self.centroids and not key.endswith(CENTROID_SUFFIX):
+            self._refresh_centroid(emp_id)
+        return True
+
+    def remove_employee(self, emp_id):
+        """Drop every template of an employee. Returns how many were removed."""
+        keys = list(self._emp_keys.get(emp_id, ()))
+        for key in keys:
+            self.remove(key)
+        return len(keys)
+
+    def _refresh_centroid(self, emp_id):
+        """Keep `{emp_id}#centroid` at the mean of the employee's templates (only with 2+ templates)"""
+        centroid_key = emp_id + CENTROID_SUFFIX
+        rows = [self._positions[key] for key in self._emp_keys.get(emp_id, ()) if key != centroid_key]
+        if len(rows) < 2:
+            self.remove(centroid_key)
+            return
+        self.add(centroid_key, emp_id, self._buffer[rows].mean(axis=0))
+
+    def templates(self, emp_id):
+        return sorted(key for key in self._emp_keys.get(emp_id, ()) if not key.endswith(CENTROID_SUFFIX))
+
+    # ---------- Matching ----------
+
+    def distances(self, encodings):
+        """Euclidean distance matrix (faces x templates) via ||a||^2 + ||b||^2 - 2ab"""
+        queries = np.asarray(encodings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        q_norms = np.einsum("ij,ij->i", queries, queries)
+        sq = q_norms[:, None] + self.sq_norms[None, :] - 2.0 * (queries @ self.matrix.T)
+        np.maximum(sq, 0.0, out=sq)
+        return np.sqrt(sq)
+
+    def top_k(self, encodings, k=1):
+        """Return (indices, distances), each shaped (faces, k), nearest first"""
+        queries = np.asarray(encodings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        k = min(k, len(self))
+        if k == 0 or len(queries) == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        if self._ann is not None:
+            labels, sq = self._ann.knn_query(queries, k=k)
+            rows = np.vectorize(self._label_rows.__getitem__, otypes=[np.int64])(labels)
+            return rows, np.sqrt(sq)
+
+        dist = self.distances(queries)
+        if k < len(self):
+            idx = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        else:
+            idx = np.tile(np.arange(len(self)), (len(queries), 1))
+        part = np.take_along_axis(dist, idx, axis=1)
+        order = np.argsort(part, axis=1)
+        return np.take_along_axis(idx, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+    def match(self, encodings, k=1):
+        """Top-k distinct employees for every face: [[(emp_id, distance), ...], ...]"""
+        # Fetch enough templates that k distinct employees survive when some have several
+        per_employee = max((len(keys) for keys in self._emp_keys.values()), default=1)
+        indices, dists = self.top_k(encodings, k if k == 1 else k * per_employee)
+        results = []
+        for row_idx, row_dist in zip(indices, dists):
+            best = {}
+            for i, d in zip(row_idx, row_dist):
+                best.setdefault(self.emp_ids[i], float(d))  # Nearest first, so the first hit is the employee's best
+                if len(best) == k:
+                    break
+            results.append(list(best.items()))
+        return results
+
+    def identify(self, encodings, threshold=MATCH_THRESHOLD):
+        """Best emp_id for every face, or "Unknown" when nothing is close enough"""
+        return [
+            candidates[0][0] if candidates and candidates[0][1] < threshold else "Unknown"
+            for candidates in self.match(encodings, k=1)
+        ]
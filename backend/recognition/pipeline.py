@@ -0,0 +1,91 @@
+import cv2
+import numpy as np
+from recognition.gallery import MATCH_THRESHOLD
+from recognition.detectors import build_detector
+from recognition.timing import stage
+
+_detector = None
+
+
+def default_detector():
+    """The detector configured by FACE_DETECTOR, built once per process"""
+    global _detector
+    if _detector is None:
+        _detector = build_detector()
+    return _detector
+
+
+def decode_image(image_bytes):
+    """Decode uploaded JPEG/PNG bytes into a BGR frame (None if invalid)"""
+    np_arr = np.frombuffer(image_bytes, np.uint8)
+    with stage("decode"):
+        return cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+
+
+def encode_faces(frame, locations):
+    """
+    128-d encodings for the given face locations, computed on a crop around
+    each face so only those regions are converted and passed to the encoder.
+    """
+    import face_recognition
+
+    height, width = frame.shape[:2]
+    encodings = []
+    with stage("encode"):
+        for top, right, bottom, left in locations:
+            pad = (bottom - top) // 4  # Room for the landmark model around the box
+            y0, x0 = max(top - pad, 0), max(left - pad, 0)
+            crop = cv2.cvtColor(frame[y0:min(bottom + pad, height), x0:min(right + pad, width)], cv2.COLOR_BGR2RGB)
+            encodings.extend(face_recognition.face_encodings(crop, [(top - y0, right - x0, bottom - y0, left - x0)]))
+    return encodings
+
+
+def detect_and_encode(frame, detector=None):
+    """Return (face_locations, face_encodings) for every face in a BGR frame"""
+    face_locations = (detector or default_detector()).detect(frame)
+    if not face_locations:
+        return [], []  # Empty frame, the encoder never runs
+    return face_locations, encode_faces(frame, face_locations)
+
+
+def match_faces(encodings, gallery):
+    """(emp_id, distance) for every encoding; "Unknown" when nothing is close enough"""
+    matches = []
+    if not len(encodings):
+        return matches
+    with stage("match"):
+        candidates_per_face = gallery.match(encodings, k=1)
+    for candidates in candidates_per_face:
+        emp_id, distance = candidates[0] if candidates else ("Unknown", None)
+        if distance is None or distance >= MATCH_THRESHOLD:
+            emp_id = "Unknown"
+        matches.append((emp_id, distance))
+    return matches
+
+
+def recognize_faces(frames, gallery, detector=None):
+    """
+    Recognize every face in every frame, matching all of them in one batch.
+    Returns, per frame, a list of {"emp_id", "distance", "location"} dicts
+    with locations in original frame pixels.
+    """
+    per_frame_locations = []
+    all_encodings = []
+    for frame in frames:
+        locations, encodings = detect_and_encode(frame, detector)
+        per_frame_locations.append(locations)
+        all_encodings.extend(encodings)
+
+    matches = iter(match_faces(all_encodings, gallery))
+    results = []
+    for locations in per_frame_locations:
+        faces = []
+        for location in locations:
+            emp_id, distance = next(matches)
+            faces.append({
+                "emp_id": emp_id,
+                "distance": distance,
+                "location": [int(val) for val in location],  # top, right, bottom, left
+            })
+        results.append(faces)
+    return results
@@ -0,0 +1,23 @@
+import time
+from contextlib import contextmanager
+
+# Stage durations for the job currently running in this recognition worker.
+# Workers run one job at a time, so a module-level collector is enough; the
+# job returns it to the API process, which records it in services.metrics.
+_seconds = {}
+
+
+def start_job():
+    """Reset the collector at the start of a worker job and return it"""
+    global _seconds
+    _seconds = {}
+    return _seconds
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _seconds[name] = _seconds.get(name, 0.0) + time.perf_counter() - start
@@ -0,0 +1,198 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from recognition.embedding_store import STORE_DIR, EmbeddingStore, attach_gallery
+from recognition.gallery import Gallery
+from recognition.pipeline import decode_image, match_faces, recognize_faces
+from recognition.timing import start_job, stage
+
+# 0 workers runs recognition on a single background thread in the API process
+RECOGNITION_WORKERS = int(os.getenv("RECOGNITION_WORKERS", str(os.cpu_count() or 1)))
+RECOGNITION_QUEUE_DEPTH = int(os.getenv("RECOGNITION_QUEUE_DEPTH", str(max(RECOGNITION_WORKERS, 1) * 4)))
+RETRY_AFTER_SECONDS = 1
+
+
+class PoolSaturated(Exception):
+    """Raised when the recognition queue is full; callers should answer 429"""
+
+
+# ---------- Worker-process side ----------
+
+_store_dir = STORE_DIR
+_store = None
+_gallery = Gallery()
+_gallery_generation = None
+_segment_generation = None
+
+
+def _init_worker(store_dir):
+    global _store_dir, _store
+    _store_dir = store_dir
+    _store = None
+
+
+def current_gallery(generation):
+    """
+    Gallery for this worker at `generation`. Normally this is the published
+    segment, memory-mapped read-only and shared with every other worker; the
+    reference is swapped in one assignment, so a running match keeps the view
+    it started with. If the segment lags the store, the logged template
+    changes are applied on a private copy, and only when the log cannot
+    bridge the gap is the whole gallery reloaded.
+    """
+    global _store, _gallery, _gallery_generation, _segment_generation
+    if generation == _gallery_generation:
+        return _gallery
+
+    attached = attach_gallery(_store_dir, _segment_generation)
+    if attached is not None:
+        _segment_generation, segment = attached
+        if _gallery_generation is None or _segment_generation >= _gallery_generation:
+            _gallery, _gallery_generation = segment, _segment_generation
+    if generation == _gallery_generation:
+        return _gallery
+
+    if _store is None:
+        _store = EmbeddingStore(_store_dir)
+    changes = _store.changes_since(_gallery_generation) if _gallery_generation is not None else None
+    if changes is None:
+        _gallery = Gallery(*_store.load())
+    else:
+        vectors = _store.vectors()
+        for change in changes:
+            if change["op"] == "add":
+                _gallery.add(change["source"], change["emp_id"], vectors[change["row"]])
+            elif change["op"] == "remove":
+                _gallery.remove(change["source"])
+    _gallery_generation = _store.index.get("generation", 0)
+    return _gallery
+
+
+def recognize_images(images, generation):
+    """
+    Batch variant: every face in every frame, matched together.
+    Returns (one entry per image - a list of faces, or None if undecodable,
+    seconds spent per stage).
+    """
+    timings = start_job()
+    with stage("gallery_sync"):
+        gallery = current_gallery(generation)
+    frames = [decode_image(image_bytes) for image_bytes in images]
+    valid = [frame for frame in frames if frame is not None]
+    faces = iter(recognize_faces(valid, gallery))
+    return [next(faces) if frame is not None else None for frame in frames], timings
+
+
+def match_encodings(encodings, generation):
+    """Edge mode: the camera already computed the encodings, only matching runs here"""
+    timings = start_job()
+    with stage("gallery_sync"):
+        gallery = current_gallery(generation)
+    return match_faces(encodings, gallery), timings
+
+
+def warm_worker(generation):
+    """Load what the first job would otherwise pay for: face_recognition (dlib models) and the gallery"""
+    import face_recognition  # noqa: F401
+    current_gallery(generation)
+    return os.getpid()
+
+
+# ---------- API-process side ----------
+
+class RecognitionPool:
+    """
+    Runs CPU-bound recognition off the event loop in a pool of worker
+    processes that share the memory-mapped gallery segment. At most
+    `queue_depth` jobs may be in flight; beyond that `run` raises
+    PoolSaturated instead of queueing without bound.
+
+    A worker that dies (OOM kill, crash in native code) breaks the whole
+    process pool; the jobs in flight fail and a fresh pool is started for
+    the next ones. `healthy` is False while no pool could be started.
+    """
+
+    def __init__(self, workers=RECOGNITION_WORKERS, queue_depth=RECOGNITION_QUEUE_DEPTH, store_dir=STORE_DIR):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.store_dir = store_dir
+        self.in_flight = 0
+        self.restarts = 0
+        self.healthy = True
+        self._executor = None
+
+    def start(self):
+        if self._executor is not None:
+            return
+        try:
+            if self.workers > 0:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.store_dir,),
+                )
+            else:
+                _init_worker(self.store_dir)
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recognition")
+        except Exception:
+            self.healthy = False
+            raise
+        self.healthy = True
+
+    def _replace(self, executor):
+        """Swap out a broken pool; concurrent jobs that failed on the same pool replace it only once"""
+        if self._executor is not executor:
+            return
+        self.restarts += 1
+        print(f"Recognition worker pool broke (a worker died), starting a new one (restart {self.restarts})")
+        self.shutdown()
+        try:
+            self.start()
+        except Exception as e:
+            print(f"Error restarting recognition workers: {str(e)}")
+
+    async def warm(self, generation):
+        """
+        Submit one warm_worker job per worker together, so the executor spawns
+        every process up front. Returns how many distinct workers got warmed.
+        """
+        self.start()
+        executor = self._executor
+        loop = asyncio.get_running_loop()
+        try:
+            jobs = [loop.run_in_executor(executor, warm_worker, generation) for _ in range(max(self.workers, 1))]
+            return len(set(await asyncio.gather(*jobs)))
+        except BrokenProcessPool:
+            self._replace(executor)
+            raise
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def saturated(self):
+        return self.in_flight >= self.queue_depth
+
+    async def run(self, fn, *args):
+        if self.saturated:
+            raise PoolSaturated()
+        self.start()
+        executor = self._executor
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            self._replace(executor)
+            raise
+        finally:
+            self.in_flight -= 1
+
+
+recognition_pool = RecognitionPool()
@@ -1,16 +1,33 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
+from fastapi.responses import JSONResponse, StreamingResponse, Response, FileResponse
 from database.connection import db
+import asyncio
 import shutil
 import os
-import cv2
 import numpy as np
-from datetime import datetime, timedelta, time
-import face_recognition
+from datetime import datetime, timedelta
 from bson import ObjectId
+from recognition.embedding_store import EMBEDDING_DIM, EmbeddingStore, encode_image_file, file_digest, template_id
+from recognition.workers import recognition_pool, recognize_images, match_encodings, PoolSaturated, RETRY_AFTER_SECONDS
+from services.attendance import record_attendance
+from services.attendance_writer import AttendanceBacklogged, BACKLOG_RETRY_AFTER_SECONDS
+from services.dedupe import frame_cache, frame_hash, attendance_cooldown
+from services.state_cache import employee_states
+from database.migrations import timestamp_range
+from services.rollups import get_rollups
+from services.reports import attendance_query, latest_token, page_query, parse_day, serialize_record, since_query
+from services.hours import compute_hours
+from services.presence import PRESENCE_DAYS, presence_index, midnight
+from services.export import check_format, stream_export, start_export_job
+from services.enrollment import start_bulk_enroll
+from services.jobs import get_job
+from models.attendance import EdgeEncodings
+from services.metrics import outcomes, observe_stages, timed
 from fastapi import APIRouter, Query
+from typing import List
 # from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 import json
+import uuid
 
 router = APIRouter()
 
@@ -18,38 +35,51 @@ router = APIRouter()
 # connected_clients = set()
 
 UPLOAD_DIR = "dataset/"
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+MAX_EDGE_FACES = 32
+MAX_BATCH_FRAMES = 16  # One batch is one recognition job, keep it from monopolizing a worker
+EDGE_MAX_CLOCK_SKEW = timedelta(seconds=float(os.getenv("EDGE_MAX_CLOCK_SKEW", "300")))  # Allowed edge/server clock difference
+WARMUP_RETRY_AFTER_SECONDS = 5
 os.makedirs(UPLOAD_DIR, exist_ok=True)  # Ensure dataset directory exists
 
-# Load known faces once at startup
-known_face_encodings = []
-known_emp_ids = []
-recent_attendance = {}  # Dictionary to store last attendance time for each emp_id
-# Add these constants at the top of the file with other imports
-OFFICE_START_TIME = time(9, 0)  # 9:00 AM
-OFFICE_END_TIME = time(17, 00)   # 5:00 PM
-LAST_CHECK_IN_TIME = time(9, 30)  # 9:30 AM
-ON_TIME_LIMIT = time(9, 15)     # 9:15 AM
+# Known faces live in the on-disk embedding store; recognition workers load it from there
+embedding_store = EmbeddingStore()
+gallery_ready = False  # Set by warm_gallery() once the startup sync is done
 
 def load_known_faces():
-    global known_face_encodings, known_emp_ids
-    known_face_encodings.clear()
-    known_emp_ids.clear()
+    """Sync the embedding store with the dataset, re-encoding only new/changed images"""
     try:
-        for filename in os.listdir(UPLOAD_DIR):
-            if filename.endswith(".jpg"):
-                image_path = os.path.join(UPLOAD_DIR, filename)
-                img = face_recognition.load_image_file(image_path)
-                encoding = face_recognition.face_encodings(img)
-                if encoding:
-                    known_face_encodings.append(encoding[0])
-                    known_emp_ids.append(filename.split(".")[0])
+        encoded = embedding_store.sync(UPLOAD_DIR)
+        if encoded:
+            print(f"Encoded {encoded} new or changed face image(s)")
     except Exception as e:
         print(f"Error loading known faces: {str(e)}")
 
-# Load known faces initially
-load_known_faces()
+async def warm_gallery():
+    """
+    Startup task: sync the store on a thread (it may encode new dataset images),
+    then have the recognition workers import face_recognition and attach the
+    gallery, so the first frame does not pay for either.
+    """
+    global gallery_ready
+    await asyncio.to_thread(load_known_faces)
+    try:
+        await recognition_pool.warm(embedding_store.generation)
+    except Exception as e:
+        print(f"Recognition workers not warmed, the first frames will be slower: {str(e)}")
+    gallery_ready = True
+
+def require_gallery():
+    """Recognition and enrollment wait for the startup sync; report endpoints do not need the gallery"""
+    if not gallery_ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Face gallery is still loading, retry shortly",
+            headers={"Retry-After": str(WARMUP_RETRY_AFTER_SECONDS)},
+        )
 
-@router.post("/add-user")
+@router.post("/add-user", dependencies=[Depends(require_gallery)])
 async def add_user(
     emp_id: str = Form(...),
     name: str = Form(...),
@@ -60,8 +90,12 @@ async def add_user(
     """API to add a new user with a photo"""
     try:
         file_path = os.path.join(UPLOAD_DIR, f"{emp_id}.jpg")
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(photo.file, buffer)
+        try:
+            encoded = await encode_upload(photo, file_path)  # Encode only the new photo, in the recognition pool
+        except PoolSaturated:
+            return recognition_queue_full()
+        if encoded is None:
+            raise HTTPException(status_code=400, detail="No face found in photo")
 
         user = {
             "emp_id": emp_id,
@@ -71,128 +105,414 @@ async def add_user(
             "photo": file_path,
         }
         await db.users.insert_one(user)  # Save in MongoDB
-        load_known_faces()  # Reload known faces after adding a new user
+        employee_states.set_profile(emp_id, name, department)
+        await asyncio.to_thread(embedding_store.add, emp_id, encoded[0], encoded[1], os.path.basename(file_path))
 
         return {"message": "User added successfully", "file_path": file_path}
+    except HTTPException:
+        raise
     except Exception as e:
         return {"error": str(e)}
 
-def recognize_face(frame):
-    """Recognize face from camera frame and match with stored images"""
-    emp_id = "Unknown"
+@router.post("/bulk-add-users", dependencies=[Depends(require_gallery)])
+async def bulk_add_users(
+    archive: UploadFile = File(...),
+    users_csv: UploadFile = File(None)
+):
+    """
+    Enroll many users from a zip/tar of photos named {emp_id}.jpg plus a CSV of
+    emp_id,name,role,department (uploaded separately or inside the archive).
+    Runs in the background; poll GET /bulk-add-users/{job_id} for progress.
+    """
     try:
-        small_frame = cv2.resize(frame, (0, 0), fx=0.5, fy=0.5)
-        rgb_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-        face_locations = face_recognition.face_locations(rgb_frame)
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-        
-        for face_encoding in face_encodings:
-            if known_face_encodings:
-                face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
-                best_match_index = np.argmin(face_distances)
-                if face_distances[best_match_index] < 0.5:
-                    emp_id = known_emp_ids[best_match_index]
-                    break  # Stop checking once a match is found
+        archive_bytes = await archive.read()
+        csv_text = (await users_csv.read()).decode("utf-8-sig") if users_csv else None
+        job_id = await start_bulk_enroll(archive_bytes, embedding_store, UPLOAD_DIR, csv_text)
+        return {"message": "Bulk enrollment started", "job_id": job_id}
     except Exception as e:
-        print(f"Face Recognition Error: {str(e)}")
-    
-    return frame, emp_id
+        return {"error": str(e)}
+
+@router.get("/bulk-add-users/{job_id}")
+async def bulk_add_users_status(job_id: str):
+    """Progress of a bulk enrollment job: processed/total, accepted and rejected photos"""
+    job = await get_job("enrollment", job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown enrollment job")
+    return job
+
+async def encode_upload(photo, path):
+    """
+    Save an uploaded photo to `path` only if it contains a face. Encoding runs in
+    the recognition pool. Returns (encoding, sha1) or None when no face was found.
+    """
+    tmp_path = path + ".upload"  # Not a .jpg, so a concurrent dataset sync ignores it
+    with open(tmp_path, "wb") as buffer:
+        shutil.copyfileobj(photo.file, buffer)
+    try:
+        encoding = await recognition_pool.run(encode_image_file, tmp_path)
+        if encoding is None:
+            return None
+        digest = file_digest(tmp_path)
+        os.replace(tmp_path, path)
+        return encoding, digest
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+async def require_user(emp_id):
+    if await db.users.find_one({"emp_id": emp_id}, {"_id": 1}) is None:
+        raise HTTPException(status_code=404, detail="Unknown employee")
+
+@router.get("/employees/{emp_id}/templates", dependencies=[Depends(require_gallery)])
+async def list_templates(emp_id: str):
+    """Face templates stored for an employee"""
+    return {"emp_id": emp_id, "templates": await asyncio.to_thread(embedding_store.templates, emp_id)}
+
+@router.post("/employees/{emp_id}/templates", dependencies=[Depends(require_gallery)])
+async def add_template(emp_id: str, photo: UploadFile = File(...)):
+    """
+    Add another face template for an employee (glasses, new haircut, different camera).
+    Recognition workers apply the change to their live gallery without a reload.
+    """
+    try:
+        await require_user(emp_id)
+        os.makedirs(os.path.join(UPLOAD_DIR, emp_id), exist_ok=True)
+        source = f"{emp_id}/{uuid.uuid4().hex[:12]}.jpg"
+        try:
+            encoded = await encode_upload(photo, os.path.join(UPLOAD_DIR, source))
+        except PoolSaturated:
+            return recognition_queue_full()
+        if encoded is None:
+            raise HTTPException(status_code=400, detail="No face found in photo")
+
+        await asyncio.to_thread(embedding_store.add, emp_id, encoded[0], encoded[1], source)
+        templates = await asyncio.to_thread(embedding_store.templates, emp_id)
+        return {"message": "Template added", "template_id": template_id(source), "templates": len(templates)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)})
+
+@router.put("/employees/{emp_id}/templates", dependencies=[Depends(require_gallery)])
+async def replace_templates(emp_id: str, photo: UploadFile = File(...)):
+    """Re-enroll an employee: the photo becomes their only template"""
+    try:
+        await require_user(emp_id)
+        source = f"{emp_id}.jpg"
+        try:
+            encoded = await encode_upload(photo, os.path.join(UPLOAD_DIR, source))
+        except PoolSaturated:
+            return recognition_queue_full()
+        if encoded is None:
+            raise HTTPException(status_code=400, detail="No face found in photo")
+
+        await asyncio.to_thread(embedding_store.add, emp_id, encoded[0], encoded[1], source, replace=True)
+        shutil.rmtree(os.path.join(UPLOAD_DIR, emp_id), ignore_errors=True)
+        attendance_cooldown.pop(emp_id)
+        return {"message": "Templates replaced", "templates": 1}
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)})
+
+@router.delete("/employees/{emp_id}/templates/{template_id}", dependencies=[Depends(require_gallery)])
+async def delete_template(emp_id: str, template_id: str):
+    """Delete one face template ("primary" is the enrollment photo)"""
+    try:
+        templates = await asyncio.to_thread(embedding_store.templates, emp_id)
+        template = next((t for t in templates if t["template_id"] == template_id), None)
+        if template is None:
+            raise HTTPException(status_code=404, detail="Unknown template")
+
+        await asyncio.to_thread(embedding_store.remove, template["source"])
+        path = os.path.join(UPLOAD_DIR, template["source"])
+        if os.path.exists(path):
+            os.remove(path)
+        frame_cache.clear()  # Cached frames may have matched this template
+        templates = await asyncio.to_thread(embedding_store.templates, emp_id)
+        return {"message": "Template deleted", "templates": len(templates)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)})
+
+@router.delete("/employees/{emp_id}", dependencies=[Depends(require_gallery)])
+async def delete_employee(emp_id: str):
+    """Remove an employee and all their face templates. Attendance history is kept."""
+    try:
+        result = await db.users.delete_one({"emp_id": emp_id})
+        removed = await asyncio.to_thread(embedding_store.remove_employee, emp_id)
+        if not result.deleted_count and not removed:
+            raise HTTPException(status_code=404, detail="Unknown employee")
+
+        primary = os.path.join(UPLOAD_DIR, f"{emp_id}.jpg")
+        if os.path.exists(primary):
+            os.remove(primary)
+        shutil.rmtree(os.path.join(UPLOAD_DIR, emp_id), ignore_errors=True)
+        employee_states.forget(emp_id)
+        attendance_cooldown.pop(emp_id)
+        frame_cache.clear()
+        return {"message": "Employee deleted", "templates_removed": len(removed)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)})
 
 # async def notify_clients(attendance_entry):
 #     for client in connected_clients:
 #         await client.send_text(json.dumps({"new_attendance": attendance_entry}))
 
-@router.post("/mark-attendance")
+def recognition_queue_full():
+    """429 response telling the client to back off while the recognition pool is saturated"""
+    outcomes.inc("queue_full")
+    return JSONResponse(
+        status_code=429,
+        content={"error": "Recognition queue is full, retry shortly"},
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+    )
+
+def attendance_backlogged():
+    """503 response while MongoDB is not keeping up with attendance writes"""
+    outcomes.inc("backlogged")
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Attendance storage is not keeping up, retry shortly"},
+        headers={"Retry-After": str(BACKLOG_RETRY_AFTER_SECONDS)},
+    )
+
+@router.post("/mark-attendance", dependencies=[Depends(require_gallery)])
 async def mark_attendance(file: UploadFile = File(...)):
     try:
-        image_bytes = await file.read()
-        np_arr = np.frombuffer(image_bytes, np.uint8)
-        frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-        if frame is None:
+        with timed("upload_read"):
+            image_bytes = await file.read()
+
+        try:
+            faces = (await recognize_frames([image_bytes]))[0]
+        except PoolSaturated:
+            return recognition_queue_full()
+        if faces is None:
             raise HTTPException(status_code=400, detail="Invalid image format")
 
-        _, emp_id = recognize_face(frame)
+        # Only the first recognized face counts on this endpoint
+        emp_id = next((face["emp_id"] for face in faces if face["emp_id"] != "Unknown"), "Unknown")
         if emp_id == "Unknown":
             return JSONResponse(content={"message": "No face recognized"})
 
-        now = datetime.now()
-        current_time = now.time()
-
-        # Check if it's within office hours
-        if current_time < OFFICE_START_TIME:
-            return JSONResponse(content={"message": "Too early for attendance. Office starts at 9:00 AM"})
-
-        # Fetch the last recorded attendance for the employee
-        last_attendance = await db.attendance_collection.find_one(
-            {"emp_id": emp_id}, 
-            sort=[("timestamp", -1)]
-        )
-
-        # Handle Check-in logic
-        if not last_attendance or last_attendance["status"] == "Check-out":
-            # Only allow check-in until 9:30 AM
-            if current_time > LAST_CHECK_IN_TIME:
-                return JSONResponse(content={
-                    "message": f"Check-in not allowed after {LAST_CHECK_IN_TIME.strftime('%I:%M %p')}"
-                })
-            
-            attendance_status = "Check-in"
-            timing_status = "On-time" if current_time <= ON_TIME_LIMIT else "Late"
-        
-        # Handle Check-out logic
-        else:
-            if last_attendance["status"] == "Check-in":
-                # Don't allow check-out before 5 PM
-                if current_time < OFFICE_END_TIME:
-                    return JSONResponse(content={
-                        "message": "Early check-out not allowed. Office ends at 10:30 am"
-                    })
-                attendance_status = "Check-out"
-                timing_status = "N/A"
-
-        user = await db.users.find_one({"emp_id": emp_id})
-        emp_name = user["name"] if user else "Unknown"
-
-        attendance_entry = {
-            "emp_id": emp_id,
-            "emp_name": emp_name,
-            "timestamp": now.strftime("%Y-%m-%d %H:%M:%S"),
-            "status": attendance_status,
-            "timing_status": timing_status,
-            "recorded_time": current_time.strftime("%H:%M:%S")
-        }
+        # Check-in/check-out rules live in services.attendance (shared with the batch endpoint)
+        try:
+            results = await record_attendance([emp_id], datetime.now())
+        except AttendanceBacklogged:
+            return attendance_backlogged()
+        return JSONResponse(content=results[emp_id])
 
-        # Save the attendance record
-        await db.attendance_collection.insert_one(attendance_entry)
-
-        return JSONResponse(content={
-            "message": f"{attendance_status} recorded for {emp_name} ({emp_id})",
-            "timestamp": attendance_entry["timestamp"],
-            "status": attendance_status,
-            "timing_status": timing_status,
-            "recorded_time": attendance_entry["recorded_time"]
-        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        outcomes.inc("error")
+        return JSONResponse(content={"error": str(e)})
 
+@router.post("/mark-attendance/batch", dependencies=[Depends(require_gallery)])
+async def mark_attendance_batch(files: List[UploadFile] = File(...)):
+    """
+    Mark attendance for every face in several frames (or one frame with many faces).
+    Detection/encoding runs for the whole batch in one worker job, all faces are matched
+    together, and the attendance rules for every recognized emp_id are applied in one DB round trip.
+    """
+    try:
+        if len(files) > MAX_BATCH_FRAMES:
+            raise HTTPException(status_code=400, detail=f"Send at most {MAX_BATCH_FRAMES} frames per batch")
+        with timed("upload_read"):
+            images = [await file.read() for file in files]
+        try:
+            faces = await mark_frames(images)
+        except PoolSaturated:
+            return recognition_queue_full()
+        except AttendanceBacklogged:
+            return attendance_backlogged()
+
+        recognized = len({face["emp_id"] for face in faces if face.get("emp_id", "Unknown") != "Unknown"})
+        return JSONResponse(content={"faces": faces, "recognized": recognized})
+    except HTTPException:
+        raise
     except Exception as e:
+        outcomes.inc("error")
         return JSONResponse(content={"error": str(e)})
 
+@router.post("/mark-attendance/embeddings", dependencies=[Depends(require_gallery)])
+async def mark_attendance_embeddings(payload: EdgeEncodings):
+    """
+    Edge mode: the camera box detects and encodes faces itself and sends only the
+    128-d encodings (~1KB per face instead of a ~100KB JPEG). The server just
+    matches them against the gallery and applies the attendance rules at the
+    capture timestamp.
+    """
+    try:
+        now = datetime.now()
+        captured = payload.timestamp or now
+        if captured.tzinfo is not None:
+            captured = captured.astimezone().replace(tzinfo=None)  # Attendance times are server-local
+        if abs(captured - now) > EDGE_MAX_CLOCK_SKEW:
+            raise HTTPException(status_code=400, detail="Timestamp too far from server time, check the camera clock")
+        if not payload.encodings or len(payload.encodings) > MAX_EDGE_FACES:
+            raise HTTPException(status_code=400, detail=f"Send between 1 and {MAX_EDGE_FACES} encodings")
+        encodings = np.asarray(payload.encodings, dtype=np.float32) if all(len(e) == EMBEDDING_DIM for e in payload.encodings) else None
+        if encodings is None or not np.isfinite(encodings).all():
+            raise HTTPException(status_code=400, detail=f"Encodings must be {EMBEDDING_DIM} finite numbers each")
+
+        try:
+            with timed("worker_roundtrip"):
+                matches, stage_seconds = await recognition_pool.run(match_encodings, encodings, embedding_store.generation)
+        except PoolSaturated:
+            return recognition_queue_full()
+        observe_stages(stage_seconds)
+
+        recognized = [emp_id for emp_id, _ in matches if emp_id != "Unknown"]
+        outcomes.inc("recognized", amount=len(recognized))
+        outcomes.inc("unknown", amount=len(matches) - len(recognized))
+        try:
+            results = await record_attendance(recognized, captured, payload.camera_id)
+        except AttendanceBacklogged:
+            return attendance_backlogged()
+        locations = payload.locations or []
+        faces = [
+            {
+                "face": i,
+                "emp_id": emp_id,
+                "distance": distance,
+                "location": locations[i] if i < len(locations) else None,
+                "result": results.get(emp_id, {"message": "No face recognized"}),
+            }
+            for i, (emp_id, distance) in enumerate(matches)
+        ]
+        return JSONResponse(content={"camera_id": payload.camera_id, "faces": faces, "recognized": len(set(recognized))})
+    except HTTPException:
+        raise
+    except Exception as e:
+        outcomes.inc("error")
+        return JSONResponse(content={"error": str(e)})
 
+async def recognize_frames(images):
+    """
+    Faces for every image (None if undecodable). Frames near-identical to a recently
+    recognized one reuse its result; the rest go to the recognition pool, because
+    detection/encoding is CPU-bound and must stay off the event loop.
+    Raises PoolSaturated when the recognition queue is full.
+    """
+    results = [None] * len(images)
+    hashes = [None] * len(images)
+    if frame_cache.enabled:
+        with timed("frame_hash"):
+            hashes = await asyncio.to_thread(lambda: [frame_hash(image) for image in images])  # Haar pass, keep it off the event loop
+    pending = []
+    for i, digest in enumerate(hashes):
+        cached = frame_cache.get(digest) if digest is not None else None
+        if cached is None:
+            pending.append(i)
+        else:
+            results[i] = cached
+
+    if pending:
+        # Round trip minus the worker's own stages = queueing and IPC overhead
+        with timed("worker_roundtrip"):
+            frames, stage_seconds = await recognition_pool.run(recognize_images, [images[i] for i in pending], embedding_store.generation)
+        observe_stages(stage_seconds)
+        for i, faces in zip(pending, frames):
+            results[i] = faces
+            if faces is not None and hashes[i] is not None:
+                frame_cache.put(hashes[i], faces)
+
+    for faces in results:
+        if faces is None:
+            outcomes.inc("invalid_image")
+        elif not faces:
+            outcomes.inc("no_face")
+        for face in faces or ():
+            outcomes.inc("unknown" if face["emp_id"] == "Unknown" else "recognized")
+    return results
+
+async def mark_frames(images, camera_id=None):
+    """
+    Recognize every face in `images` and record attendance for all of them.
+    Returns one result dict per face. Raises PoolSaturated when the recognition queue is full,
+    AttendanceBacklogged when MongoDB is not keeping up.
+    """
+    frames = await recognize_frames(images)
+
+    recognized = [face["emp_id"] for faces in frames if faces for face in faces if face["emp_id"] != "Unknown"]
+    results = await record_attendance(recognized, datetime.now(), camera_id)
+
+    response = []
+    for frame_index, faces in enumerate(frames):
+        if faces is None:
+            response.append({"frame": frame_index, "error": "Invalid image format"})
+            continue
+        for face_index, face in enumerate(faces):
+            emp_id = face["emp_id"]
+            response.append({
+                "frame": frame_index,
+                "face": face_index,
+                "emp_id": emp_id,
+                "distance": face["distance"],
+                "location": face["location"],
+                "result": results.get(emp_id, {"message": "No face recognized"}),
+            })
+    return response
+
+@router.get("/cache-stats")
+async def cache_stats():
+    """Hit/miss counters for the frame dedupe cache and the per-employee cooldown cache"""
+    return {"frame_cache": frame_cache.stats(), "attendance_cooldown": attendance_cooldown.stats()}
 
 @router.get("/get-attendance")
-async def get_attendance():
+async def get_attendance(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = Query(None),
+    since: str = Query(None),
+    start: str = Query(None),
+    end: str = Query(None),
+    department: str = Query(None),
+    emp_id: str = Query(None),
+    format: str = Query("json")
+):
+    """
+    Attendance records, newest first, one page at a time.
+    - `cursor`: pass the previous page's `next_cursor` to get older records
+    - `since`: pass the last response's `latest` to get only records written after it (cheap polling);
+      records from the last few seconds can come again, skip `_id`s already seen
+    - `format=ndjson`: stream every matching record, one JSON object per line
+    Filters: `start`/`end` (YYYY-MM-DD, inclusive), `department`, `emp_id`.
+    """
     try:
-        records = await db.attendance_collection.find().to_list(None)  # ✅ Corrected Collection Name
+        query = await attendance_query(parse_day(start), parse_day(end), department, emp_id)
+        polled_at = int(datetime.now().timestamp() * 1000)  # Same clock as inserted_at
+
+        if format == "ndjson":
+            async def stream_records():
+                if since:
+                    found = db.attendance_collection.find(since_query(query, since)).sort([("inserted_at", 1), ("_id", 1)])
+                else:
+                    found = db.attendance_collection.find(page_query(query, cursor)).sort("_id", 1)
+                async for record in found.batch_size(1000):
+                    yield json.dumps(serialize_record(record)) + "\n"
+            return StreamingResponse(stream_records(), media_type="application/x-ndjson")
+
+        if since:
+            # Delta mode: in write order so the client can append in order
+            records = await db.attendance_collection.find(since_query(query, since)).sort([("inserted_at", 1), ("_id", 1)]).limit(limit).to_list(None)
+            latest = latest_token(records, limit, polled_at)
+            next_cursor = None
+        else:
+            records = await db.attendance_collection.find(page_query(query, cursor=cursor)).sort("_id", -1).limit(limit).to_list(None)
+            latest = str(polled_at) if not cursor else None
+            next_cursor = str(records[-1]["_id"]) if len(records) == limit else None
 
         # Convert ObjectId and datetime fields to string
-        for record in records:
-            record["_id"] = str(record["_id"])
-            if "timestamp" in record and isinstance(record["timestamp"], datetime):
-                record["timestamp"] = record["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
+        records = [serialize_record(record) for record in records]
 
-        return JSONResponse(content={"attendance": records})
+        return JSONResponse(content={"attendance": records, "next_cursor": next_cursor, "latest": latest})
     except Exception as e:
         return JSONResponse(content={"error": str(e)})
-    
+
 # @router.post("/add-attendance")
 # async def add_attendance(data: dict):
 #     try:
@@ -219,27 +539,77 @@ async def get_attendance():
 #         connected_clients.remove(websocket)
 
         
+@router.get("/export-attendance")
+async def export_attendance(
+    format: str = Query("csv"),
+    start: str = Query(None),
+    end: str = Query(None),
+    department: str = Query(None),
+    emp_id: str = Query(None),
+    background: bool = Query(False)
+):
+    """
+    Download attendance records as `csv`, `xlsx` or `parquet`, oldest first.
+    Rows are read from the cursor and converted in chunks, so memory stays flat
+    however large the export. Filters as in /get-attendance.
+    `background=true` writes the file in a job instead; poll GET /export-attendance/{job_id}.
+    """
+    try:
+        try:
+            export = check_format(format)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = await attendance_query(parse_day(start), parse_day(end), department, emp_id)
+        filename = f"attendance_{start or 'all'}_{end or 'latest'}.{format}"
+        if background:
+            job_id = await start_export_job(format, query, filename)
+            return {"message": "Export started", "job_id": job_id}
+        return StreamingResponse(
+            stream_export(format, query),
+            media_type=export.media_type,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)})
+
+@router.get("/export-attendance/{job_id}")
+async def export_attendance_status(job_id: str):
+    """Status and rows written of a background export; `download` is set once the file is ready"""
+    job = await get_job("export", job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown export job")
+    status = {key: value for key, value in job.items() if key != "path"}
+    if job["status"] == "done":
+        status["download"] = f"/api/export-attendance/{job_id}/file"
+    return status
+
+@router.get("/export-attendance/{job_id}/file")
+async def export_attendance_file(job_id: str):
+    job = await get_job("export", job_id)
+    if job is None or job["status"] != "done":
+        raise HTTPException(status_code=404, detail="Export not ready")
+    return FileResponse(job["path"], media_type=check_format(job["format"]).media_type, filename=job["filename"])
+
 @router.get("/get-weekly-attendance")
 async def get_weekly_attendance(emp_id: str = Query(...)):
     try:
-        today = datetime.utcnow()
-        week_start = today - timedelta(days=today.weekday())  
+        today = datetime.now()
+        week_start = (today - timedelta(days=today.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
 
-        # ✅ Convert stored timestamps from string to datetime before filtering
+        # ✅ Date filtering happens in Mongo on the (emp_id, timestamp) index
         records = await db.attendance_collection.find({
-            "emp_id": emp_id
-        }).to_list(None)
+            "emp_id": emp_id,
+            **timestamp_range(week_start)
+        }).sort("timestamp", 1).to_list(None)
 
         filtered_records = []
         for record in records:
-            if "timestamp" in record:
-                if isinstance(record["timestamp"], str):  
-                    record["timestamp"] = datetime.strptime(record["timestamp"], "%Y-%m-%d %H:%M:%S")
-
-                if record["timestamp"] >= week_start:  
-                    record["_id"] = str(record["_id"])
-                    record["timestamp"] = record["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
-                    filtered_records.append(record)
+            record["_id"] = str(record["_id"])
+            if isinstance(record.get("timestamp"), datetime):
+                record["timestamp"] = record["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
+            filtered_records.append(record)
 
         return JSONResponse(content={"weekly_attendance": filtered_records})
     except Exception as e:
@@ -262,8 +632,8 @@ async def get_monthly_attendance(
 
         records = await db.attendance_collection.find({
             "emp_id": emp_id,
-            "timestamp": {"$gte": start_date, "$lt": end_date}
-        }).to_list(None)
+            **timestamp_range(start_date, end_date)
+        }).sort("timestamp", 1).to_list(None)
 
         if not records:
             print("No records found!")  # Debugging
@@ -291,8 +661,8 @@ async def get_yearly_attendance(
 
         records = await db.attendance_collection.find({
             "emp_id": emp_id,
-            "timestamp": {"$gte": start_date, "$lt": end_date}
-        }).to_list(None)
+            **timestamp_range(start_date, end_date)
+        }).sort("timestamp", 1).to_list(None)
 
         if not records:
             print("No records found!")  # Debugging
@@ -308,95 +678,108 @@ async def get_yearly_attendance(
         return JSONResponse(content={"error": str(e)})
     
 
+@router.get("/get-attendance-summary")
+async def get_attendance_summary(
+    period: str = Query("monthly"),
+    date: str = Query(None),
+    emp_id: str = Query(None),
+    department: str = Query(None)
+):
+    """
+    Weekly/monthly/yearly attendance counters read from the pre-aggregated rollups.
+    Without emp_id, returns every employee (optionally one department) for the period.
+    """
+    try:
+        if period not in ("weekly", "monthly", "yearly"):
+            raise HTTPException(status_code=400, detail="period must be weekly, monthly or yearly")
+        day = datetime.strptime(date, "%Y-%m-%d") if date else datetime.now()
+        summaries = await get_rollups(period, day, emp_id=emp_id, department=department)
+        return JSONResponse(content={"period": period, "summary": summaries})
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)})
+
+@router.get("/get-dashboard-summary")
+async def get_dashboard_summary(date: str = Query(None)):
+    """Present/on-time/late/absent counts for one day (default today), overall and per department"""
+    try:
+        await presence_index.ensure_warm()
+        day = parse_day(date) or midnight(datetime.now())
+        if day < presence_index.window()[0]:
+            raise HTTPException(status_code=400, detail=f"date is before {presence_index.window()[0]:%Y-%m-%d}, use /get-attendance-summary")
+        return Response(content=presence_index.summary(day), media_type="application/json")
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)})
+
+@router.get("/get-attendance-heatmap")
+async def get_attendance_heatmap(
+    start: str = Query(None),
+    end: str = Query(None),
+    department: str = Query(None),
+    emp_id: str = Query(None),
+    encoding: str = Query("codes")
+):
+    """
+    Per-employee x per-day presence for `start`..`end` (YYYY-MM-DD, inclusive;
+    default the last year) plus daily totals, from the in-memory presence bitmaps.
+    `encoding=codes`: one character per day (0 absent, 1 on time, 2 late);
+    `encoding=bitmap`: base64 present/late bitmaps, 8 days per byte.
+    """
+    try:
+        if encoding not in ("codes", "bitmap"):
+            raise HTTPException(status_code=400, detail="encoding must be codes or bitmap")
+        await presence_index.ensure_warm()
+        end_day = parse_day(end) or midnight(datetime.now())
+        start_day = parse_day(start) or end_day - timedelta(days=364)
+        first_day = presence_index.window()[0]
+        if start_day > end_day:
+            raise HTTPException(status_code=400, detail="start must not be after end")
+        if start_day < first_day or (end_day - start_day).days >= PRESENCE_DAYS:
+            raise HTTPException(status_code=400, detail=f"Range must start on or after {first_day:%Y-%m-%d} and span at most {PRESENCE_DAYS} days")
+        body = presence_index.heatmap(start_day, end_day, department, emp_id, encoding)
+        return Response(content=body, media_type="application/json")
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)})
+
 @router.get("/get-total-hours")
 async def get_total_hours(emp_id: str = Query(...), period: str = Query("daily")):
     """
     Calculate total working hours for an employee based on actual check-in/check-out times.
     """
     try:
-        today = datetime.now()  # Use local time instead of UTC
-        start_date, end_date = None, None
-
-        # Set date range based on period
-        if period == "daily":
-            start_date = today.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-            expected_hours = 8
-        # ... rest of the period conditions remain same ...
-
-        # Fetch attendance records for the period
-        pipeline = [
-            {
-                "$match": {
-                    "emp_id": emp_id,
-                    "timestamp": {
-                        "$gte": start_date.strftime("%Y-%m-%d %H:%M:%S"),
-                        "$lte": end_date.strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                }
-            },
-            {
-                "$sort": {"timestamp": 1}  # Sort by timestamp ascending
-            }
-        ]
-        
-        records = await db.attendance_collection.find({
-            "emp_id": emp_id,
-            "timestamp": {
-                "$gte": start_date.strftime("%Y-%m-%d %H:%M:%S"),
-                "$lte": end_date.strftime("%Y-%m-%d %H:%M:%S")
-            }
-        }).sort("timestamp", 1).to_list(None)
-
-        total_minutes = 0
-        late_count = 0
-        check_in_time = None
-
-        # Process each record chronologically
-        for record in records:
-            # Convert timestamp string to datetime
-            if isinstance(record["timestamp"], str):
-                current_time = datetime.strptime(record["timestamp"], "%Y-%m-%d %H:%M:%S")
-            else:
-                current_time = record["timestamp"]
-
-            if record["status"] == "Check-in":
-                check_in_time = current_time
-                if record["timing_status"] == "Late":
-                    late_count += 1
-            elif record["status"] == "Check-out" and check_in_time:
-                # Calculate minutes between check-in and check-out
-                duration = current_time - check_in_time
-                total_minutes += duration.total_seconds() / 60
-                check_in_time = None
-
-        # Calculate hours and remaining minutes
-        hours = int(total_minutes // 60)
-        minutes = int(total_minutes % 60)
-        hours_worked = hours + (minutes / 60)
-        
-        # Calculate attendance percentage
-        attendance_percentage = (hours_worked / expected_hours * 100) if expected_hours > 0 else 0
+        _, _, reports = await compute_hours(period, emp_id=emp_id)
+        return JSONResponse(content=reports[0])
 
-        status = "Excellent" if attendance_percentage >= 95 else \
-                "Good" if attendance_percentage >= 85 else \
-                "Average" if attendance_percentage >= 75 else "Poor"
+    except Exception as e:
+        print(f"Error calculating hours: {str(e)}")  # Debug log
+        return JSONResponse(content={"error": str(e)})
 
+@router.get("/get-hours")
+async def get_hours(
+    period: str = Query("daily"),
+    date: str = Query(None),
+    department: str = Query(None),
+    emp_id: str = Query(None),
+    source: str = Query("events")
+):
+    """
+    Working hours, late arrivals and check-in/out pairs for a whole company or department
+    in one call, computed inside Mongo. `source=rollups` reads the pre-aggregated
+    weekly/monthly/yearly summaries instead of raw events.
+    """
+    try:
+        start, end, reports = await compute_hours(period, parse_day(date), emp_id=emp_id, department=department, source=source)
         return JSONResponse(content={
-            "emp_id": emp_id,
             "period": period,
-            "total_working_hours": f"{hours}h {minutes}m",
-            "expected_hours": f"{expected_hours}h",
-            "attendance_percentage": f"{attendance_percentage:.1f}%",
-            "status": status,
-            "statistics": {
-                "late_arrivals": late_count,
-                "actual_hours_worked": round(hours_worked, 2),
-                "expected_hours": expected_hours,
-                "check_in_out_pairs": len(records) // 2  # Number of complete check-in/out pairs
-            }
+            "start": start.strftime("%Y-%m-%d"),
+            "end": (end - timedelta(days=1)).strftime("%Y-%m-%d"),
+            "employees": reports,
         })
-
     except Exception as e:
         print(f"Error calculating hours: {str(e)}")  # Debug log
-        return JSONResponse(content={"error": str(e)})
\ No newline at end of file
+        return JSONResponse(content={"error": str(e)})
@@ -0,0 +1,28 @@
+import asyncio
+import os
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from database.connection import db
+import routes.attendance as attendance
+from recognition.workers import recognition_pool
+
+router = APIRouter()
+
+READY_MONGO_TIMEOUT = float(os.getenv("READY_MONGO_TIMEOUT", "2"))  # Seconds to wait for the Mongo ping in /readyz
+
+@router.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "ok"}
+
+@router.get("/readyz")
+async def readyz():
+    """Readiness: the face gallery is loaded, the recognition workers are up and Mongo answers a ping"""
+    checks = {"gallery": attendance.gallery_ready, "recognition": recognition_pool.healthy, "mongo": False}
+    try:
+        await asyncio.wait_for(db.command("ping"), READY_MONGO_TIMEOUT)
+        checks["mongo"] = True
+    except Exception as e:
+        checks["mongo_error"] = str(e) or type(e).__name__
+    ready = checks["gallery"] and checks["recognition"] and checks["mongo"]
+    return JSONResponse(status_code=200 if ready else 503, content={"status": "ready" if ready else "not ready", "checks": checks})
@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from recognition.workers import recognition_pool
+from services.dedupe import frame_cache, attendance_cooldown
+from services.attendance_writer import attendance_writer
+from services.metrics import CallbackCounter, Gauge, register, render
+
+router = APIRouter()
+
+register(Gauge("recognition_queue_depth", "Recognition jobs in flight", lambda: recognition_pool.in_flight))
+register(Gauge("recognition_queue_capacity", "Jobs allowed in flight before 429", lambda: recognition_pool.queue_depth))
+register(Gauge("attendance_write_queue_depth", "Attendance events accepted but not yet written to MongoDB", lambda: attendance_writer.depth))
+register(CallbackCounter("attendance_write_batches_total", "insert_many batches written by the write-behind queue", lambda: attendance_writer.batches))
+register(CallbackCounter("frame_cache_hits_total", "Frames answered from the near-duplicate frame cache", lambda: frame_cache.stats()["hits"]))
+register(CallbackCounter("attendance_cooldown_hits_total", "Attendance answered from the per-employee cooldown cache", lambda: attendance_cooldown.stats()["hits"]))
+register(CallbackCounter("recognition_pool_restarts_total", "Recognition worker pools replaced after a worker died", lambda: recognition_pool.restarts))
+
+@router.get("/metrics")
+async def metrics():
+    """Stage latency histograms, outcome counters and queue depth in Prometheus text format"""
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
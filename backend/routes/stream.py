@@ -0,0 +1,91 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+import asyncio
+import os
+import time
+from recognition.workers import PoolSaturated, RETRY_AFTER_SECONDS
+from services.attendance_writer import AttendanceBacklogged, BACKLOG_RETRY_AFTER_SECONDS
+import routes.attendance as attendance
+from routes.attendance import mark_frames
+
+router = APIRouter()
+
+STREAM_MAX_FPS = float(os.getenv("STREAM_MAX_FPS", "2"))  # Recognitions per second per camera
+
+
+class FrameSlot:
+    """Holds only the newest frame of a stream; older unprocessed frames are dropped"""
+
+    def __init__(self):
+        self.frame = None
+        self.received = 0
+        self.dropped = 0
+        self.ready = asyncio.Event()
+
+    def put(self, frame):
+        if self.frame is not None:
+            self.dropped += 1  # Coalesce: the previous frame was never processed
+        self.frame = frame
+        self.received += 1
+        self.ready.set()
+
+    async def take(self):
+        await self.ready.wait()
+        self.ready.clear()
+        frame, self.frame = self.frame, None
+        return frame
+
+
+@router.websocket("/ws/stream")
+async def attendance_stream(
+    websocket: WebSocket,
+    camera_id: str = Query("camera"),
+    fps: float = Query(STREAM_MAX_FPS),
+):
+    """
+    Persistent camera stream: the client sends JPEG frames as binary messages,
+    the server recognizes at most `fps` frames per second (capped at
+    STREAM_MAX_FPS) and pushes results back as JSON on the same connection.
+    """
+    await websocket.accept()
+    if not attendance.gallery_ready:
+        await websocket.send_json({"camera_id": camera_id, "error": "Face gallery is still loading", "retry_after": attendance.WARMUP_RETRY_AFTER_SECONDS})
+        await websocket.close(code=1013)  # Try again later
+        return
+    interval = 1.0 / max(min(fps, STREAM_MAX_FPS), 0.01)
+    slot = FrameSlot()
+
+    async def receive_frames():
+        while True:
+            slot.put(await websocket.receive_bytes())
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while not receiver.done():
+            take = asyncio.create_task(slot.take())
+            done, _ = await asyncio.wait({take, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if take not in done:
+                take.cancel()
+                break
+            started = time.monotonic()
+
+            try:
+                faces = await mark_frames([take.result()], camera_id)
+                message = {"camera_id": camera_id, "faces": faces}
+            except PoolSaturated:
+                message = {"camera_id": camera_id, "error": "Recognition queue is full", "retry_after": RETRY_AFTER_SECONDS}
+            except AttendanceBacklogged:
+                message = {"camera_id": camera_id, "error": "Attendance storage is not keeping up", "retry_after": BACKLOG_RETRY_AFTER_SECONDS}
+            except Exception as e:
+                message = {"camera_id": camera_id, "error": str(e)}
+            message["received"] = slot.received
+            message["dropped"] = slot.dropped
+            await websocket.send_json(message)
+
+            # Throttle: frames arriving while we wait are coalesced into the newest one
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+        receiver.result()  # Re-raise the disconnect (or any receive error)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
@@ -0,0 +1,161 @@
+from datetime import time
+from bson import ObjectId
+from database.connection import db
+from services.dedupe import attendance_cooldown
+from services.state_cache import employee_states, as_datetime
+from services.attendance_writer import attendance_writer
+from services.metrics import outcomes, timed
+
+OFFICE_START_TIME = time(9, 0)  # 9:00 AM
+OFFICE_END_TIME = time(17, 00)   # 5:00 PM
+LAST_CHECK_IN_TIME = time(9, 30)  # 9:30 AM
+ON_TIME_LIMIT = time(9, 15)     # 9:15 AM
+
+
+def decide_attendance(last_status, current_time):
+    """
+    Apply the check-in/check-out rules.
+    Returns (attendance_status, timing_status, None) or (None, None, rejection_message).
+    """
+    # Check if it's within office hours
+    if current_time < OFFICE_START_TIME:
+        return None, None, "Too early for attendance. Office starts at 9:00 AM"
+
+    # Handle Check-in logic
+    if not last_status or last_status == "Check-out":
+        # Only allow check-in until 9:30 AM
+        if current_time > LAST_CHECK_IN_TIME:
+            return None, None, f"Check-in not allowed after {LAST_CHECK_IN_TIME.strftime('%I:%M %p')}"
+        timing_status = "On-time" if current_time <= ON_TIME_LIMIT else "Late"
+        return "Check-in", timing_status, None
+
+    # Handle Check-out logic
+    if last_status == "Check-in":
+        # Don't allow check-out before 5 PM
+        if current_time < OFFICE_END_TIME:
+            return None, None, "Early check-out not allowed. Office ends at 10:30 am"
+        return "Check-out", "N/A", None
+
+    return None, None, f"Unknown last attendance status: {last_status}"
+
+
+async def fetch_employee_states(emp_ids):
+    """
+    Last attendance status and name for every emp_id in ONE round trip:
+    the latest event per employee, unioned with their user profiles.
+    Only used until the in-memory employee state cache has been warmed.
+    """
+    pipeline = [
+        {"$match": {"emp_id": {"$in": emp_ids}}},
+        {"$sort": {"emp_id": 1, "timestamp": -1}},
+        {"$group": {
+            "_id": "$emp_id",
+            "last_status": {"$first": "$status"},
+            "last_timestamp": {"$first": "$timestamp"},
+        }},
+        {"$unionWith": {
+            "coll": "users",
+            "pipeline": [
+                {"$match": {"emp_id": {"$in": emp_ids}}},
+                {"$project": {"_id": "$emp_id", "name": 1, "department": 1}},
+            ],
+        }},
+    ]
+    states = {emp_id: dict(employee_states.get(emp_id)) for emp_id in emp_ids}
+    async for doc in db.attendance_collection.aggregate(pipeline):
+        state = states[doc["_id"]]
+        if "last_status" in doc:
+            state["last_status"] = doc["last_status"]
+            state["last_timestamp"] = as_datetime(doc["last_timestamp"])
+        if doc.get("name"):
+            state["name"] = doc["name"]
+            state["department"] = doc.get("department")
+    return states
+
+
+async def record_attendance(emp_ids, now, camera_id=None):
+    """
+    Apply the attendance rules for every recognized emp_id at once. State
+    comes from the in-memory employee cache (no reads), and the accepted
+    events go to the write-behind queue that batches them into Mongo.
+    Employees recorded within the cooldown window are answered from cache.
+    `camera_id` is stored on the events when known.
+    Returns {emp_id: response_dict}. Raises AttendanceBacklogged when MongoDB
+    has fallen too far behind.
+    """
+    emp_ids = list(dict.fromkeys(emp_ids))  # De-duplicate, keep order
+    current_time = now.time()
+    if not emp_ids:
+        return {}
+    if current_time < OFFICE_START_TIME:
+        _, _, message = decide_attendance(None, current_time)
+        outcomes.inc("rejected", amount=len(emp_ids))
+        return {emp_id: {"message": message} for emp_id in emp_ids}
+
+    results = {}
+    for emp_id in emp_ids:
+        cached = attendance_cooldown.get(emp_id)
+        if cached is not None:
+            results[emp_id] = cached
+            outcomes.inc("cooldown")
+    pending = [emp_id for emp_id in emp_ids if emp_id not in results]
+    if not pending:
+        return results
+
+    await attendance_writer.wait_for_room()  # Raises AttendanceBacklogged before anything is decided
+    if employee_states.warmed:
+        states = {emp_id: employee_states.get(emp_id) for emp_id in pending}
+    else:
+        await attendance_writer.flush(attendance_writer.wait_timeout)  # The lookup must see events still waiting in the write-behind queue
+        with timed("mongo_state_lookup"):
+            states = await fetch_employee_states(pending)
+
+    entries = []
+    for emp_id in pending:
+        state = states[emp_id]
+        attendance_status, timing_status, message = decide_attendance(state["last_status"], current_time)
+        if message:
+            # Not cached: a rejection can stop applying within the cooldown (check-out opens at OFFICE_END_TIME)
+            results[emp_id] = {"message": message}
+            outcomes.inc("rejected")
+            continue
+
+        attendance_entry = {
+            "_id": ObjectId(),  # Fixed now, so the state sync recognizes this event when it reads it back
+            "emp_id": emp_id,
+            "emp_name": state["name"],
+            "department": state["department"],
+            "timestamp": now,  # Stored as a BSON date so range queries use the index
+            "status": attendance_status,
+            "timing_status": timing_status,
+            "recorded_time": current_time.strftime("%H:%M:%S")
+        }
+        if camera_id:
+            attendance_entry["camera_id"] = camera_id
+        if attendance_status == "Check-out" and state["last_timestamp"] is not None:
+            worked = now - as_datetime(state["last_timestamp"])
+            attendance_entry["worked_minutes"] = round(worked.total_seconds() / 60, 2)
+        entries.append(attendance_entry)
+        results[emp_id] = {
+            "message": f"{attendance_status} recorded for {state['name']} ({emp_id})",
+            "timestamp": now.strftime("%Y-%m-%d %H:%M:%S"),
+            "status": attendance_status,
+            "timing_status": timing_status,
+            "recorded_time": attendance_entry["recorded_time"]
+        }
+
+    if not entries:
+        return results
+    # State first, with no await since the decision: a concurrent frame of the
+    # same employee must already see this event, even before it reaches Mongo
+    for entry in entries:
+        employee_states.apply(entry)
+        attendance_cooldown.put(entry["emp_id"], {
+            **results[entry["emp_id"]],
+            "message": f"{entry['status']} already recorded for {entry['emp_name']} ({entry['emp_id']})",
+        })
+    # Acknowledged once queued (and journaled); the writer batches inserts and rollups across requests
+    with timed("attendance_queue"):
+        await attendance_writer.submit(entries)
+    outcomes.inc("recorded", amount=len(entries))
+    return results
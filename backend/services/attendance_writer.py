@@ -0,0 +1,256 @@
+import asyncio
+import os
+import threading
+import time
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+from database.connection import db
+from services.rollups import apply_rollups
+from services.metrics import request_timings, timed
+
+ATTENDANCE_BATCH_SIZE = int(os.getenv("ATTENDANCE_BATCH_SIZE", "500"))  # Events per insert_many
+ATTENDANCE_BATCH_DELAY = float(os.getenv("ATTENDANCE_BATCH_MS", "20")) / 1000  # Max wait for a batch to fill
+ATTENDANCE_QUEUE_LIMIT = int(os.getenv("ATTENDANCE_QUEUE_LIMIT", "10000"))  # Queued events before requests wait for Mongo
+ATTENDANCE_JOURNAL = os.getenv("ATTENDANCE_JOURNAL", "")  # Journal path prefix (".{pid}" is appended), empty = memory only
+ATTENDANCE_FLUSH_TIMEOUT = float(os.getenv("ATTENDANCE_FLUSH_TIMEOUT", "10"))  # Seconds to drain the queue on shutdown
+ATTENDANCE_WAIT_TIMEOUT = float(os.getenv("ATTENDANCE_WAIT_TIMEOUT", "5"))  # Seconds a request waits for Mongo before 503
+BACKLOG_RETRY_AFTER_SECONDS = 5
+RETRY_MAX_SECONDS = 30
+DUPLICATE_KEY = 11000
+
+
+class AttendanceBacklogged(Exception):
+    """Raised when MongoDB has not caught up within ATTENDANCE_WAIT_TIMEOUT; callers should answer 503"""
+
+
+def _pid_alive(pid):
+    if os.name == "nt":
+        return True  # No signal 0 on Windows (os.kill would terminate); only this process's own journal is replayed
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Alive, owned by another user
+    return True
+
+
+async def insert_new(entries):
+    """
+    insert_many that skips events already in Mongo (same _id: a retried or
+    replayed batch). Returns the entries that were inserted now. Each event is
+    stamped with `inserted_at` (epoch ms) at write time, which `since` polling
+    follows: `_id` order is decision order and says nothing about when an
+    event became visible.
+    """
+    inserted_at = int(time.time() * 1000)
+    for entry in entries:
+        entry["inserted_at"] = inserted_at
+    inserted = []
+    while entries:
+        try:
+            await db.attendance_collection.insert_many(entries, ordered=True)
+            return inserted + entries
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if not errors or any(error["code"] != DUPLICATE_KEY for error in errors):
+                raise
+            index = errors[0]["index"]  # The insert stopped at the first duplicate
+            inserted += entries[:index]
+            entries = entries[index + 1:]
+    return inserted
+
+
+class AttendanceWriter:
+    """
+    Write-behind queue for attendance events. record_attendance decides each
+    event and updates the in-memory state first, then hands it here; one
+    background task drains the queue into insert_many batches of up to
+    `batch_size` events, or whatever arrived within `max_delay`. Batches are
+    written one at a time in queue order, so every employee's events reach
+    Mongo in the order they were decided.
+
+    With a journal path, submit() returns only after the events are appended
+    and fsynced to a local file; events a crashed process never flushed are
+    replayed on the next start. Every process journals to its own file
+    (`{journal_path}.{pid}`), truncated whenever its queue drains, and replays
+    the files of processes that are no longer running.
+
+    Requests never wait on Mongo without a bound: wait_for_room() and flush()
+    raise AttendanceBacklogged after `wait_timeout` seconds.
+    """
+
+    def __init__(self, batch_size=ATTENDANCE_BATCH_SIZE, max_delay=ATTENDANCE_BATCH_DELAY,
+                 max_pending=ATTENDANCE_QUEUE_LIMIT, journal_path=ATTENDANCE_JOURNAL, wait_timeout=ATTENDANCE_WAIT_TIMEOUT):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.wait_timeout = wait_timeout
+        self.journal_prefix = journal_path
+        self.journal_path = f"{journal_path}.{os.getpid()}" if journal_path else ""
+        self.pending = []
+        self.in_flight = 0  # Events taken from the queue and not yet written
+        self.batches = 0
+        self.written = 0
+        self._queued = asyncio.Event()
+        self._full = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._journal_lock = threading.Lock()
+        self._journaling = 0
+        self._task = None
+
+    @property
+    def depth(self):
+        return len(self.pending) + self.in_flight
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def wait_for_room(self):
+        """
+        Hold the caller while the queue is full (Mongo is falling behind) instead
+        of growing without bound. Call before deciding events, so a request that
+        gives up with AttendanceBacklogged has changed no state.
+        """
+        if self.depth >= self.max_pending:
+            await self.flush(self.wait_timeout)
+
+    async def submit(self, entries):
+        """Queue accepted events (in decision order); returns once they are queued, and journaled if enabled"""
+        self.start()
+        for entry in entries:
+            entry.setdefault("_id", ObjectId())  # Fixed up front, so a retried or replayed insert is idempotent
+        self.pending.extend(entries)
+        self._drained.clear()
+        self._queued.set()
+        if len(self.pending) >= self.batch_size:
+            self._full.set()
+        if self.journal_path:
+            self._journaling += 1
+            try:
+                await asyncio.to_thread(self._append_journal, entries)
+            except OSError as e:
+                print(f"Attendance journal write failed, events are only queued in memory: {str(e)}")
+            finally:
+                self._journaling -= 1
+
+    async def flush(self, timeout=None):
+        """Wait until everything queued so far is in Mongo; with `timeout`, raise AttendanceBacklogged after that long"""
+        if self.depth:
+            self.start()
+            try:
+                await asyncio.wait_for(self._drained.wait(), timeout)
+            except asyncio.TimeoutError:
+                raise AttendanceBacklogged() from None
+
+    async def stop(self, timeout=ATTENDANCE_FLUSH_TIMEOUT):
+        try:
+            await self.flush(timeout)
+        except AttendanceBacklogged:
+            kept = f"kept in {self.journal_path}" if self.journal_path else "lost"
+            print(f"{self.depth} attendance event(s) not written to MongoDB at shutdown, {kept}")
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        request_timings.set(None)  # Created inside a request; batch stages belong to no request's Server-Timing
+        while True:
+            await self._queued.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.max_delay)
+            except asyncio.TimeoutError:
+                pass
+            batch = self.pending[:self.batch_size]
+            del self.pending[:len(batch)]
+            if len(self.pending) < self.batch_size:
+                self._full.clear()
+            if not self.pending:
+                self._queued.clear()
+            self.in_flight = len(batch)
+            await self._write(batch)
+            self.in_flight = 0
+            if not self.pending:
+                self._truncate_journal()
+                self._drained.set()
+
+    async def _write(self, batch):
+        delay = 1
+        while True:
+            try:
+                with timed("mongo_insert"):
+                    await insert_new(batch)
+                break
+            except Exception as e:
+                print(f"Attendance insert failed, retrying {len(batch)} event(s) in {delay}s: {str(e)}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_SECONDS)
+        self.batches += 1
+        self.written += len(batch)
+        try:
+            with timed("mongo_rollups"):
+                await apply_rollups(batch)  # Keep weekly/monthly/yearly summaries current
+        except Exception as e:
+            print(f"Rollup update failed (rebuild with python -m services.rollups): {str(e)}")
+
+    # ---------- Journal ----------
+
+    def _append_journal(self, entries):
+        lines = "".join(json_util.dumps(entry) + "\n" for entry in entries)
+        with self._journal_lock:
+            with open(self.journal_path, "a") as journal:
+                journal.write(lines)
+                journal.flush()
+                os.fsync(journal.fileno())
+
+    def _truncate_journal(self):
+        # Only when nothing is queued and no append is running, so no unwritten event is dropped
+        if self.journal_path and self._journaling == 0 and os.path.exists(self.journal_path):
+            with self._journal_lock:
+                open(self.journal_path, "w").close()
+
+    def _orphaned_journals(self):
+        """
+        Journals no running process owns: those of processes that are gone,
+        plus this process's own path if a previous run with the same pid left it.
+        The owner is the pid after the last dot.
+        """
+        directory, prefix = os.path.split(self.journal_prefix)
+        for name in sorted(os.listdir(directory or ".")):
+            owner = name.rsplit(".", 1)[-1]
+            if name.startswith(prefix + ".") and owner.isdigit() and (int(owner) == os.getpid() or not _pid_alive(int(owner))):
+                yield os.path.join(directory, name)
+
+    async def replay(self):
+        """Insert journaled events that earlier processes never wrote to Mongo. Returns how many."""
+        if not self.journal_prefix:
+            return 0
+        replayed = 0
+        for path in self._orphaned_journals():
+            claimed = f"{path}.{os.getpid()}"
+            try:
+                os.rename(path, claimed)  # Only one starting worker gets each journal
+            except FileNotFoundError:
+                continue
+            entries = []
+            with open(claimed) as journal:
+                for line in journal:
+                    try:
+                        entries.append(json_util.loads(line))
+                    except ValueError:
+                        print("Skipping a torn attendance journal line")
+            entries.sort(key=lambda entry: entry["_id"])  # ObjectIds from one process follow decision order
+            inserted = await insert_new(entries) if entries else []
+            if inserted:
+                try:
+                    await apply_rollups(inserted)
+                except Exception as e:
+                    print(f"Rollup update failed (rebuild with python -m services.rollups): {str(e)}")
+            os.remove(claimed)
+            replayed += len(inserted)
+        return replayed
+
+
+attendance_writer = AttendanceWriter()
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+FRAME_CACHE_TTL = float(os.getenv("FRAME_CACHE_TTL", "3"))  # Seconds a frame result can be reused
+FRAME_HASH_MAX_DISTANCE = int(os.getenv("FRAME_HASH_MAX_DISTANCE", "4"))  # Hamming bits out of 256, whole frame
+FACE_HASH_MAX_DISTANCE = int(os.getenv("FACE_HASH_MAX_DISTANCE", "10"))  # Hamming bits out of 64, per face crop
+ATTENDANCE_COOLDOWN_SECONDS = float(os.getenv("ATTENDANCE_COOLDOWN_SECONDS", "60"))
+HASH_SIZE = 16
+FACE_HASH_SIZE = 8
+FACE_MIN_SIZE = 24  # Pixels at 1/4 scale, the Haar cascade's own window size
+FACE_MAX_SHIFT = 0.25  # Fraction of the face size a box may move or grow and still be the same face
+
+
+class TTLCache:
+    """Small LRU cache whose entries also expire after `ttl` seconds. Counts hits and misses."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is not None and item[0] > time.monotonic():
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+        if item is not None:
+            del self._data[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        item = self._data.pop(key, None)
+        return item[1] if item else None
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+
+def _dhash(gray, size):
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    return int.from_bytes(np.packbits((small[:, 1:] > small[:, :-1]).flatten()).tobytes(), "big")
+
+
+_local = threading.local()  # CascadeClassifier is not safe to share between threads
+
+
+def _face_boxes(gray):
+    cascade = getattr(_local, "cascade", None)
+    if cascade is None:
+        cascade = _local.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    boxes = cascade.detectMultiScale(cv2.equalizeHist(gray), scaleFactor=1.2, minNeighbors=5, minSize=(FACE_MIN_SIZE, FACE_MIN_SIZE))
+    return sorted((int(x), int(y), int(w), int(h)) for x, y, w, h in boxes)
+
+
+def frame_hash(image_bytes):
+    """
+    Near-duplicate key of a JPEG, from a 1/4-scale grayscale decode: a 256-bit
+    difference hash of the whole frame plus, for every face a Haar pass finds,
+    its box and a 64-bit hash of the face crop. On a fixed background the
+    face is a small part of the frame, so different people at the same spot
+    only differ in the crop hashes. Returns None if undecodable.
+    """
+    gray = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if gray is None:
+        return None
+    faces = tuple((box, _dhash(gray[box[1]:box[1] + box[3], box[0]:box[0] + box[2]], FACE_HASH_SIZE)) for box in _face_boxes(gray))
+    return _dhash(gray, HASH_SIZE), faces
+
+
+def _distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def _same_box(a, b):
+    tolerance = FACE_MAX_SHIFT * max(a[2], b[2])
+    return all(abs(u - v) <= tolerance for u, v in zip(a, b))
+
+
+class FrameHashCache:
+    """
+    Reuses recognition results for near-identical consecutive frames: a frame
+    gets a recent frame's result without running detection or encoding only if
+    the whole frames are within `max_distance` bits, both have the same number
+    of faces at about the same places, and each face crop is within
+    `face_distance` bits of its counterpart.
+    """
+
+    def __init__(self, maxsize=256, ttl=FRAME_CACHE_TTL, max_distance=FRAME_HASH_MAX_DISTANCE, face_distance=FACE_HASH_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.face_distance = face_distance
+        self._cache = TTLCache(maxsize, ttl)
+
+    @property
+    def enabled(self):
+        return self._cache.ttl > 0
+
+    def similar(self, key, other):
+        (frame, faces), (other_frame, other_faces) = key, other
+        if len(faces) != len(other_faces) or _distance(frame, other_frame) > self.max_distance:
+            return False
+        return all(
+            _same_box(box, other_box) and _distance(crop, other_crop) <= self.face_distance
+            for (box, crop), (other_box, other_crop) in zip(faces, other_faces)
+        )
+
+    def get(self, digest):
+        if digest in self._cache._data:
+            return self._cache.get(digest)
+        now = time.monotonic()
+        for other, (expires, value) in reversed(self._cache._data.items()):
+            if expires > now and self.similar(digest, other):
+                self._cache.hits += 1
+                return value
+        self._cache.misses += 1
+        return None
+
+    def put(self, digest, value):
+        self._cache.put(digest, value)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+frame_cache = FrameHashCache()
+attendance_cooldown = TTLCache(maxsize=10000, ttl=ATTENDANCE_COOLDOWN_SECONDS)
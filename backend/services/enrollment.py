@@ -0,0 +1,158 @@
+import asyncio
+import csv
+import hashlib
+import io
+import multiprocessing
+import os
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from database.connection import db
+from services.jobs import create_job, start_job
+from services.state_cache import employee_states
+
+ENROLLMENT_WORKERS = int(os.getenv("ENROLLMENT_WORKERS", "2"))  # Encoding processes per API job, on top of the recognition pool
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+CSV_FIELDS = ("emp_id", "name", "role", "department")
+
+
+def read_archive(archive_bytes):
+    """Return {filename: bytes} for every file in a zip or tar(.gz) archive"""
+    files = {}
+    buffer = io.BytesIO(archive_bytes)
+    if zipfile.is_zipfile(buffer):
+        with zipfile.ZipFile(buffer) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    files[os.path.basename(info.filename)] = archive.read(info)
+        return files
+
+    buffer.seek(0)
+    with tarfile.open(fileobj=buffer) as archive:
+        for member in archive.getmembers():
+            if member.isfile():
+                files[os.path.basename(member.name)] = archive.extractfile(member).read()
+    return files
+
+
+def read_users_csv(csv_text):
+    """Rows of emp_id,name,role,department (a header row is optional)"""
+    rows = []
+    for row in csv.reader(io.StringIO(csv_text)):
+        if not row or not row[0].strip() or row[0].strip().lower() == "emp_id":
+            continue
+        values = [value.strip() for value in row] + [""] * len(CSV_FIELDS)
+        user = dict(zip(CSV_FIELDS, values))
+        user["department"] = user["department"] or "Not Specified"
+        rows.append(user)
+    return rows
+
+
+def encode_photo(image_bytes):
+    """
+    Runs in an enrollment worker. Returns (jpeg_bytes, encoding, None) for a photo
+    with exactly one face, otherwise (None, None, reason).
+    """
+    import face_recognition
+
+    frame = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return None, None, "Invalid image format"
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    locations = face_recognition.face_locations(rgb_frame)
+    if len(locations) != 1:
+        return None, None, "No face found" if not locations else f"{len(locations)} faces found, expected one"
+    encoding = face_recognition.face_encodings(rgb_frame, locations)[0]
+
+    # The dataset stores JPEGs; keep the original bytes when they already are one
+    jpeg_bytes = image_bytes if image_bytes[:2] == b"\xff\xd8" else cv2.imencode(".jpg", frame)[1].tobytes()
+    return jpeg_bytes, encoding.tolist(), None
+
+
+async def bulk_enroll(archive_bytes, store, upload_dir, csv_text=None, job=None, workers=ENROLLMENT_WORKERS, on_progress=None):
+    """
+    Enroll many users at once: encode photos in parallel, reject photos with
+    zero or several faces, insert_many the accepted users and publish every
+    new encoding to the embedding store in a single update.
+    `job` (a dict) is updated with progress as photos are encoded, and
+    `on_progress(job)` is called after each one.
+    """
+    job = job if job is not None else {}
+    files = read_archive(archive_bytes)
+    if csv_text is None:
+        csv_name = next((name for name in files if name.lower().endswith(".csv")), None)
+        if csv_name is None:
+            raise ValueError("No CSV of emp_id,name,role,department provided")
+        csv_text = files[csv_name].decode("utf-8-sig")
+
+    photos = {os.path.splitext(name)[0]: data for name, data in files.items() if name.lower().endswith(IMAGE_EXTENSIONS)}
+    users = read_users_csv(csv_text)
+    existing = set(await db.users.distinct("emp_id", {"emp_id": {"$in": [u["emp_id"] for u in users]}}))
+
+    job.update(status="encoding", total=len(users), processed=0, accepted=0, rejected=[])
+    candidates = []
+    seen = set()
+    for user in users:
+        reason = None
+        if user["emp_id"] in seen:
+            reason = "Duplicate emp_id in CSV"
+        elif user["emp_id"] in existing:
+            reason = "User already exists"
+        elif user["emp_id"] not in photos:
+            reason = "No photo in archive"
+        seen.add(user["emp_id"])
+
+        if reason:
+            job["rejected"].append({"emp_id": user["emp_id"], "reason": reason})
+            job["processed"] += 1
+        else:
+            candidates.append(user)
+
+    loop = asyncio.get_running_loop()
+    accepted = []
+    # Created and shut down on a thread: shutdown waits for every child process to exit
+    executor = await asyncio.to_thread(
+        ProcessPoolExecutor, max_workers=max(workers, 1), mp_context=multiprocessing.get_context("spawn"),
+    )
+    try:
+        async def encode(user):
+            return user, await loop.run_in_executor(executor, encode_photo, photos[user["emp_id"]])
+
+        for next_done in asyncio.as_completed([encode(user) for user in candidates]):
+            user, (jpeg_bytes, encoding, reason) = await next_done
+            job["processed"] += 1
+            if reason:
+                job["rejected"].append({"emp_id": user["emp_id"], "reason": reason})
+            else:
+                accepted.append((user, jpeg_bytes, encoding))
+            if on_progress:
+                on_progress(job)
+    finally:
+        await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    job["status"] = "saving"
+    items = []
+    documents = []
+    for user, jpeg_bytes, encoding in accepted:
+        file_path = os.path.join(upload_dir, f"{user['emp_id']}.jpg")
+        with open(file_path, "wb") as buffer:
+            buffer.write(jpeg_bytes)
+        items.append((user["emp_id"], encoding, hashlib.sha1(jpeg_bytes).hexdigest(), os.path.basename(file_path)))
+        documents.append({**user, "photo": file_path})
+
+    if documents:
+        await db.users.insert_many(documents, ordered=False)
+        for user in documents:
+            employee_states.set_profile(user["emp_id"], user["name"], user["department"])
+    await asyncio.to_thread(store.add_many, items)  # One gallery publish for the whole batch
+
+    job.update(status="done", accepted=len(documents))
+    return job
+
+
+async def start_bulk_enroll(archive_bytes, store, upload_dir, csv_text=None):
+    """Run bulk_enroll in the background; returns the job id to poll (from any worker)"""
+    job = await create_job("enrollment")
+    return start_job(job, bulk_enroll(archive_bytes, store, upload_dir, csv_text, job))
@@ -0,0 +1,247 @@
+import asyncio
+import csv
+import importlib.util
+import io
+import os
+import tempfile
+import time
+from database.connection import db
+from services.jobs import create_job, start_job
+from services.state_cache import as_datetime
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports/")  # Where background export jobs write their files, shared by every worker
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))  # Records read, converted and sent per chunk
+EXPORT_RETENTION = float(os.getenv("EXPORT_RETENTION_HOURS", "24")) * 3600  # Finished export files are deleted after this
+XLSX_SHEET_ROWS = 1_000_000  # Excel allows 1,048,576 rows per sheet
+FILE_CHUNK = 1 << 20
+
+EXPORT_COLUMNS = ("emp_id", "emp_name", "department", "timestamp", "status", "timing_status", "worked_minutes", "camera_id")
+EXPORT_PROJECTION = {"_id": 0, **{column: 1 for column in EXPORT_COLUMNS}}
+
+
+class ChunkSink:
+    """Write-only file object whose contents are taken out after each chunk, so a streamed export stays small"""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buffer.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = self.buffer.getvalue()
+        self.buffer = io.BytesIO()
+        return data
+
+
+class CsvExport:
+    media_type = "text/csv"
+
+    def __init__(self, file):
+        self.file = file
+        self._write_rows([EXPORT_COLUMNS])
+
+    def _write_rows(self, rows):
+        text = io.StringIO()
+        csv.writer(text).writerows(rows)
+        self.file.write(text.getvalue().encode("utf-8"))
+
+    def write(self, rows):
+        self._write_rows([
+            row[:3] + (row[3].strftime("%Y-%m-%d %H:%M:%S") if row[3] else None,) + row[4:]
+            for row in rows
+        ])
+
+    def close(self):
+        pass
+
+
+class XlsxExport:
+    """openpyxl write-only workbook: rows go to a temporary file as they are added, the zip is built on close"""
+
+    media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+    def __init__(self, file):
+        from openpyxl import Workbook
+
+        self.file = file
+        self.workbook = Workbook(write_only=True)
+        self.sheet = None
+        self.sheet_rows = 0
+
+    def _new_sheet(self):
+        self.sheet = self.workbook.create_sheet(f"Attendance {len(self.workbook.worksheets) + 1}")
+        self.sheet.append(EXPORT_COLUMNS)
+        self.sheet_rows = 0
+
+    def write(self, rows):
+        for row in rows:
+            if self.sheet is None or self.sheet_rows >= XLSX_SHEET_ROWS:
+                self._new_sheet()
+            self.sheet.append(row)
+            self.sheet_rows += 1
+
+    def close(self):
+        if self.sheet is None:
+            self._new_sheet()
+        self.workbook.save(self.file)
+
+
+class ParquetExport:
+    """One Parquet row group per chunk, the footer is written on close"""
+
+    media_type = "application/vnd.apache.parquet"
+
+    def __init__(self, file):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema([
+            ("emp_id", pa.string()),
+            ("emp_name", pa.string()),
+            ("department", pa.string()),
+            ("timestamp", pa.timestamp("ms")),
+            ("status", pa.string()),
+            ("timing_status", pa.string()),
+            ("worked_minutes", pa.float64()),
+            ("camera_id", pa.string()),
+        ])
+        self.writer = pq.ParquetWriter(file, self.schema)
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        self.writer.write_table(self.pa.Table.from_arrays(
+            [self.pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema,
+        ))
+
+    def close(self):
+        self.writer.close()
+
+
+EXPORT_FORMATS = {
+    "csv": (CsvExport, None),
+    "xlsx": (XlsxExport, "openpyxl"),
+    "parquet": (ParquetExport, "pyarrow"),
+}
+
+
+def check_format(fmt):
+    """Raise ValueError for an unknown format or one whose optional package is not installed"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    package = EXPORT_FORMATS[fmt][1]
+    if package and importlib.util.find_spec(package) is None:
+        raise ValueError(f"{fmt} export needs the {package} package (pip install {package})")
+    return EXPORT_FORMATS[fmt][0]
+
+
+def export_row(record):
+    timestamp = record.get("timestamp")
+    return (
+        record.get("emp_id"),
+        record.get("emp_name"),
+        record.get("department"),
+        as_datetime(timestamp) if timestamp else None,
+        record.get("status"),
+        record.get("timing_status"),
+        record.get("worked_minutes"),
+        record.get("camera_id"),
+    )
+
+
+async def record_chunks(query, chunk_size=EXPORT_CHUNK_SIZE):
+    """Matching records oldest first, EXPORT_CHUNK_SIZE rows at a time, straight off the cursor"""
+    cursor = db.attendance_collection.find(query, EXPORT_PROJECTION).sort("timestamp", 1).batch_size(chunk_size)
+    chunk = []
+    async for record in cursor:
+        chunk.append(export_row(record))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def write_export(fmt, query, file, progress=None):
+    """Write every matching record to the binary `file`; conversion runs on a thread. Returns the row count."""
+    writer = await asyncio.to_thread(check_format(fmt), file)
+    rows = 0
+    async for chunk in record_chunks(query):
+        await asyncio.to_thread(writer.write, chunk)
+        rows += len(chunk)
+        if progress is not None:
+            progress["rows"] = rows
+    await asyncio.to_thread(writer.close)
+    return rows
+
+
+async def stream_export(fmt, query):
+    """
+    Export bytes as they are produced. CSV and Parquet go out chunk by chunk;
+    an XLSX file is a zip that can only be finished at the end, so it is
+    built in a temporary file and streamed from there.
+    """
+    if fmt == "xlsx":
+        with tempfile.TemporaryFile() as file:
+            await write_export(fmt, query, file)
+            file.seek(0)
+            while data := file.read(FILE_CHUNK):
+                yield data
+        return
+
+    sink = ChunkSink()
+    writer = await asyncio.to_thread(check_format(fmt), sink)
+    async for chunk in record_chunks(query):
+        await asyncio.to_thread(writer.write, chunk)
+        yield sink.drain()
+    await asyncio.to_thread(writer.close)
+    yield sink.drain()
+
+
+async def remove_expired_exports():
+    async for job in db.jobs.find({"kind": "export", "finished": {"$lt": time.time() - EXPORT_RETENTION}}):
+        if job.get("path") and os.path.exists(job["path"]):
+            os.remove(job["path"])
+        await db.jobs.delete_one({"_id": job["_id"]})
+
+
+async def start_export_job(fmt, query, filename):
+    """
+    Write the export to EXPORT_DIR in the background; returns the job id to poll.
+    Any worker can answer for the job: its state is in the jobs collection and
+    the file in EXPORT_DIR, which must be shared by every worker.
+    """
+    check_format(fmt)
+    await remove_expired_exports()
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    job = await create_job("export", format=fmt, filename=filename, rows=0)
+    path = job["path"] = os.path.abspath(os.path.join(EXPORT_DIR, f"{job['job_id']}.{fmt}"))
+
+    async def run():
+        job["status"] = "running"
+        try:
+            with open(path + ".part", "wb") as file:
+                await write_export(fmt, query, file, progress=job)
+            os.replace(path + ".part", path)
+        except Exception:
+            if os.path.exists(path + ".part"):
+                os.remove(path + ".part")
+            raise
+        job["status"] = "done"
+
+    return start_job(job, run())
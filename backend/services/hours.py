@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+from database.connection import db
+from database.migrations import timestamp_range
+from services.reports import attendance_query
+from services.rollups import get_rollups, period_bounds, working_days
+
+HOURS_PER_DAY = 8
+PERIODS = ("daily", "weekly", "monthly", "yearly")
+
+
+def expected_hours_for(period, start, end):
+    """Expected hours so far: a full day for daily, otherwise working days elapsed in the period"""
+    if period == "daily":
+        return HOURS_PER_DAY
+    tomorrow = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return HOURS_PER_DAY * working_days(start, min(end, tomorrow))
+
+
+def hours_pipeline(match):
+    """
+    Pair every Check-in with the event that follows it (per employee, in time
+    order) using window functions, then total worked minutes, late arrivals and
+    complete pairs per employee - all inside Mongo. Requires MongoDB 5.0+.
+    """
+    return [
+        {"$match": match},
+        # String timestamps (pre-migration) are parsed so $subtract works on both
+        {"$addFields": {"ts": {"$cond": [
+            {"$eq": [{"$type": "$timestamp"}, "string"]},
+            {"$dateFromString": {"dateString": "$timestamp", "format": "%Y-%m-%d %H:%M:%S"}},
+            "$timestamp",
+        ]}}},
+        {"$setWindowFields": {
+            "partitionBy": "$emp_id",
+            "sortBy": {"ts": 1},
+            "output": {
+                "next_status": {"$shift": {"output": "$status", "by": 1}},
+                "next_ts": {"$shift": {"output": "$ts", "by": 1}},
+            },
+        }},
+        {"$addFields": {"paired": {"$and": [
+            {"$eq": ["$status", "Check-in"]},
+            {"$eq": ["$next_status", "Check-out"]},
+        ]}}},
+        {"$group": {
+            "_id": "$emp_id",
+            "emp_name": {"$last": "$emp_name"},
+            "total_minutes": {"$sum": {"$cond": [
+                "$paired", {"$divide": [{"$subtract": ["$next_ts", "$ts"]}, 60000]}, 0,
+            ]}},
+            "late_count": {"$sum": {"$cond": [
+                {"$and": [{"$eq": ["$status", "Check-in"]}, {"$eq": ["$timing_status", "Late"]}]}, 1, 0,
+            ]}},
+            "pairs": {"$sum": {"$cond": ["$paired", 1, 0]}},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+
+
+def hours_report(emp_id, emp_name, period, total_minutes, late_count, pairs, expected_hours):
+    """Per-employee response in the /get-total-hours format"""
+    # Calculate hours and remaining minutes
+    hours = int(total_minutes // 60)
+    minutes = int(total_minutes % 60)
+    hours_worked = hours + (minutes / 60)
+
+    # Calculate attendance percentage
+    attendance_percentage = (hours_worked / expected_hours * 100) if expected_hours > 0 else 0
+
+    status = "Excellent" if attendance_percentage >= 95 else \
+            "Good" if attendance_percentage >= 85 else \
+            "Average" if attendance_percentage >= 75 else "Poor"
+
+    return {
+        "emp_id": emp_id,
+        "emp_name": emp_name,
+        "period": period,
+        "total_working_hours": f"{hours}h {minutes}m",
+        "expected_hours": f"{expected_hours}h",
+        "attendance_percentage": f"{attendance_percentage:.1f}%",
+        "status": status,
+        "statistics": {
+            "late_arrivals": late_count,
+            "actual_hours_worked": round(hours_worked, 2),
+            "expected_hours": expected_hours,
+            "check_in_out_pairs": pairs
+        }
+    }
+
+
+async def compute_hours(period, day=None, emp_id=None, department=None, source="events"):
+    """
+    Working hours for every matching employee in one query.
+    `source="rollups"` reads the pre-aggregated weekly/monthly/yearly documents instead of raw events.
+    Returns (start, end, [report, ...]).
+    """
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+    day = day or datetime.now()
+    start, end = period_bounds(period, day)
+    expected_hours = expected_hours_for(period, start, end)
+
+    totals = {}
+    if source == "rollups" and period != "daily":
+        for doc in await get_rollups(period, day, emp_id=emp_id, department=department):
+            totals[doc["emp_id"]] = (doc.get("emp_name"), doc.get("total_minutes", 0), doc.get("total_late", 0), doc.get("check_outs", 0))
+    else:
+        query = await attendance_query(department=department, emp_id=emp_id)
+        match = {"$and": [query, timestamp_range(start, end)]} if query else timestamp_range(start, end)
+        async for doc in db.attendance_collection.aggregate(hours_pipeline(match)):
+            totals[doc["_id"]] = (doc.get("emp_name"), doc["total_minutes"], doc["late_count"], doc["pairs"])
+
+    # Employees with no events in the period still get a (zero) row, company-wide too
+    if emp_id:
+        totals.setdefault(emp_id, (None, 0, 0, 0))
+    else:
+        async for user in db.users.find({"department": department} if department else {}, {"emp_id": 1, "name": 1}):
+            totals.setdefault(user["emp_id"], (user.get("name"), 0, 0, 0))
+
+    reports = [
+        hours_report(key, name, period, total_minutes, late_count, pairs, expected_hours)
+        for key, (name, total_minutes, late_count, pairs) in sorted(totals.items())
+    ]
+    return start, end, reports
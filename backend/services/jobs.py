@@ -0,0 +1,61 @@
+import asyncio
+import time
+import uuid
+from database.connection import db
+
+JOB_SAVE_INTERVAL = 1  # Seconds between progress writes of a running job
+
+_job_tasks = set()  # Keep references so background jobs are not garbage collected
+
+
+async def create_job(kind, **fields):
+    """
+    New background job of `kind` ("export", "enrollment"). Job state lives in
+    the `jobs` collection, so a status request can land on any uvicorn worker.
+    """
+    job = {"job_id": uuid.uuid4().hex, "kind": kind, "status": "queued", **fields}
+    await db.jobs.insert_one({"_id": job["job_id"], **job})
+    return job
+
+
+async def save_job(job):
+    await db.jobs.update_one({"_id": job["job_id"]}, {"$set": job})
+
+
+async def get_job(kind, job_id):
+    """The job's last saved state, or None for an unknown id"""
+    return await db.jobs.find_one({"_id": job_id, "kind": kind}, {"_id": 0})
+
+
+def start_job(job, work):
+    """
+    Run the coroutine `work`, which updates the `job` dict in place, in the
+    background. Progress is saved every JOB_SAVE_INTERVAL seconds and once more
+    when it ends; an exception marks the job failed.
+    """
+    async def save_progress():
+        while True:
+            await asyncio.sleep(JOB_SAVE_INTERVAL)
+            try:
+                await save_job(job)
+            except Exception as e:
+                print(f"Could not save {job['kind']} job progress: {str(e)}")
+
+    async def run():
+        saver = asyncio.create_task(save_progress())
+        try:
+            await work
+        except Exception as e:
+            job.update(status="failed", error=str(e))
+        finally:
+            saver.cancel()
+        job["finished"] = time.time()
+        try:
+            await save_job(job)
+        except Exception as e:
+            print(f"Could not save {job['kind']} job {job['job_id']}: {str(e)}")
+
+    task = asyncio.create_task(run())
+    _job_tasks.add(task)
+    task.add_done_callback(_job_tasks.discard)
+    return job["job_id"]
@@ -0,0 +1,129 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Per-request stage durations, turned into the Server-Timing header by the middleware in main.py
+request_timings = ContextVar("request_timings", default=None)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self.values = {}
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, count in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, values)} {count}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time"""
+
+    def __init__(self, name, help_text, read):
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.read()}"]
+
+
+class CallbackCounter(Gauge):
+    """Counter whose running total is kept elsewhere (e.g. cache hit counts) and read at scrape time"""
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter", f"{self.name} {self.read()}"]
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self.buckets = buckets
+        self.series = {}  # label values -> [bucket counts, sum, count]
+
+    def observe(self, value, *label_values):
+        series = self.series.setdefault(label_values, [[0] * len(self.buckets), 0.0, 0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total, count) in sorted(self.series.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), values + (bound,))} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), values + ('+Inf',))} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, values)} {count}")
+        return lines
+
+
+stage_seconds = Histogram(
+    "attendance_stage_seconds",
+    "Time spent per hot-path stage (upload, decode, resize, detect, encode, match, mongo_*)",
+    labels=("stage",),
+)
+outcomes = Counter(
+    "attendance_outcomes_total",
+    "Faces and requests by outcome (recognized, unknown, no_face, invalid_image, recorded, rejected, cooldown, queue_full, backlogged, error)",
+    labels=("outcome",),
+)
+metrics = [stage_seconds, outcomes]
+
+
+def register(metric):
+    metrics.append(metric)
+    return metric
+
+
+def observe_stage(stage, seconds):
+    """Record a stage duration in the histogram and in the current request's Server-Timing"""
+    stage_seconds.observe(seconds, stage)
+    timings = request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def observe_stages(seconds_by_stage):
+    """Stage durations measured in a recognition worker process"""
+    for stage, seconds in seconds_by_stage.items():
+        observe_stage(stage, seconds)
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def server_timing(timings):
+    """Server-Timing header value, durations in milliseconds"""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
@@ -0,0 +1,244 @@
+import asyncio
+import base64
+import json
+import os
+from datetime import datetime, timedelta
+import numpy as np
+from database.connection import db
+from database.migrations import timestamp_range
+from services.state_cache import employee_states, as_datetime
+
+PRESENCE_DAYS = int(os.getenv("PRESENCE_DAYS", "400"))  # Days of per-employee presence kept in memory
+PRESENCE_CACHE_SIZE = 64  # Rendered summaries/heatmaps kept
+WARM_BATCH = 10000
+
+
+def midnight(timestamp):
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class PresenceIndex:
+    """
+    Which employee checked in, and whether late, on which day: two bit
+    matrices with one row per employee and one bit per day (8 days per byte,
+    ~50KB per 1000 employees for a year). Built from the check-ins at
+    startup, then updated from every attendance event the employee state
+    cache sees, local or followed from other workers. Rendered responses are
+    cached until an event lands in their date range or the employee list changes.
+    """
+
+    def __init__(self, days=PRESENCE_DAYS):
+        self.width = (days + 7) // 8 + 1  # One spare byte, so sliding a byte forward keeps `days` of history
+        self.origin = None  # Day of bit 0
+        self.rows = {}
+        self.emp_ids = []
+        self.present = np.zeros((0, self.width), np.uint8)
+        self.late = np.zeros((0, self.width), np.uint8)
+        self.warmed = False
+        self._warming = None
+        self._cache = {}  # key -> (first day, last day, JSON body)
+
+    @property
+    def days(self):
+        return self.width * 8
+
+    def window(self):
+        """First and last day the bitmaps can answer for"""
+        return self.origin, self.origin + timedelta(days=self.days - 1)
+
+    # ---------- Updates ----------
+
+    def _reset(self, origin):
+        self.origin = origin
+        self.rows = {}
+        self.emp_ids = []
+        self.present = np.zeros((0, self.width), np.uint8)
+        self.late = np.zeros((0, self.width), np.uint8)
+        self._cache.clear()
+
+    def _row(self, emp_id):
+        row = self.rows.get(emp_id)
+        if row is None:
+            row = self.rows[emp_id] = len(self.emp_ids)
+            self.emp_ids.append(emp_id)
+            if row == len(self.present):
+                extra = np.zeros((max(row, 64), self.width), np.uint8)  # Double the capacity
+                self.present = np.concatenate([self.present, extra])
+                self.late = np.concatenate([self.late, extra])
+        return row
+
+    def _slide(self, day):
+        """Move the window forward a byte (8 days) at a time until it reaches `day`"""
+        offset = (day - self.origin).days
+        if offset >= self.days:
+            shift = min((offset - self.days) // 8 + 1, self.width)
+            for name in ("present", "late"):
+                matrix = getattr(self, name)
+                setattr(self, name, np.concatenate([matrix[:, shift:], np.zeros((len(matrix), shift), np.uint8)], axis=1))
+            self.origin += timedelta(days=8 * shift)
+            self._cache.clear()
+
+    def _set(self, events):
+        """Set the bits of (emp_id, day, late) check-ins; days before the window are ignored"""
+        if not events:
+            return
+        self._slide(max(day for _, day, _ in events))
+        rows, offsets, late = [], [], []
+        for emp_id, day, is_late in events:
+            offset = (day - self.origin).days
+            if 0 <= offset < self.days:
+                rows.append(self._row(emp_id))
+                offsets.append(offset)
+                late.append(is_late)
+        if not rows:
+            return
+        rows, offsets, late = np.array(rows), np.array(offsets), np.array(late, dtype=bool)
+        masks = (0x80 >> (offsets & 7)).astype(np.uint8)
+        np.bitwise_or.at(self.present, (rows, offsets >> 3), masks)
+        np.bitwise_or.at(self.late, (rows[late], offsets[late] >> 3), masks[late])
+
+    def apply(self, entry):
+        """Employee state cache listener: record a check-in"""
+        if entry.get("status") != "Check-in" or self.origin is None:
+            return
+        day = midnight(as_datetime(entry["timestamp"]))
+        self._set([(entry["emp_id"], day, entry.get("timing_status") == "Late")])
+        for key, (first, last, _) in list(self._cache.items()):
+            if first <= day <= last:
+                del self._cache[key]
+
+    async def warm(self):
+        """Rebuild from the check-ins inside the window (events arriving meanwhile are kept, bits only get set)"""
+        self.warmed = False
+        self._reset(midnight(datetime.now()) - timedelta(days=self.days - 9))
+        cursor = db.attendance_collection.find(
+            {**timestamp_range(self.origin), "status": "Check-in"},
+            {"_id": 0, "emp_id": 1, "timestamp": 1, "timing_status": 1},
+        ).batch_size(WARM_BATCH)
+        batch = []
+        async for entry in cursor:
+            batch.append((entry["emp_id"], midnight(as_datetime(entry["timestamp"])), entry.get("timing_status") == "Late"))
+            if len(batch) >= WARM_BATCH:
+                self._set(batch)
+                batch = []
+        self._set(batch)
+        self._cache.clear()
+        self.warmed = True
+
+    async def ensure_warm(self):
+        """Warm on first use if the startup warm-up has not finished (or failed); concurrent callers share it"""
+        if self.warmed:
+            return
+        if self._warming is None or self._warming.done():
+            self._warming = asyncio.create_task(self.warm())
+        await self._warming
+
+    # ---------- Reads ----------
+
+    def employees(self, department=None, emp_id=None):
+        """(emp_id, name, department) of current employees, sorted by emp_id"""
+        emp_ids = employee_states.states if employee_states.warmed else self.emp_ids
+        result = []
+        for emp in sorted(emp_ids):
+            state = employee_states.get(emp)
+            if (emp_id and emp != emp_id) or (department and state["department"] != department):
+                continue
+            result.append((emp, state["name"], state["department"]))
+        return result
+
+    def _bits(self, matrix, rows, first, last):
+        """Unpacked bits for day offsets [first, last); unknown employees and days outside the window read 0"""
+        out = np.zeros((len(rows), last - first), np.uint8)
+        lo, hi = max(first, 0), min(last, self.days)
+        known = rows >= 0
+        if hi > lo and known.any():
+            bits = np.unpackbits(matrix[rows[known], lo >> 3:(hi + 7) >> 3], axis=1)
+            out[known, lo - first:hi - first] = bits[:, (lo & 7):(lo & 7) + hi - lo]
+        return out
+
+    def _cached(self, key, first, last, render):
+        key = key + (employee_states.version,)
+        if key not in self._cache:
+            if len(self._cache) >= PRESENCE_CACHE_SIZE:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[key] = (first, last, json.dumps(render()).encode())
+        return self._cache[key][2]
+
+    def summary(self, day):
+        """JSON body: present/on-time/late/absent counts for `day`, overall and per department"""
+        def render():
+            employees = self.employees()
+            rows = np.array([self.rows.get(emp, -1) for emp, _, _ in employees], dtype=np.int64)
+            offset = (day - self.origin).days
+            present = self._bits(self.present, rows, offset, offset + 1)[:, 0]
+            late = self._bits(self.late, rows, offset, offset + 1)[:, 0]
+            departments = {}
+            for (_, _, department), is_present, is_late in zip(employees, present, late):
+                counts = departments.setdefault(department or "Not Specified", {"employees": 0, "present": 0, "late": 0})
+                counts["employees"] += 1
+                counts["present"] += int(is_present)
+                counts["late"] += int(is_late)
+            for counts in departments.values():
+                counts["on_time"] = counts["present"] - counts["late"]
+                counts["absent"] = counts["employees"] - counts["present"]
+            total_present, total_late = int(present.sum()), int(late.sum())
+            return {
+                "date": day.strftime("%Y-%m-%d"),
+                "employees": len(employees),
+                "present": total_present,
+                "on_time": total_present - total_late,
+                "late": total_late,
+                "absent": len(employees) - total_present,
+                "departments": departments,
+            }
+        return self._cached(("summary", day), day, day, render)
+
+    def heatmap(self, start, end, department=None, emp_id=None, encoding="codes"):
+        """
+        JSON body: per-day totals and per-employee presence for [start, end].
+        `codes` gives one character per day (0 absent, 1 on time, 2 late);
+        `bitmap` gives base64 present/late bitmaps, 8 days per byte, first day in the high bit.
+        """
+        days = (end - start).days + 1
+
+        def render():
+            employees = self.employees(department, emp_id)
+            rows = np.array([self.rows.get(emp, -1) for emp, _, _ in employees], dtype=np.int64)
+            first = (start - self.origin).days
+            present = self._bits(self.present, rows, first, first + days)
+            late = self._bits(self.late, rows, first, first + days)
+            present_per_day, late_per_day = present.sum(axis=0), late.sum(axis=0)
+            daily = [
+                {
+                    "date": (start + timedelta(days=i)).strftime("%Y-%m-%d"),
+                    "present": int(present_per_day[i]),
+                    "late": int(late_per_day[i]),
+                    "attendance": round(int(present_per_day[i]) / len(employees), 4) if employees else 0,
+                }
+                for i in range(days)
+            ]
+            if encoding == "bitmap":
+                packed_present, packed_late = np.packbits(present, axis=1), np.packbits(late, axis=1)
+                cells = [
+                    {"present": base64.b64encode(p.tobytes()).decode(), "late": base64.b64encode(l.tobytes()).decode()}
+                    for p, l in zip(packed_present, packed_late)
+                ]
+            else:
+                codes = (present + late + ord("0")).astype(np.uint8).tobytes().decode()  # Late implies present
+                cells = [{"days": codes[i * days:(i + 1) * days]} for i in range(len(employees))]
+            return {
+                "start": start.strftime("%Y-%m-%d"),
+                "end": end.strftime("%Y-%m-%d"),
+                "days": days,
+                "encoding": encoding,
+                "daily": daily,
+                "employees": [
+                    {"emp_id": emp, "name": name, "department": dept, **cell}
+                    for (emp, name, dept), cell in zip(employees, cells)
+                ],
+            }
+        return self._cached(("heatmap", start, end, department, emp_id, encoding), start, end, render)
+
+
+presence_index = PresenceIndex()
+employee_states.listeners.append(presence_index.apply)
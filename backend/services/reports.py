@@ -0,0 +1,85 @@
+import os
+from datetime import datetime, timedelta
+from bson import ObjectId
+from database.connection import db
+from database.migrations import timestamp_range
+
+SINCE_OVERLAP_MS = int(float(os.getenv("ATTENDANCE_SINCE_OVERLAP", "10")) * 1000)  # Re-read window for `since` polling
+
+
+def parse_day(value):
+    """'YYYY-MM-DD' query parameter to a datetime at midnight (None passes through)"""
+    return datetime.strptime(value, "%Y-%m-%d") if value else None
+
+
+def serialize_record(record):
+    """Make an attendance document JSON-safe: ObjectId and datetime fields to strings"""
+    record["_id"] = str(record["_id"])
+    if isinstance(record.get("timestamp"), datetime):
+        record["timestamp"] = record["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
+    return record
+
+
+async def department_clause(department):
+    """
+    Filter for a department's documents: tagged with it, or belonging to one of
+    its users. Documents written before events carried a department have none.
+    """
+    emp_ids = await db.users.distinct("emp_id", {"department": department})
+    return {"$or": [{"department": department}, {"emp_id": {"$in": emp_ids}}]}
+
+
+async def attendance_query(start=None, end=None, department=None, emp_id=None):
+    """
+    Mongo filter for attendance records. `start`/`end` are days (end inclusive).
+    Department membership is resolved through users, so records written
+    before events carried a department still match.
+    """
+    clauses = []
+    if emp_id:
+        clauses.append({"emp_id": emp_id})
+    if department:
+        clauses.append(await department_clause(department))
+    if start or end:
+        clauses.append(timestamp_range(start, end + timedelta(days=1) if end else None))
+
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def page_query(query, cursor=None):
+    """Add the cursor condition: `cursor` pages backwards (older records)"""
+    if cursor:
+        return {"$and": [query, {"_id": {"$lt": ObjectId(cursor)}}]} if query else {"_id": {"$lt": ObjectId(cursor)}}
+    return query
+
+
+def since_query(query, since):
+    """
+    Records inserted after the point `since` (a previous response's `latest`)
+    stands for. `_id`s are assigned when an event is decided, not when it is
+    written, so events from other workers or replayed from a journal can land
+    behind newer `_id`s; `inserted_at` is stamped at write time instead, and a
+    caught-up token re-reads SINCE_OVERLAP_MS before it, so clients must skip
+    records whose `_id` they already have. A token naming a record continues
+    right after it (the previous page was full).
+    """
+    if ObjectId.is_valid(since):  # Token from before inserted_at existed
+        since = str(int(ObjectId(since).generation_time.timestamp() * 1000))
+    if "_" in since:
+        inserted_at, last_id = since.split("_", 1)
+        condition = {"$or": [
+            {"inserted_at": {"$gt": int(inserted_at)}},
+            {"inserted_at": int(inserted_at), "_id": {"$gt": ObjectId(last_id)}},
+        ]}
+    else:
+        condition = {"inserted_at": {"$gte": int(since) - SINCE_OVERLAP_MS}}
+    return {"$and": [query, condition]} if query else condition
+
+
+def latest_token(records, limit, polled_at):
+    """`latest` for a `since` response: continue after the last record of a full page, else from when this poll started"""
+    if records and len(records) == limit:
+        return f"{records[-1]['inserted_at']}_{records[-1]['_id']}"
+    return str(polled_at)
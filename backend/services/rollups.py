@@ -0,0 +1,175 @@
+import asyncio
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from database.connection import (
+    db,
+    weekly_attendance_collection,
+    monthly_attendance_collection,
+    yearly_attendance_collection,
+)
+from services.reports import department_clause
+from services.state_cache import as_datetime
+
+
+def week_start_of(timestamp):
+    """Monday 00:00 of the week containing `timestamp`"""
+    day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return day - timedelta(days=day.weekday())
+
+
+def rollup_keys(emp_id, timestamp):
+    """Filter identifying the weekly, monthly and yearly rollup documents for an event"""
+    week_start = week_start_of(timestamp)
+    return {
+        "weekly": {"emp_id": emp_id, "week_start": week_start, "week_end": week_start + timedelta(days=7)},
+        "monthly": {"emp_id": emp_id, "month": timestamp.month, "year": timestamp.year},
+        "yearly": {"emp_id": emp_id, "year": timestamp.year},
+    }
+
+
+def period_bounds(period, day):
+    """[start, end) of the daily/weekly/monthly/yearly period containing `day`"""
+    if period == "daily":
+        start = day.replace(hour=0, minute=0, second=0, microsecond=0)
+        return start, start + timedelta(days=1)
+    if period == "weekly":
+        start = week_start_of(day)
+        return start, start + timedelta(days=7)
+    if period == "monthly":
+        start = datetime(day.year, day.month, 1)
+        end = datetime(day.year + 1, 1, 1) if day.month == 12 else datetime(day.year, day.month + 1, 1)
+        return start, end
+    if period == "yearly":
+        return datetime(day.year, 1, 1), datetime(day.year + 1, 1, 1)
+    raise ValueError(f"Unknown period: {period}")
+
+
+def working_days(start, end):
+    """Number of Monday-Friday days in [start, end)"""
+    days = (end.date() - start.date()).days
+    full_weeks, rest = divmod(max(days, 0), 7)
+    first = start.weekday()
+    return full_weeks * 5 + sum(1 for i in range(rest) if (first + i) % 7 < 5)
+
+
+async def get_rollups(period, day, emp_id=None, department=None):
+    """
+    Pre-aggregated counters for the period containing `day` - one indexed
+    lookup per employee instead of a scan over raw events. Absences are
+    derived from working days elapsed so far minus days present.
+    """
+    key = rollup_keys(emp_id, day)[period]
+    query = {field: value for field, value in key.items() if field not in ("emp_id", "week_end")}
+    if emp_id:
+        query["emp_id"] = emp_id
+    if department:
+        query.update(await department_clause(department))  # Rollups of older events may have no department
+
+    start, end = period_bounds(period, day)
+    elapsed = working_days(start, min(end, datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)))
+
+    docs = await ROLLUP_COLLECTIONS[period].find(query, {"_id": 0}).to_list(None)
+    for doc in docs:
+        doc["total_absent"] = max(elapsed - doc.get("total_present", 0), 0)
+        doc["total_hours"] = round(doc.get("total_minutes", 0) / 60, 2)
+        for field in ("week_start", "week_end"):
+            if isinstance(doc.get(field), datetime):
+                doc[field] = doc[field].strftime("%Y-%m-%d")
+    return docs
+
+
+ROLLUP_COLLECTIONS = {
+    "weekly": weekly_attendance_collection,
+    "monthly": monthly_attendance_collection,
+    "yearly": yearly_attendance_collection,
+}
+
+
+def event_increments(entry):
+    """Counter deltas one attendance event contributes to its rollups"""
+    if entry["status"] == "Check-in":
+        inc = {"total_present": 1, "check_ins": 1}
+        if entry.get("timing_status") == "Late":
+            inc["total_late"] = 1
+        return inc
+    if entry["status"] == "Check-out":
+        return {"check_outs": 1, "total_minutes": entry.get("worked_minutes", 0)}
+    return {}
+
+
+def rollup_operations(entries):
+    """Group $inc upserts for a batch of events by rollup collection"""
+    operations = {period: [] for period in ROLLUP_COLLECTIONS}
+    for entry in entries:
+        inc = event_increments(entry)
+        if not inc:
+            continue
+        for period, key in rollup_keys(entry["emp_id"], as_datetime(entry["timestamp"])).items():
+            operations[period].append(UpdateOne(
+                key,
+                {
+                    "$inc": inc,
+                    "$set": {"emp_name": entry.get("emp_name"), "department": entry.get("department")},
+                    "$setOnInsert": {"total_absent": 0},  # Absences are derived at read time
+                },
+                upsert=True,
+            ))
+    return operations
+
+
+async def apply_rollups(entries):
+    """Fold newly inserted attendance events into the weekly/monthly/yearly rollups"""
+    operations = rollup_operations(entries)
+    await asyncio.gather(*(
+        ROLLUP_COLLECTIONS[period].bulk_write(ops, ordered=False)
+        for period, ops in operations.items() if ops
+    ))
+
+
+async def rebuild_rollups():
+    """
+    Recompute every rollup from raw events (backfill after the migration, or repair).
+    Events are streamed in (emp_id, timestamp) order; worked minutes are the
+    time from each Check-in to the following Check-out. Events without a
+    department take it from the employee's user profile.
+    """
+    totals = {period: {} for period in ROLLUP_COLLECTIONS}
+    # Events written before they carried a department get it from the employee's profile
+    departments = {user["emp_id"]: user.get("department") async for user in db.users.find({}, {"emp_id": 1, "department": 1})}
+    last_check_in = {}
+    count = 0
+    cursor = db.attendance_collection.find().sort([("emp_id", 1), ("timestamp", 1)])
+    async for entry in cursor:
+        timestamp = as_datetime(entry["timestamp"])
+        entry = {**entry, "timestamp": timestamp}
+        if entry["status"] == "Check-in":
+            last_check_in[entry["emp_id"]] = timestamp
+        elif entry["status"] == "Check-out":
+            check_in = last_check_in.pop(entry["emp_id"], None)
+            if "worked_minutes" not in entry:
+                entry["worked_minutes"] = (timestamp - check_in).total_seconds() / 60 if check_in else 0
+
+        for period, key in rollup_keys(entry["emp_id"], timestamp).items():
+            doc = totals[period].setdefault(tuple(key.values()), {
+                **key, "total_present": 0, "total_absent": 0, "total_late": 0,
+                "check_ins": 0, "check_outs": 0, "total_minutes": 0,
+            })
+            for field, value in event_increments(entry).items():
+                doc[field] += value
+            doc["emp_name"] = entry.get("emp_name")
+            doc["department"] = entry.get("department") or departments.get(entry["emp_id"])
+        count += 1
+
+    for period, collection in ROLLUP_COLLECTIONS.items():
+        await collection.delete_many({})
+        docs = list(totals[period].values())
+        if docs:
+            await collection.insert_many(docs)
+
+    print(f"Rebuilt rollups from {count} attendance event(s)")
+    return count
+
+
+if __name__ == "__main__":
+    # python -m services.rollups
+    asyncio.run(rebuild_rollups())
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from database.connection import db
+
+STATE_SYNC_INTERVAL = float(os.getenv("STATE_SYNC_INTERVAL", "2"))  # Seconds between polls for other workers' events
+STATE_SYNC_OVERLAP_MS = 10000  # Re-read window: another worker's insert can land with an inserted_at just before our last poll
+
+
+def as_datetime(value):
+    """Attendance timestamps may be stored as strings or BSON dates"""
+    if isinstance(value, str):
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    return value
+
+
+class EmployeeStateCache:
+    """
+    Write-through cache of each employee's current attendance state
+    (last status/timestamp) and profile (name/department), so deciding
+    check-in vs check-out needs no Mongo reads.
+
+    Warmed from one aggregation at startup, updated on every insert made by
+    this process, and kept in step with other workers by following their
+    inserts (change stream when Mongo supports it, otherwise polling on
+    `inserted_at`, the write time). Listeners get every event applied once,
+    local or followed; `version` changes whenever the set of employees or a
+    profile changes.
+    """
+
+    def __init__(self):
+        self.states = {}
+        self.warmed = False
+        self.version = 0
+        self.listeners = []
+        self._seen = None  # While polling: _id -> epoch ms first applied, for events the poll window reads again
+        self._sync_task = None
+
+    def get(self, emp_id):
+        return self.states.get(emp_id) or {
+            "last_status": None, "last_timestamp": None, "name": "Unknown", "department": None,
+        }
+
+    def _state(self, emp_id):
+        return self.states.setdefault(emp_id, self.get(emp_id))
+
+    def apply(self, entry):
+        """Record an attendance event; older events than the cached one, and events already applied, are ignored"""
+        if self._seen is not None and "_id" in entry:
+            if entry["_id"] in self._seen:
+                return
+            self._seen[entry["_id"]] = int(time.time() * 1000)
+        if entry["emp_id"] not in self.states:
+            self.version += 1
+        state = self._state(entry["emp_id"])
+        timestamp = as_datetime(entry["timestamp"])
+        if state["last_timestamp"] is None or timestamp >= state["last_timestamp"]:
+            state["last_status"] = entry["status"]
+            state["last_timestamp"] = timestamp
+        if entry.get("emp_name") and state["name"] == "Unknown":
+            state["name"] = entry["emp_name"]
+        for listener in self.listeners:
+            listener(entry)
+
+    def set_profile(self, emp_id, name, department=None):
+        state = self._state(emp_id)
+        state["name"] = name
+        state["department"] = department
+        self.version += 1
+
+    def forget(self, emp_id):
+        self.states.pop(emp_id, None)
+        self.version += 1
+
+    async def warm(self):
+        """Load every employee's latest event and profile in one aggregation"""
+        pipeline = [
+            {"$sort": {"timestamp": 1}},
+            {"$group": {
+                "_id": "$emp_id",
+                "last_status": {"$last": "$status"},
+                "last_timestamp": {"$last": "$timestamp"},
+                "emp_name": {"$last": "$emp_name"},
+            }},
+            {"$unionWith": {
+                "coll": "users",
+                "pipeline": [{"$project": {"_id": "$emp_id", "name": 1, "department": 1}}],
+            }},
+        ]
+        states = {}
+        async for doc in db.attendance_collection.aggregate(pipeline):
+            state = states.setdefault(doc["_id"], self.get(doc["_id"]))
+            if "last_status" in doc:
+                state["last_status"] = doc["last_status"]
+                state["last_timestamp"] = as_datetime(doc["last_timestamp"])
+                if state["name"] == "Unknown" and doc.get("emp_name"):
+                    state["name"] = doc["emp_name"]
+            if "name" in doc:
+                state["name"] = doc["name"]
+                state["department"] = doc.get("department")
+        self.states = states
+        self.warmed = True
+        self.version += 1
+
+    # ---------- Cross-worker sync ----------
+
+    def start_sync(self):
+        if self._sync_task is None:
+            self._sync_task = asyncio.create_task(self._follow())
+
+    async def stop_sync(self):
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            self._sync_task = None
+
+    async def _follow(self):
+        try:
+            await self._watch()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await self._poll()  # Standalone Mongo has no change streams
+
+    async def _watch(self):
+        async with db.attendance_collection.watch([{"$match": {"operationType": "insert"}}]) as stream:
+            async for change in stream:
+                self.apply(change["fullDocument"])
+
+    async def _poll(self):
+        """
+        Follow events by write time. `_id`s are assigned when an event is
+        decided, so a batched, retried or journal-replayed insert can land
+        behind newer `_id`s; `inserted_at` is stamped when it is written.
+        Each poll re-reads STATE_SYNC_OVERLAP_MS and skips `_id`s already applied.
+        """
+        since = int(time.time() * 1000)
+        self._seen = {}
+        while True:
+            await asyncio.sleep(STATE_SYNC_INTERVAL)
+            polled_at = int(time.time() * 1000)
+            try:
+                cursor = db.attendance_collection.find(
+                    {"inserted_at": {"$gte": since - STATE_SYNC_OVERLAP_MS}},
+                    {"emp_id": 1, "emp_name": 1, "status": 1, "timestamp": 1, "timing_status": 1},
+                )
+                async for entry in cursor:
+                    self.apply(entry)
+                since = polled_at
+                self._forget_seen(since - 2 * STATE_SYNC_OVERLAP_MS)
+            except Exception as e:
+                print(f"Employee state sync error: {str(e)}")
+
+    def _forget_seen(self, before):
+        """Drop _ids applied before `before` (epoch ms); the poll window no longer reaches their inserts"""
+        self._seen = {_id: seen for _id, seen in self._seen.items() if seen >= before}
+
+employee_states = EmployeeStateCache()
@@ -0,0 +1,40 @@
+import os
+import sys
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+COLLECTIONS = ("attendance_collection", "weekly_attendance_collection", "monthly_attendance_collection", "yearly_attendance_collection")
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """A mongomock-motor database, patched in wherever a module imported `db` or a collection from database.connection"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import mongomock.collection
+    from database import connection
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        # mongomock's bulk_write rejects the UpdateOne objects of pymongo >= 4.9; rollups only send upserts
+        for request in requests:
+            self.update_one(request._filter, request._doc, upsert=request._upsert)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "bulk_write", bulk_write)
+    db = mongomock_motor.AsyncMongoMockClient()["attendance_test"]
+    replacements = [(connection.db, db)]
+    for name in COLLECTIONS:
+        original = getattr(connection, name)
+        replacements.append((original, db[original.name]))
+    for module in list(sys.modules.values()):
+        if not getattr(module, "__file__", None) or not module.__file__.startswith(BACKEND):
+            continue
+        for name, value in list(vars(module).items()):
+            for original, replacement in replacements:
+                if value is original:
+                    monkeypatch.setattr(module, name, replacement)
+                elif isinstance(value, dict):  # e.g. rollups.ROLLUP_COLLECTIONS
+                    for key, item in list(value.items()):
+                        if item is original:
+                            monkeypatch.setitem(value, key, replacement)
+    return db
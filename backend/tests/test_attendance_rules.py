@@ -0,0 +1,28 @@
+import asyncio
+from datetime import datetime
+from services import attendance
+from services.attendance import record_attendance
+from services.attendance_writer import AttendanceWriter
+from services.dedupe import TTLCache
+from services.state_cache import EmployeeStateCache
+
+
+def test_rejection_is_not_cached_past_the_rule_boundary(mongo, monkeypatch):
+    states = EmployeeStateCache()
+    states.warmed = True
+    states.apply({"emp_id": "E1", "status": "Check-in", "timestamp": datetime(2026, 3, 2, 9, 5)})
+    monkeypatch.setattr(attendance, "employee_states", states)
+    monkeypatch.setattr(attendance, "attendance_cooldown", TTLCache(maxsize=10, ttl=60))
+
+    async def run():
+        monkeypatch.setattr(attendance, "attendance_writer", AttendanceWriter(journal_path=""))
+        early = await record_attendance(["E1"], datetime(2026, 3, 2, 16, 59, 30))
+        on_time = await record_attendance(["E1"], datetime(2026, 3, 2, 17, 0, 5))
+        again = await record_attendance(["E1"], datetime(2026, 3, 2, 17, 0, 20))
+        await attendance.attendance_writer.stop()
+        return early, on_time, again
+
+    early, on_time, again = asyncio.run(run())
+    assert early["E1"]["message"].startswith("Early check-out not allowed")
+    assert on_time["E1"]["status"] == "Check-out"
+    assert "already recorded" in again["E1"]["message"]  # Recorded events are still answered from the cooldown cache
@@ -0,0 +1,120 @@
+import asyncio
+import os
+import subprocess
+import sys
+from datetime import datetime
+import pytest
+from bson import ObjectId, json_util
+from services import attendance_writer as writer_module
+from services.attendance_writer import AttendanceBacklogged, AttendanceWriter, insert_new
+
+
+def event(emp_id, minute=0):
+    return {"_id": ObjectId(), "emp_id": emp_id, "status": "Check-in", "timestamp": datetime(2025, 3, 3, 9, minute)}
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_insert_new_skips_events_already_written(mongo):
+    events = [event(f"E{i}", i) for i in range(5)]
+
+    async def run():
+        await mongo.attendance_collection.insert_many([dict(events[1]), dict(events[3])])
+        inserted = await insert_new([dict(e) for e in events])
+        return inserted, await mongo.attendance_collection.count_documents({})
+
+    inserted, count = asyncio.run(run())
+    assert [e["emp_id"] for e in inserted] == ["E0", "E2", "E4"]
+    assert all(isinstance(e["inserted_at"], int) for e in inserted)
+    assert count == 5
+
+
+def test_replay_claims_journals_of_dead_processes(mongo, tmp_path):
+    prefix = str(tmp_path / "attendance.journal")
+    events = [event(f"E{i}", i) for i in range(3)]
+    orphan = f"{prefix}.{dead_pid()}"
+    with open(orphan, "w") as journal:
+        for e in reversed(events):  # Replay sorts by _id, i.e. decision order
+            journal.write(json_util.dumps(e) + "\n")
+        journal.write('{"_id": {"$oid": "torn')  # Last line cut off by the crash
+    live = f"{prefix}.{os.getppid()}"  # A running worker's journal is not touched
+    with open(live, "w") as journal:
+        journal.write(json_util.dumps(event("E9")) + "\n")
+
+    async def run():
+        await mongo.attendance_collection.insert_one(dict(events[0]))  # Written before the crash
+        replayed = await AttendanceWriter(journal_path=prefix).replay()
+        return replayed, await mongo.attendance_collection.find({}, {"emp_id": 1}).sort("_id", 1).to_list(None)
+
+    replayed, docs = asyncio.run(run())
+    assert replayed == 2
+    assert [doc["emp_id"] for doc in docs] == ["E0", "E1", "E2"]
+    assert not os.path.exists(orphan) and not any(name.startswith(os.path.basename(orphan)) for name in os.listdir(tmp_path))
+    assert os.path.exists(live)
+
+
+def test_submit_journals_until_the_queue_drains(mongo, tmp_path):
+    writer = AttendanceWriter(journal_path=str(tmp_path / "journal"), max_delay=0.01)
+
+    async def run():
+        await writer.submit([event("E1")])
+        with open(writer.journal_path) as journal:
+            journaled = journal.read()
+        await writer.flush(1)
+        await writer.stop(1)
+        return journaled
+
+    assert '"E1"' in asyncio.run(run())
+    assert os.path.getsize(writer.journal_path) == 0
+
+
+def test_wait_for_room_gives_up_when_mongo_falls_behind(mongo, monkeypatch):
+    async def stuck(entries):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(writer_module, "insert_new", stuck)
+    writer = AttendanceWriter(journal_path="", max_pending=2, max_delay=0.01, wait_timeout=0.05)
+
+    async def run():
+        await writer.submit([event("E1")])
+        await writer.wait_for_room()  # One queued, room for another
+        await writer.submit([event("E2")])
+        with pytest.raises(AttendanceBacklogged):
+            await writer.wait_for_room()
+        await writer.stop(0.01)
+
+    asyncio.run(run())
+
+
+def test_backlogged_attendance_answers_503(mongo, monkeypatch):
+    pytest.importorskip("httpx")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from routes import attendance as routes
+    from services import attendance
+
+    async def stuck(entries):
+        await asyncio.Event().wait()
+
+    async def match(fn, encodings, generation):
+        return [("E1", 0.1)], {}
+
+    monkeypatch.setattr(writer_module, "insert_new", stuck)
+    monkeypatch.setattr(routes, "gallery_ready", True)
+    monkeypatch.setattr(routes.recognition_pool, "run", match)
+    app = FastAPI()
+    app.include_router(routes.router, prefix="/api")
+
+    with TestClient(app) as client:
+        writer = AttendanceWriter(journal_path="", max_pending=1, max_delay=0.01, wait_timeout=0.05)
+        monkeypatch.setattr(attendance, "attendance_writer", writer)
+        client.portal.call(writer.submit, [event("E0")])  # Never written: the queue stays full
+        response = client.post("/api/mark-attendance/embeddings", json={"camera_id": "c1", "encodings": [[0.0] * 128]})
+        client.portal.call(writer.stop, 0.01)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(writer_module.BACKLOG_RETRY_AFTER_SECONDS)
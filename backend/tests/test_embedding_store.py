@@ -0,0 +1,102 @@
+import os
+import numpy as np
+import pytest
+from recognition.embedding_store import EmbeddingStore, EMBEDDING_DIM, ROW_BYTES, VECTORS_FILE
+
+
+def vector(seed):
+    return np.random.default_rng(seed).random(EMBEDDING_DIM, dtype=np.float32)
+
+
+def fake_encode(path):
+    """Deterministic 'encoding' derived from the image bytes"""
+    with open(path, "rb") as f:
+        return vector(int.from_bytes(f.read()[:4], "big"))
+
+
+def write_image(dataset, name, seed):
+    path = os.path.join(dataset, name)
+    with open(path, "wb") as f:
+        f.write(seed.to_bytes(4, "big"))
+    return path
+
+
+def stored(store, source):
+    return np.asarray(store.vectors()[store.entries[source]["row"]])
+
+
+def test_rows_follow_appends(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "store"))
+    assert store.add("E1", vector(1), "d1", "E1.jpg") == 0
+    store.add_many([("E2", vector(2), "d2", "E2.jpg"), ("E3", vector(3), "d3", "E3.jpg")])
+    assert store.add("E4", vector(4), "d4", "E4.jpg") == 3
+    for seed, source in enumerate(["E1.jpg", "E2.jpg", "E3.jpg", "E4.jpg"], start=1):
+        np.testing.assert_array_equal(stored(store, source), vector(seed))
+    assert os.path.getsize(store.vectors_path) == 4 * ROW_BYTES
+
+
+def test_same_content_shares_a_row(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "store"))
+    first = store.add("E1", vector(1), "d1", "E1.jpg")
+    assert store.add("E1", vector(1), "d1", "E1/extra.jpg") == first
+    assert store.index["rows"] == 1
+
+
+def test_crashed_sync_leaves_no_drift(tmp_path):
+    store_dir, dataset = str(tmp_path / "store"), str(tmp_path / "dataset")
+    os.makedirs(dataset)
+    write_image(dataset, "E1.jpg", 1)
+    EmbeddingStore(store_dir).sync(dataset, encode=fake_encode)
+
+    # The sync encodes and appends E2 and E3, then dies before writing the index
+    write_image(dataset, "E2.jpg", 2)
+    write_image(dataset, "E3.jpg", 3)
+    encoded = []
+
+    def crashing_encode(path):
+        if len(encoded) == 2:
+            raise KeyboardInterrupt
+        encoded.append(path)
+        return fake_encode(path)
+
+    write_image(dataset, "E4.jpg", 4)
+    with pytest.raises(KeyboardInterrupt):
+        EmbeddingStore(store_dir).sync(dataset, encode=crashing_encode)
+    assert os.path.getsize(os.path.join(store_dir, VECTORS_FILE)) == 3 * ROW_BYTES  # Two orphan rows
+
+    store = EmbeddingStore(store_dir)
+    store.add("E9", vector(9), "d9", "E9.jpg")
+    np.testing.assert_array_equal(stored(store, "E9.jpg"), vector(9))
+    store.sync(dataset, encode=fake_encode)
+    for seed in range(1, 5):
+        np.testing.assert_array_equal(stored(store, f"E{seed}.jpg"), vector(seed))
+    assert os.path.getsize(store.vectors_path) == store.index["rows"] * ROW_BYTES
+
+
+def test_two_writers_share_the_files(tmp_path):
+    # Two store objects stand in for two processes (a uvicorn worker and the enroll CLI)
+    store_dir = str(tmp_path / "store")
+    first, second = EmbeddingStore(store_dir), EmbeddingStore(store_dir)
+    first.add("E1", vector(1), "d1", "E1.jpg")
+    second.add("E2", vector(2), "d2", "E2.jpg")
+    first.add_many([("E3", vector(3), "d3", "E3.jpg"), ("E4", vector(4), "d4", "E4.jpg")])
+    second.add("E5", vector(5), "d5", "E5.jpg")
+
+    store = EmbeddingStore(store_dir)
+    assert store.index["rows"] == 5
+    for seed in range(1, 6):
+        np.testing.assert_array_equal(stored(store, f"E{seed}.jpg"), vector(seed))
+
+
+def test_compact_keeps_live_vectors(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "store"))
+    for seed in range(1, 5):
+        store.add(f"E{seed}", vector(seed), f"d{seed}", f"E{seed}.jpg")
+    store.remove("E1.jpg")
+    store.remove("E3.jpg")
+    store.compact()
+    assert store.index["rows"] == 2
+    assert os.path.getsize(store.vectors_path) == 2 * ROW_BYTES
+    np.testing.assert_array_equal(stored(store, "E2.jpg"), vector(2))
+    np.testing.assert_array_equal(stored(store, "E4.jpg"), vector(4))
+    assert store.add("E5", vector(5), "d5", "E5.jpg") == 2
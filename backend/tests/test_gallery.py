@@ -0,0 +1,102 @@
+import numpy as np
+from recognition.gallery import EMBEDDING_DIM, Gallery
+
+
+def vectors(n, seed=0):
+    return np.random.default_rng(seed).random((n, EMBEDDING_DIM), dtype=np.float32)
+
+
+def brute_force(queries, templates):
+    return np.linalg.norm(queries[:, None, :] - templates[None, :, :], axis=2)
+
+
+def test_top_k_matches_brute_force():
+    templates = vectors(40)
+    queries = vectors(5, seed=1)
+    gallery = Gallery([f"E{i}" for i in range(40)], templates, use_ann=False)
+
+    indices, distances = gallery.top_k(queries, k=3)
+    expected = brute_force(queries, templates)
+    assert indices.shape == distances.shape == (5, 3)
+    np.testing.assert_array_equal(indices, np.argsort(expected, axis=1)[:, :3])
+    np.testing.assert_allclose(distances, np.sort(expected, axis=1)[:, :3], rtol=1e-4, atol=1e-4)
+
+
+def test_top_k_caps_k_and_handles_empty_inputs():
+    gallery = Gallery(["E1", "E2"], vectors(2), use_ann=False)
+    indices, _ = gallery.top_k(vectors(1), k=5)
+    assert indices.shape == (1, 2)
+    assert Gallery(use_ann=False).top_k(vectors(2), k=1)[0].shape == (2, 0)
+    assert gallery.top_k(np.empty((0, EMBEDDING_DIM)), k=1)[0].shape == (0, 0)
+
+
+def test_identify_applies_the_threshold():
+    templates = vectors(3)
+    gallery = Gallery(["E1", "E2", "E3"], templates, use_ann=False)
+    far = templates[0] + 1.0
+    assert gallery.identify(np.stack([templates[1] + 0.001, far])) == ["E2", "Unknown"]
+
+
+def test_match_returns_distinct_employees():
+    templates = vectors(4)
+    # E1 has the two templates nearest to the query; the second hit must be another employee
+    gallery = Gallery(["E1", "E1", "E2", "E3"], templates, keys=["a", "b", "c", "d"], use_ann=False)
+    query = (templates[0] + templates[1]) / 2
+    [candidates] = gallery.match(query[None, :], k=2)
+    assert [emp_id for emp_id, _ in candidates][0] == "E1"
+    assert len({emp_id for emp_id, _ in candidates}) == 2
+
+
+def test_swap_remove_keeps_rows_and_keys_consistent():
+    templates = vectors(5)
+    keys = ["a", "b", "c", "d", "e"]
+    gallery = Gallery(["E1", "E2", "E3", "E4", "E5"], templates, keys=list(keys), use_ann=False)
+
+    assert gallery.remove("b")  # "e", the last row, moves into row 1
+    assert not gallery.remove("b")
+    assert len(gallery) == 4
+    assert gallery.keys == ["a", "e", "c", "d"] and gallery.emp_ids == ["E1", "E5", "E3", "E4"]
+    np.testing.assert_array_equal(gallery.matrix[1], templates[4])
+    np.testing.assert_allclose(gallery.sq_norms, np.einsum("ij,ij->i", gallery.matrix, gallery.matrix), rtol=1e-5)
+    assert gallery.identify(templates[[4, 2]]) == ["E5", "E3"]
+    assert "E2" not in gallery.emp_ids and gallery.templates("E2") == []
+
+    gallery.add("f", "E6", templates[1])  # Appended after the moved row, buffer reused
+    assert gallery.keys[-1] == "f" and gallery.identify(templates[1][None, :]) == ["E6"]
+
+
+def test_add_under_an_existing_key_replaces_the_template():
+    templates = vectors(3)
+    gallery = Gallery(["E1", "E2"], templates[:2], keys=["a", "b"], use_ann=False)
+    gallery.add("a", "E1", templates[2])
+    assert len(gallery) == 2 and gallery.identify(templates[2][None, :]) == ["E1"]
+    gallery.add("a", "E3", templates[2])  # Same key, another employee: the old template goes
+    assert gallery.templates("E1") == [] and gallery.templates("E3") == ["a"]
+
+
+def test_remove_employee_and_growth_past_capacity():
+    gallery = Gallery(use_ann=False)
+    templates = vectors(40)
+    for i, template in enumerate(templates):
+        gallery.add(f"k{i}", f"E{i % 2}", template)
+    assert len(gallery) == 40
+    assert gallery.remove_employee("E0") == 20
+    assert set(gallery.emp_ids) == {"E1"}
+    assert sorted(gallery._positions.values()) == list(range(20))
+    assert gallery.identify(templates[1::2]) == ["E1"] * 20
+
+
+def test_centroid_follows_the_employee_templates():
+    templates = vectors(3)
+    gallery = Gallery(["E1", "E1", "E2"], templates, keys=["a", "b", "c"], use_ann=False, centroids=True)
+    centroid = gallery._positions["E1#centroid"]
+    np.testing.assert_allclose(gallery.matrix[centroid], templates[:2].mean(axis=0), rtol=1e-5)
+    assert gallery.templates("E1") == ["a", "b"]  # The centroid is not a template
+
+    gallery.add("d", "E1", templates[2] * 0.5)
+    centroid = gallery._positions["E1#centroid"]
+    np.testing.assert_allclose(gallery.matrix[centroid], np.stack([templates[0], templates[1], templates[2] * 0.5]).mean(axis=0), rtol=1e-5)
+
+    gallery.remove("a")
+    gallery.remove("d")  # One template left: no centroid
+    assert "E1#centroid" not in gallery._positions and len(gallery) == 2
@@ -0,0 +1,23 @@
+import asyncio
+from datetime import datetime
+from services.hours import compute_hours
+from services.rollups import rollup_keys
+
+
+def test_company_wide_report_includes_employees_without_events(mongo):
+    day = datetime(2025, 3, 5)
+
+    async def run():
+        await mongo.users.insert_many([
+            {"emp_id": "E1", "name": "Ada", "department": "Engineering"},
+            {"emp_id": "E2", "name": "Bo", "department": "Sales"},
+        ])
+        key = rollup_keys("E1", day)["weekly"]
+        await mongo.weekly_attendance.insert_one({**key, "emp_name": "Ada", "department": "Engineering", "total_minutes": 480, "check_outs": 1})
+        _, _, everyone = await compute_hours("weekly", day, source="rollups")
+        _, _, sales = await compute_hours("weekly", day, department="Sales", source="rollups")
+        return everyone, sales
+
+    everyone, sales = asyncio.run(run())
+    assert [(r["emp_id"], r["total_working_hours"]) for r in everyone] == [("E1", "8h 0m"), ("E2", "0h 0m")]
+    assert [(r["emp_id"], r["emp_name"], r["total_working_hours"]) for r in sales] == [("E2", "Bo", "0h 0m")]
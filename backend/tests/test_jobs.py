@@ -0,0 +1,64 @@
+import asyncio
+from services import jobs
+from services.jobs import create_job, get_job, start_job
+
+
+async def wait_finished(kind, job_id):
+    for _ in range(200):
+        job = await get_job(kind, job_id)
+        if job and "finished" in job:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_job_state_is_read_back_from_mongo(mongo, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_SAVE_INTERVAL", 0.01)
+
+    async def work(job):
+        job.update(status="encoding", processed=1)
+        await asyncio.sleep(0.1)
+        job.update(status="done", processed=2)
+
+    async def run():
+        job = await create_job("enrollment", total=2)
+        job_id = start_job(job, work(job))
+        await asyncio.sleep(0.05)
+        running = await get_job("enrollment", job_id)  # What another worker would see mid-job
+        return running, await wait_finished("enrollment", job_id), await get_job("export", job_id)
+
+    running, done, other_kind = asyncio.run(run())
+    assert (running["status"], running["processed"]) == ("encoding", 1)
+    assert (done["status"], done["processed"], done["total"]) == ("done", 2, 2)
+    assert other_kind is None
+
+
+def test_failed_job_records_the_error(mongo):
+    async def work():
+        raise ValueError("No CSV of emp_id,name,role,department provided")
+
+    async def run():
+        job = await create_job("enrollment")
+        return await wait_finished("enrollment", start_job(job, work()))
+
+    job = asyncio.run(run())
+    assert job["status"] == "failed" and job["error"].startswith("No CSV")
+
+
+def test_export_job_file_is_found_through_the_job(mongo, tmp_path, monkeypatch):
+    from datetime import datetime
+    from services import export
+
+    monkeypatch.setattr(export, "EXPORT_DIR", str(tmp_path))
+
+    async def run():
+        await mongo.attendance_collection.insert_one(
+            {"emp_id": "E1", "emp_name": "Ada", "status": "Check-in", "timestamp": datetime(2025, 3, 3, 9, 5)}
+        )
+        job_id = await export.start_export_job("csv", {}, "attendance.csv")
+        return await wait_finished("export", job_id)
+
+    job = asyncio.run(run())
+    assert (job["status"], job["rows"]) == ("done", 1)
+    with open(job["path"]) as f:
+        assert f.read().splitlines()[1].startswith("E1,Ada,,2025-03-03 09:05:00,Check-in")
@@ -0,0 +1,92 @@
+import base64
+import json
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from services import presence
+from services.presence import PresenceIndex
+from services.state_cache import EmployeeStateCache
+
+ORIGIN = datetime(2025, 1, 1)
+
+
+@pytest.fixture(autouse=True)
+def empty_states(monkeypatch):
+    monkeypatch.setattr(presence, "employee_states", EmployeeStateCache())
+
+
+def index_with(events, days=20):
+    index = PresenceIndex(days=days)
+    index._reset(ORIGIN)
+    index._set([(emp_id, ORIGIN + timedelta(days=offset), late) for emp_id, offset, late in events])
+    return index
+
+
+def expected_bits(events, emp_ids, first, last, late_only=False):
+    out = np.zeros((len(emp_ids), last - first), np.uint8)
+    for emp_id, offset, late in events:
+        if emp_id in emp_ids and first <= offset < last and (late or not late_only):
+            out[emp_ids.index(emp_id), offset - first] = 1
+    return out
+
+
+def test_bits_match_a_reference_for_unaligned_ranges():
+    rng = np.random.default_rng(7)
+    events = [(f"E{rng.integers(4)}", int(rng.integers(32)), bool(rng.integers(2))) for _ in range(60)]
+    index = index_with(events)
+    assert index.days == 32 and index.origin == ORIGIN  # Nothing past the window, no slide
+    emp_ids = ["E0", "E1", "E2", "E3", "E9"]  # E9 has no row
+    rows = np.array([index.rows.get(emp_id, -1) for emp_id in emp_ids], dtype=np.int64)
+    for first, last in [(0, 32), (3, 5), (7, 9), (5, 21), (-4, 3), (30, 40), (-10, -2), (33, 35)]:
+        np.testing.assert_array_equal(index._bits(index.present, rows, first, last), expected_bits(events, emp_ids, first, last))
+        np.testing.assert_array_equal(index._bits(index.late, rows, first, last), expected_bits(events, emp_ids, first, last, late_only=True))
+
+
+def test_slide_moves_whole_bytes_and_drops_expired_days():
+    events = [("E1", 0, False), ("E1", 9, True), ("E2", 15, False), ("E2", 31, False)]
+    index = index_with(events)
+    index._set([("E1", ORIGIN + timedelta(days=41), False)])  # 10 days past the window
+
+    assert index.origin == ORIGIN + timedelta(days=16)  # Two bytes, so day 41 fits
+    rows = np.array([index.rows["E1"], index.rows["E2"]])
+    # Offsets are now relative to day 16; days 0, 9 and 15 fell out
+    expected = np.zeros((2, 32), np.uint8)
+    expected[1, 31 - 16] = 1
+    expected[0, 41 - 16] = 1
+    np.testing.assert_array_equal(index._bits(index.present, rows, 0, 32), expected)
+    assert not index.late.any()
+
+
+def test_events_before_the_window_are_ignored_and_rows_grow():
+    index = index_with([])
+    index._set([("E0", ORIGIN - timedelta(days=1), True)])
+    assert not index.present.any()
+    index._set([(f"E{i}", ORIGIN + timedelta(days=i % 32), False) for i in range(100)])  # Past the initial 64 rows
+    rows = np.array([index.rows[f"E{i}"] for i in range(100)])
+    bits = index._bits(index.present, rows, 0, 32)
+    assert all(bits[i, i % 32] == 1 and bits[i].sum() == 1 for i in range(100))
+
+
+def test_heatmap_codes_and_bitmap_agree():
+    events = [("E1", 2, False), ("E1", 3, True), ("E2", 9, False)]
+    index = index_with(events)
+    start, end = ORIGIN + timedelta(days=1), ORIGIN + timedelta(days=10)  # 10 days, not a multiple of 8
+
+    codes = json.loads(index.heatmap(start, end))
+    assert {e["emp_id"]: e["days"] for e in codes["employees"]} == {"E1": "0120000000", "E2": "0000000010"}
+    assert [d["present"] for d in codes["daily"]] == [0, 1, 1, 0, 0, 0, 0, 0, 1, 0]
+
+    bitmap = json.loads(index.heatmap(start, end, encoding="bitmap"))
+    e1 = bitmap["employees"][0]
+    present = np.unpackbits(np.frombuffer(base64.b64decode(e1["present"]), np.uint8))[:10]
+    late = np.unpackbits(np.frombuffer(base64.b64decode(e1["late"]), np.uint8))[:10]
+    assert "".join(map(str, present + late)) == "0120000000"
+
+
+def test_new_check_in_invalidates_cached_responses_in_range():
+    index = index_with([("E1", 2, False)])
+    day = ORIGIN + timedelta(days=4)
+    assert json.loads(index.summary(day))["present"] == 0
+    index.apply({"emp_id": "E1", "status": "Check-in", "timing_status": "Late", "timestamp": day.replace(hour=9, minute=20)})
+    summary = json.loads(index.summary(day))
+    assert (summary["present"], summary["late"], summary["on_time"]) == (1, 1, 0)
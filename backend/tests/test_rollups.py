@@ -0,0 +1,35 @@
+import asyncio
+from datetime import datetime
+from services.rollups import get_rollups, rebuild_rollups
+
+
+def test_history_without_department_is_found_through_users(mongo):
+    async def run():
+        await mongo.users.insert_many([
+            {"emp_id": "E1", "name": "Ada", "department": "Engineering"},
+            {"emp_id": "E2", "name": "Bo", "department": "Sales"},
+        ])
+        # Written before events carried a department
+        await mongo.attendance_collection.insert_many([
+            {"emp_id": "E1", "emp_name": "Ada", "status": "Check-in", "timing_status": "On-time", "timestamp": datetime(2025, 3, 3, 9, 5)},
+            {"emp_id": "E1", "emp_name": "Ada", "status": "Check-out", "timestamp": datetime(2025, 3, 3, 17, 5)},
+            {"emp_id": "E2", "emp_name": "Bo", "status": "Check-in", "timing_status": "Late", "timestamp": datetime(2025, 3, 3, 9, 20)},
+        ])
+        await rebuild_rollups()
+        return (
+            await get_rollups("weekly", datetime(2025, 3, 4), department="Engineering"),
+            await mongo.monthly_attendance.find({}, {"_id": 0, "emp_id": 1, "department": 1}).to_list(None),
+        )
+
+    weekly, monthly = asyncio.run(run())
+    assert [(doc["emp_id"], doc["total_present"], doc["total_hours"]) for doc in weekly] == [("E1", 1, 8.0)]
+    assert sorted((doc["emp_id"], doc["department"]) for doc in monthly) == [("E1", "Engineering"), ("E2", "Sales")]
+
+
+def test_department_filter_matches_rollups_without_department(mongo):
+    async def run():
+        await mongo.users.insert_one({"emp_id": "E1", "name": "Ada", "department": "Engineering"})
+        await mongo.yearly_attendance.insert_one({"emp_id": "E1", "year": 2025, "department": None, "total_present": 3})
+        return await get_rollups("yearly", datetime(2025, 6, 1), department="Engineering")
+
+    assert [doc["emp_id"] for doc in asyncio.run(run())] == ["E1"]
@@ -0,0 +1,57 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from services import state_cache
+from services.state_cache import EmployeeStateCache
+
+
+def event(emp_id, status, decided, inserted_at):
+    return {
+        "_id": ObjectId.from_datetime(decided), "emp_id": emp_id, "status": status,
+        "timestamp": decided.replace(tzinfo=None), "inserted_at": inserted_at,
+    }
+
+
+async def follow(cache, seconds):
+    task = asyncio.create_task(cache._poll())
+    await asyncio.sleep(seconds)
+    task.cancel()
+
+
+def test_poll_follows_late_inserts_once(mongo, monkeypatch):
+    monkeypatch.setattr(state_cache, "STATE_SYNC_INTERVAL", 0.02)
+    cache = EmployeeStateCache()
+    applied = []
+    cache.listeners.append(applied.append)
+
+    async def run():
+        poll = asyncio.create_task(follow(cache, 0.2))
+        await asyncio.sleep(0.05)
+        # Decided an hour ago (old _id), written by another worker only now
+        decided = datetime.now() - timedelta(hours=1)
+        await mongo.attendance_collection.insert_one(event("E1", "Check-in", decided, int(time.time() * 1000)))
+        await poll
+
+    asyncio.run(run())
+    assert cache.get("E1")["last_status"] == "Check-in"
+    assert [entry["emp_id"] for entry in applied] == ["E1"]  # Re-read by every overlapping poll, applied once
+
+
+def test_local_events_are_not_applied_again(mongo, monkeypatch):
+    monkeypatch.setattr(state_cache, "STATE_SYNC_INTERVAL", 0.02)
+    cache = EmployeeStateCache()
+    applied = []
+    cache.listeners.append(applied.append)
+
+    async def run():
+        poll = asyncio.create_task(follow(cache, 0.15))
+        await asyncio.sleep(0.01)
+        entry = event("E2", "Check-out", datetime.now(), None)
+        cache.apply(entry)
+        entry["inserted_at"] = int(time.time() * 1000)
+        await mongo.attendance_collection.insert_one(entry)
+        await poll
+
+    asyncio.run(run())
+    assert len(applied) == 1